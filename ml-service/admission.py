@@ -0,0 +1,319 @@
+import contextvars
+import math
+import os
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+from typing import Callable, Deque, Dict, Optional
+
+from tracing import span
+
+# Absolute deadline as epoch milliseconds
+DEADLINE_HEADER = 'X-Request-Deadline'
+# Remaining budget in milliseconds, relative to arrival (immune to clock skew)
+TIMEOUT_HEADER = 'X-Request-Timeout-Ms'
+# Tenant for requests whose payload carries no hospitalId
+HOSPITAL_HEADER = 'X-Hospital-Id'
+
+DEFAULT_TENANT = 'default'
+# Shared bucket once MAX_TENANTS distinct hospitals have been seen
+OVERFLOW_TENANT = 'other'
+
+
+class AdmissionError(Exception):
+    """Base for requests the service declines to run"""
+
+
+class DeadlineExceeded(AdmissionError):
+    pass
+
+
+class Overloaded(AdmissionError):
+    def __init__(self, retry_after: float, message: str = 'Service overloaded'):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+def parse_weights(spec: str) -> Dict[str, float]:
+    """'12:2,7:0.5' -> {'12': 2.0, '7': 0.5}"""
+    weights = {}
+    for item in filter(None, (part.strip() for part in spec.split(','))):
+        tenant, _, weight = item.rpartition(':')
+        try:
+            weights[tenant] = max(0.01, float(weight))
+        except ValueError:
+            print(f"Ignoring invalid tenant weight '{item}'")
+    return weights
+
+
+class _Job:
+    __slots__ = ('fn', 'args', 'kwargs', 'deadline', 'tenant', 'cost_key', 'start_tag',
+                 'enqueued_at', 'future', 'context')
+
+    def __init__(self, fn, args, kwargs, deadline, tenant, cost_key, start_tag):
+        self.fn = fn
+        self.args = args
+        self.kwargs = kwargs
+        self.deadline = deadline
+        self.tenant = tenant
+        self.cost_key = cost_key
+        self.start_tag = start_tag
+        self.enqueued_at = time.monotonic()
+        self.future = Future()
+        # The submitting request's context (trace, span parent) follows the job to its worker
+        self.context = contextvars.copy_context()
+
+
+class _Tenant:
+    """Queue and accounting for one hospital"""
+
+    def __init__(self, weight: float):
+        self.weight = weight
+        self.queue: Deque[_Job] = deque()
+        self.running = 0
+        self.last_finish_tag = 0.0
+        self.avg_wait_s = 0.0
+        self.max_wait_s = 0.0
+        self.stats = {'completed': 0, 'failed': 0, 'shed': 0, 'expired': 0}
+
+    def summary(self) -> Dict:
+        oldest = time.monotonic() - self.queue[0].enqueued_at if self.queue else 0.0
+        return {
+            'weight': self.weight,
+            'queued': len(self.queue),
+            'running': self.running,
+            'avg_wait_ms': round(self.avg_wait_s * 1000, 2),
+            'max_wait_ms': round(self.max_wait_s * 1000, 2),
+            'oldest_queued_ms': round(oldest * 1000, 2),
+            **self.stats
+        }
+
+
+class AdmissionController:
+    """
+    Bounded executor with deadline-aware admission and per-hospital fairness.
+
+    Requests whose deadline has already passed are rejected before any work
+    is done, and queued work that expires while waiting is skipped rather
+    than computed for a caller that has given up. When running plus queued
+    work reaches capacity new requests are shed immediately.
+
+    Queued work is partitioned by tenant (hospital) and dispatched with
+    start-time fair queuing: each job is tagged with its tenant's virtual
+    time advanced by the job's expected service time over the tenant's
+    weight, and free workers take the job with the smallest tag. A tenant
+    submitting bursts or expensive forecasts therefore only delays its own
+    queue. Each tenant is also capped in how many workers it may hold and
+    how much of the queue it may fill.
+    """
+
+    SNAPSHOT_VERSION = 1
+
+    def __init__(self, max_workers: Optional[int] = None, max_queue: Optional[int] = None,
+                 default_timeout_ms: Optional[int] = None):
+        self.max_workers = max_workers or int(os.getenv('ML_WORKER_THREADS', os.cpu_count() or 4))
+        self.max_queue = max_queue if max_queue is not None else int(os.getenv('ML_MAX_QUEUE', 32))
+        self.default_timeout_ms = default_timeout_ms or int(os.getenv('ML_DEFAULT_TIMEOUT_MS', 5000))
+        self.capacity = self.max_workers + self.max_queue
+        # By default one worker always stays available to other hospitals
+        self.tenant_max_running = int(os.getenv('ML_TENANT_MAX_RUNNING', max(1, self.max_workers - 1)))
+        self.tenant_max_queue = int(os.getenv('ML_TENANT_MAX_QUEUE', max(1, self.max_queue // 2)))
+        self.max_tenants = int(os.getenv('ML_MAX_TENANTS', 1024))
+        self.weights = parse_weights(os.getenv('ML_TENANT_WEIGHTS', ''))
+
+        self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix='ml-work')
+        self._lock = threading.Lock()
+        self._tenants: Dict[str, _Tenant] = {}
+        self._virtual_time = 0.0
+        self._admitted = 0
+        self._running = 0
+        self._avg_service_s = 0.05
+        # Expected service time per kind of work, so expensive calls use more of a tenant's share
+        self._cost_s: Dict[str, float] = {}
+        self.stats = {'completed': 0, 'failed': 0, 'shed': 0, 'expired': 0, 'abandoned': 0}
+
+    def deadline_from_headers(self, headers) -> float:
+        """Convert request headers to a time.monotonic() deadline"""
+        now = time.monotonic()
+        timeout_ms = headers.get(TIMEOUT_HEADER)
+        if timeout_ms is not None:
+            try:
+                return now + float(timeout_ms) / 1000.0
+            except ValueError:
+                pass
+        deadline_ms = headers.get(DEADLINE_HEADER)
+        if deadline_ms is not None:
+            try:
+                return now + (float(deadline_ms) / 1000.0 - time.time())
+            except ValueError:
+                pass
+        return now + self.default_timeout_ms / 1000.0
+
+    def _count(self, key: str, tenant: Optional[_Tenant] = None):
+        with self._lock:
+            self.stats[key] += 1
+            if tenant is not None and key in tenant.stats:
+                tenant.stats[key] += 1
+
+    def _tenant(self, tenant_id) -> _Tenant:
+        """Get or create a tenant; caller holds the lock"""
+        key = str(tenant_id) if tenant_id not in (None, '') else DEFAULT_TENANT
+        tenant = self._tenants.get(key)
+        if tenant is None:
+            if len(self._tenants) >= self.max_tenants:
+                key = OVERFLOW_TENANT
+                tenant = self._tenants.get(key)
+            if tenant is None:
+                tenant = _Tenant(self.weights.get(key, 1.0))
+                self._tenants[key] = tenant
+        return tenant
+
+    def retry_after(self, tenant: Optional[_Tenant] = None) -> float:
+        """Seconds until the current backlog (or one tenant's) should have drained"""
+        with self._lock:
+            if tenant is not None:
+                backlog = len(tenant.queue) + tenant.running
+                workers = min(self.tenant_max_running, self.max_workers)
+            else:
+                backlog = self._admitted
+                workers = self.max_workers
+            service_s = self._avg_service_s
+        return max(1.0, math.ceil(backlog * service_s / workers))
+
+    def run(self, fn: Callable, *args, deadline: float, tenant=None, **kwargs):
+        """Run fn for tenant in the executor, honouring deadline; raises AdmissionError subclasses"""
+        if deadline <= time.monotonic():
+            with self._lock:
+                owner = self._tenant(tenant)
+            self._count('expired', owner)
+            raise DeadlineExceeded('Deadline already passed')
+
+        cost_key = getattr(fn, '__qualname__', 'work')
+        with self._lock:
+            owner = self._tenant(tenant)
+            if self._admitted >= self.capacity:
+                shed_message = 'Service overloaded'
+            elif len(owner.queue) >= self.tenant_max_queue:
+                shed_message = 'Too many queued requests for this hospital'
+            else:
+                shed_message = None
+            if shed_message is None:
+                # Start-time fair queuing: never start behind the tenant's previous job
+                start_tag = max(self._virtual_time, owner.last_finish_tag)
+                owner.last_finish_tag = start_tag + self._cost_s.get(cost_key, self._avg_service_s) / owner.weight
+                job = _Job(fn, args, kwargs, deadline, owner, cost_key, start_tag)
+                owner.queue.append(job)
+                self._admitted += 1
+                self._dispatch()
+
+        if shed_message is not None:
+            self._count('shed', owner)
+            if shed_message == 'Service overloaded':
+                raise Overloaded(self.retry_after())
+            raise Overloaded(self.retry_after(owner), shed_message)
+
+        try:
+            return job.future.result(timeout=max(0.0, deadline - time.monotonic()))
+        except FutureTimeoutError:
+            # Not yet started work is dropped; running work finishes but its result is discarded
+            with self._lock:
+                dropped = job in owner.queue
+                if dropped:
+                    owner.queue.remove(job)
+                    self._admitted -= 1
+            if not dropped:
+                self._count('abandoned')
+            self._count('expired', owner)
+            raise DeadlineExceeded('Deadline exceeded while processing')
+
+    def _dispatch(self):
+        """Hand queued jobs to free workers in fair order; caller holds the lock"""
+        while self._running < self.max_workers:
+            chosen = None
+            for tenant in self._tenants.values():
+                if tenant.queue and tenant.running < self.tenant_max_running:
+                    if chosen is None or tenant.queue[0].start_tag < chosen.queue[0].start_tag:
+                        chosen = tenant
+            if chosen is None:
+                return
+
+            job = chosen.queue.popleft()
+            now = time.monotonic()
+            if job.deadline <= now:
+                self._admitted -= 1
+                self.stats['expired'] += 1
+                chosen.stats['expired'] += 1
+                job.future.set_exception(DeadlineExceeded('Deadline passed while queued'))
+                continue
+
+            wait = now - job.enqueued_at
+            chosen.avg_wait_s = 0.9 * chosen.avg_wait_s + 0.1 * wait
+            chosen.max_wait_s = max(chosen.max_wait_s, wait)
+            self._virtual_time = max(self._virtual_time, job.start_tag)
+            chosen.running += 1
+            self._running += 1
+            self._executor.submit(self._execute, job)
+
+    def _execute(self, job: _Job):
+        started = time.monotonic()
+        error = None
+        try:
+            result = job.context.run(self._call, job, started)
+        except BaseException as e:
+            error = e
+        outcome = 'completed' if error is None else 'failed'
+        elapsed = time.monotonic() - started
+        # Account before resolving, so a caller that returns sees its own work counted
+        with self._lock:
+            job.tenant.running -= 1
+            job.tenant.stats[outcome] += 1
+            self._running -= 1
+            self._admitted -= 1
+            self._avg_service_s = 0.9 * self._avg_service_s + 0.1 * elapsed
+            previous = self._cost_s.get(job.cost_key, elapsed)
+            self._cost_s[job.cost_key] = 0.9 * previous + 0.1 * elapsed
+            self.stats[outcome] += 1
+            self._dispatch()
+        if error is None:
+            job.future.set_result(result)
+        else:
+            job.future.set_exception(error)
+
+    @staticmethod
+    def _call(job: _Job, started: float):
+        with span('admission.execute', work=job.cost_key,
+                  queue_wait_ms=round((started - job.enqueued_at) * 1000, 3)):
+            return job.fn(*job.args, **job.kwargs)
+
+    def snapshot_state(self) -> Dict:
+        # Learned service times, so fair-queuing costs are right from the first request
+        with self._lock:
+            return {'service_times': {'average': self._avg_service_s, 'per_kind': dict(self._cost_s)}}
+
+    def restore_state(self, sections: Dict):
+        service_times = sections['service_times']
+        with self._lock:
+            self._avg_service_s = service_times['average']
+            self._cost_s.update(service_times['per_kind'])
+
+    def status(self) -> Dict:
+        with self._lock:
+            admitted = self._admitted
+            running = self._running
+            stats = dict(self.stats)
+            service_ms = self._avg_service_s * 1000
+            tenants = {tenant_id: tenant.summary() for tenant_id, tenant in self._tenants.items()}
+        return {
+            'running': running,
+            'queued': admitted - running,
+            'capacity': self.capacity,
+            'workers': self.max_workers,
+            'utilization': round(admitted / self.capacity, 3),
+            'overloaded': admitted >= self.capacity,
+            'avg_service_ms': round(service_ms, 2),
+            'tenant_max_running': self.tenant_max_running,
+            'tenant_max_queue': self.tenant_max_queue,
+            'tenants': tenants,
+            **stats
+        }
@@ -1,9 +1,9 @@
-from flask import Flask, request, jsonify
+from flask import Flask, request, jsonify, send_file, abort
 from flask_cors import CORS
 import numpy as np
-import pandas as pd
 from datetime import datetime, timedelta
 import joblib
+import io
 import os
 from dotenv import load_dotenv
 
@@ -16,11 +16,92 @@ CORS(app)
 from deterioration_predictor import DeteriorationPredictor
 from nlp_extractor import NLPExtractor
 from surge_forecaster import SurgeForecaster
+from tiered_nlp import TieredNLPExtractor
+from forecast_store import create_forecast_store, payload_fingerprint
+from model_cache import create_seasonal_cache
+from admission import HOSPITAL_HEADER, AdmissionController, AdmissionError, Overloaded
+from profiler import RequestProfiler
+from priority_queue import HospitalQueues, QueueFull
+from transport import serve
+from snapshot import create_snapshot_manager
+from singleflight import SingleFlight
+from tracing import TRACE_HEADER, Tracer, span
 
 # Initialize models
 deterioration_model = DeteriorationPredictor()
 nlp_model = NLPExtractor()
-surge_model = SurgeForecaster()
+tiered_nlp = TieredNLPExtractor(nlp_model)
+forecast_store = create_forecast_store()
+# Per-hospital seasonal models fitted off the request path; None without prophet
+seasonal_models = create_seasonal_cache()
+surge_model = SurgeForecaster(store=forecast_store, seasonal=seasonal_models)
+
+# Per-hospital waiting queues, re-keyed incrementally as patients arrive, change or leave
+patient_queues = HospitalQueues(deterioration_model)
+
+# Bounded executor for model work; sheds load instead of queueing past the caller's deadline
+admission = AdmissionController()
+
+# Identical concurrent requests (dashboards refreshing on the same alert) share one computation
+single_flight = SingleFlight(os.getenv('ML_SINGLEFLIGHT_ENABLED', 'true').lower() in ('1', 'true', 'yes'))
+
+# On-demand profiling; inert unless ML_PROFILING_ENABLED and ML_ADMIN_TOKEN are set
+profiler = RequestProfiler()
+
+# Sampled per-request spans, exported off the request path to a rotating JSONL file
+tracer = Tracer()
+
+# Crash-safe snapshots of in-memory state, restored at startup so a redeploy starts warm
+snapshots = create_snapshot_manager()
+if snapshots:
+    snapshots.register('queues', patient_queues)
+    snapshots.register('admission', admission)
+    snapshots.register('keyword_packs', nlp_model.keyword_packs)
+    if hasattr(forecast_store, 'snapshot_state'):
+        snapshots.register('forecast_store', forecast_store)
+    if seasonal_models:
+        snapshots.register('seasonal_history', seasonal_models)
+    snapshots.restore()
+    snapshots.start()
+
+@app.before_request
+def profile_begin():
+    profiler.begin_request(request.path)
+
+@app.teardown_request
+def profile_end(exc=None):
+    profiler.end_request(request.path)
+
+@app.before_request
+def trace_begin():
+    request.trace_id = tracer.begin_request(request.headers, request.path, request.method)
+
+@app.after_request
+def trace_response(response):
+    if getattr(request, 'trace_id', None):
+        response.headers[TRACE_HEADER] = request.trace_id
+    tracer.end_request(response.status_code)
+    return response
+
+@app.teardown_request
+def trace_end(exc=None):
+    # Only still open if the request failed before producing a response
+    tracer.end_request(500)
+
+@app.errorhandler(AdmissionError)
+def handle_admission_error(e):
+    if isinstance(e, Overloaded):
+        response = jsonify({
+            'success': False,
+            'error': str(e),
+            'retry_after': e.retry_after
+        })
+        response.headers['Retry-After'] = str(int(e.retry_after))
+        return response, 503
+    return jsonify({
+        'success': False,
+        'error': str(e)
+    }), 504
 
 @app.route('/health', methods=['GET'])
 def health_check():
@@ -31,37 +112,127 @@ def health_check():
             'nlp': nlp_model.is_loaded(),
             'surge': surge_model.is_loaded()
         },
+        'keyword_packs': nlp_model.keyword_packs.status(),
+        'nlp_tiers': tiered_nlp.status(),
+        'forecast_store': forecast_store.status(),
+        'seasonal_models': seasonal_models.status() if seasonal_models else {'enabled': False},
+        'queues': patient_queues.status(),
+        'load': admission.status(),
+        'single_flight': single_flight.status(),
+        'tracing': tracer.status(),
+        'snapshot': snapshots.status() if snapshots else {'enabled': False},
         'timestamp': datetime.now().isoformat()
     })
 
+def flight_key(data) -> str:
+    """Route plus a canonical hash of the payload"""
+    return f"{request.path}:{payload_fingerprint(data)}"
+
+def request_tenant(data=None):
+    """Hospital a request is scheduled under: payload hospitalId, else the X-Hospital-Id header"""
+    if isinstance(data, dict) and data.get('hospitalId') is not None:
+        return data['hospitalId']
+    return request.headers.get(HOSPITAL_HEADER)
+
+def extract_deterioration_features(data):
+    """Map a Node patient payload to DeteriorationPredictor features"""
+    vital_signs = data.get('vitalSigns') or {}
+    return {
+        'heart_rate': vital_signs.get('heartRate', 80),
+        'respiratory_rate': vital_signs.get('respiratoryRate', 16),
+        'systolic_bp': vital_signs.get('systolicBP', 120),
+        'oxygen_saturation': vital_signs.get('oxygenSaturation', 98),
+        'temperature': vital_signs.get('temperature', 37.0),
+        'consciousness': vital_signs.get('consciousness', 'alert'),
+        'age': data.get('age', 40),
+        'current_priority': data.get('currentPriority', 'GREEN'),
+        'waiting_time': data.get('waitingTime', 0),
+        'symptom_count': len(data.get('symptoms', [])),
+        'risk_factor_count': len(data.get('riskFactors', []))
+    }
+
 @app.route('/api/predict/deterioration', methods=['POST'])
 def predict_deterioration():
     """Predict patient deterioration risk"""
     try:
-        data = request.json
-        
-        # Extract features
-        features = {
-            'heart_rate': data.get('vitalSigns', {}).get('heartRate', 80),
-            'respiratory_rate': data.get('vitalSigns', {}).get('respiratoryRate', 16),
-            'systolic_bp': data.get('vitalSigns', {}).get('systolicBP', 120),
-            'oxygen_saturation': data.get('vitalSigns', {}).get('oxygenSaturation', 98),
-            'temperature': data.get('vitalSigns', {}).get('temperature', 37.0),
-            'consciousness': data.get('vitalSigns', {}).get('consciousness', 'alert'),
-            'age': data.get('age', 40),
-            'current_priority': data.get('currentPriority', 'GREEN'),
-            'waiting_time': data.get('waitingTime', 0),
-            'symptom_count': len(data.get('symptoms', [])),
-            'risk_factor_count': len(data.get('riskFactors', []))
-        }
+        with span('request.parse'):
+            data = request.json
+            deadline = admission.deadline_from_headers(request.headers)
+            
+            # Extract features
+            features = extract_deterioration_features(data)
         
         # Get prediction
-        prediction = deterioration_model.predict(features)
+        assessment = admission.run(
+            profiler.wrap(request.path, deterioration_model.assess), features,
+            deadline=deadline, tenant=request_tenant(data)
+        )
         
+        with span('response.serialize'):
+            return jsonify({
+                'success': True,
+                'prediction': assessment.to_dict()
+            })
+    except AdmissionError:
+        raise
+    except Exception as e:
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 500
+
+def parse_horizon_minutes(data):
+    """horizonMinutes capped at the predictor's maximum, or None if it is not a non-negative number"""
+    value = data.get('horizonMinutes', 240)
+    if isinstance(value, bool):
+        return None
+    try:
+        value = float(value)
+    except (TypeError, ValueError):
+        return None
+    if not 0 <= value < float('inf'):
+        return None
+    return min(int(value), DeteriorationPredictor.MAX_HORIZON_MINUTES)
+
+@app.route('/api/predict/deterioration/horizon', methods=['POST'])
+def predict_deterioration_horizon():
+    """Project risk over a waiting-time horizon and the next minute it changes"""
+    try:
+        data = request.json
+        deadline = admission.deadline_from_headers(request.headers)
+        horizon_minutes = parse_horizon_minutes(data)
+        if horizon_minutes is None:
+            return jsonify({
+                'success': False,
+                'error': 'horizonMinutes must be a non-negative number'
+            }), 400
+        
+        if 'patients' in data:
+            patients = data.get('patients') or []
+            projections = admission.run(
+                profiler.wrap(request.path, deterioration_model.project_waiting_horizon_batch),
+                [extract_deterioration_features(p) for p in patients], horizon_minutes,
+                deadline=deadline, tenant=request_tenant(data)
+            )
+            for patient, projection in zip(patients, projections):
+                if 'patientId' in patient:
+                    projection['patient_id'] = patient['patientId']
+            return jsonify({
+                'success': True,
+                'projections': projections
+            })
+        
+        projection = admission.run(
+            profiler.wrap(request.path, deterioration_model.project_waiting_horizon),
+            extract_deterioration_features(data), horizon_minutes,
+            deadline=deadline, tenant=request_tenant(data)
+        )
         return jsonify({
             'success': True,
-            'prediction': prediction
+            'projection': projection
         })
+    except AdmissionError:
+        raise
     except Exception as e:
         return jsonify({
             'success': False,
@@ -72,8 +243,10 @@ def predict_deterioration():
 def extract_symptoms():
     """Extract symptoms and conditions from chief complaint"""
     try:
-        data = request.json
-        text = data.get('text', '')
+        with span('request.parse'):
+            data = request.json
+            deadline = admission.deadline_from_headers(request.headers)
+            text = data.get('text', '')
         
         if not text:
             return jsonify({
@@ -82,33 +255,86 @@ def extract_symptoms():
             }), 400
         
         # Extract information
-        extraction = nlp_model.extract(text)
+        extraction = single_flight.do(
+            flight_key(data), deadline, admission.run,
+            profiler.wrap(request.path, tiered_nlp.extract), text, deadline, data.get('mode', 'auto'),
+            deadline=deadline, tenant=request_tenant(data)
+        )
         
-        return jsonify({
-            'success': True,
-            'extraction': extraction
-        })
+        with span('response.serialize'):
+            return jsonify({
+                'success': True,
+                'extraction': extraction
+            })
+    except AdmissionError:
+        raise
     except Exception as e:
         return jsonify({
             'success': False,
             'error': str(e)
         }), 500
 
+def parse_hours_ahead(data):
+    """hoursAhead capped at the forecaster's maximum, or None if it is not a positive number"""
+    value = data.get('hoursAhead', 6)
+    if isinstance(value, bool):
+        return None
+    try:
+        value = float(value)
+    except (TypeError, ValueError):
+        return None
+    if not 1 <= value < float('inf'):
+        return None
+    return min(int(value), SurgeForecaster.MAX_HOURS_AHEAD)
+
 @app.route('/api/forecast/surge', methods=['POST'])
 def forecast_surge():
     """Forecast patient surge for hospital"""
     try:
-        data = request.json
-        hospital_id = data.get('hospitalId')
-        hours_ahead = data.get('hoursAhead', 6)
-        historical_data = data.get('historicalData', [])
+        with span('request.parse'):
+            data = request.json
+            deadline = admission.deadline_from_headers(request.headers)
+            hospital_id = data.get('hospitalId')
+            hours_ahead = parse_hours_ahead(data)
+            historical_data = data.get('historicalData', [])
+        if hours_ahead is None:
+            return jsonify({
+                'success': False,
+                'error': 'hoursAhead must be a positive number'
+            }), 400
         
         # Get forecast
-        forecast = surge_model.forecast(historical_data, hours_ahead)
+        forecast = single_flight.do(
+            flight_key(data), deadline, admission.run,
+            profiler.wrap(request.path, surge_model.forecast), historical_data, hours_ahead,
+            hospital_id=hospital_id, deadline=deadline, tenant=hospital_id
+        )
+        
+        with span('response.serialize'):
+            return jsonify({
+                'success': True,
+                'forecast': forecast
+            })
+    except AdmissionError:
+        raise
+    except Exception as e:
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 500
+
+@app.route('/api/queue/<hospital_id>', methods=['GET'])
+def get_queue(hospital_id):
+    """Current waiting order for a hospital, optionally only the top k"""
+    try:
+        k = request.args.get('k', type=int)
+        patients = patient_queues.top(hospital_id, k)
         
         return jsonify({
             'success': True,
-            'forecast': forecast
+            'hospital_id': hospital_id,
+            'size': patient_queues.size(hospital_id),
+            'patients': patients
         })
     except Exception as e:
         return jsonify({
@@ -116,9 +342,125 @@ def forecast_surge():
             'error': str(e)
         }), 500
 
+@app.route('/api/queue/<hospital_id>/patients', methods=['POST'])
+def upsert_queue_patients(hospital_id):
+    """Add or rescore patients in a hospital queue (arrival or vitals update)"""
+    try:
+        data = request.json
+        deadline = admission.deadline_from_headers(request.headers)
+        
+        if 'patients' in data:
+            patients = [
+                (p['patientId'], extract_deterioration_features(p))
+                for p in data.get('patients') or []
+            ]
+            size = admission.run(
+                profiler.wrap(request.path, patient_queues.upsert_many), hospital_id, patients,
+                deadline=deadline, tenant=hospital_id
+            )
+            return jsonify({
+                'success': True,
+                'hospital_id': hospital_id,
+                'size': size
+            })
+        
+        patient_id = data.get('patientId')
+        if patient_id is None:
+            return jsonify({
+                'success': False,
+                'error': 'No patientId provided'
+            }), 400
+        
+        entry = admission.run(
+            profiler.wrap(request.path, patient_queues.upsert), hospital_id, patient_id,
+            extract_deterioration_features(data), deadline=deadline, tenant=hospital_id
+        )
+        return jsonify({
+            'success': True,
+            'patient': entry
+        })
+    except AdmissionError:
+        raise
+    except QueueFull as e:
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 503
+    except Exception as e:
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 500
+
+@app.route('/api/queue/<hospital_id>/patients/<patient_id>', methods=['DELETE'])
+def remove_queue_patient(hospital_id, patient_id):
+    """Remove a discharged or admitted patient from a hospital queue"""
+    removed = patient_queues.discharge(hospital_id, patient_id)
+    if not removed:
+        return jsonify({
+            'success': False,
+            'error': 'Patient not in queue'
+        }), 404
+    return jsonify({
+        'success': True,
+        'size': patient_queues.size(hospital_id)
+    })
+
+@app.route('/admin/profile', methods=['GET', 'POST', 'DELETE'])
+def admin_profile():
+    """Start, inspect or stop an on-demand profiling session"""
+    if not profiler.authorized(request.headers):
+        abort(404)
+    
+    if request.method == 'GET':
+        return jsonify({'success': True, 'profiling': profiler.status()})
+    
+    if request.method == 'DELETE':
+        profiler.finish()
+        return jsonify({'success': True, 'profiling': profiler.status()})
+    
+    try:
+        data = request.json or {}
+        session = profiler.start(
+            mode=data.get('mode', 'cpu'),
+            route=data.get('route', '/api/forecast/surge'),
+            max_requests=data.get('maxRequests', 50),
+            max_seconds=data.get('maxSeconds', 30)
+        )
+        return jsonify({'success': True, 'session': session}), 202
+    except ValueError as e:
+        return jsonify({'success': False, 'error': str(e)}), 400
+    except RuntimeError as e:
+        return jsonify({'success': False, 'error': str(e)}), 409
+
+@app.route('/admin/profile/artifact', methods=['GET'])
+def admin_profile_artifact():
+    """Download the result of the last finished profiling session"""
+    if not profiler.authorized(request.headers):
+        abort(404)
+    
+    if request.args.get('format') == 'text':
+        try:
+            limit = int(request.args.get('limit', 40))
+        except ValueError:
+            return jsonify({'success': False, 'error': 'limit must be an integer'}), 400
+        report = profiler.text_report(limit)
+        if report is None:
+            return jsonify({'success': False, 'error': 'No finished CPU profile'}), 404
+        return report, 200, {'Content-Type': 'text/plain; charset=utf-8'}
+    
+    artifact = profiler.artifact()
+    if artifact is None:
+        return jsonify({'success': False, 'error': 'No finished profiling session'}), 404
+    content, filename, mimetype = artifact
+    return send_file(io.BytesIO(content), mimetype=mimetype, as_attachment=True, download_name=filename)
+
 if __name__ == '__main__':
     # Railway provides PORT env variable
     port = int(os.getenv('PORT', os.getenv('ML_SERVICE_PORT', 5001)))
     # Use debug=False in production
     debug = os.getenv('FLASK_ENV', 'production') != 'production'
-    app.run(host='0.0.0.0', port=port, debug=debug)
+    # Co-located deployments can skip TCP entirely with a Unix domain socket.
+    # One request thread per admission slot, so admission control decides what waits.
+    serve(app, socket_path=os.getenv('ML_SERVICE_SOCKET'), port=port,
+          threads=admission.capacity, debug=debug)
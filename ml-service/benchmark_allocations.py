@@ -0,0 +1,129 @@
+#!/usr/bin/env python3
+"""
+Allocation Benchmark Script
+Measures what deterioration prediction, queue scoring and complaint
+extraction allocate per call: the transient peak above the pre-call level,
+the bytes and GC-tracked containers each result keeps alive while it waits
+to be serialized (tracemalloc and the gc module), and time per call.
+
+Only queue scoring is compared across two implementations, and both rows
+produce the same (risk score, priority) pair: one reads it from the full
+response dict, as queues did before, the other from the compact assessment.
+The other rows are absolute costs of the current code.
+"""
+
+import argparse
+import gc
+import json
+import random
+import time
+import tracemalloc
+
+from benchmark_nlp import build_corpus
+from deterioration_predictor import DeteriorationPredictor
+from nlp_extractor import NLPExtractor
+from priority_queue import HospitalQueues
+from test_integration import print_header
+
+
+def build_features(size: int, seed: int = 42):
+    """Random vitals spanning normal to critical ranges"""
+    rng = random.Random(seed)
+    return [{
+        'heart_rate': rng.randint(35, 160),
+        'respiratory_rate': rng.randint(6, 34),
+        'systolic_bp': rng.randint(80, 210),
+        'oxygen_saturation': rng.randint(85, 100),
+        'temperature': round(rng.uniform(34.5, 41.0), 1),
+        'consciousness': rng.choice(['alert', 'alert', 'alert', 'verbal', 'pain', 'unresponsive']),
+        'age': rng.randint(0, 95),
+        'current_priority': rng.choice(['GREEN', 'YELLOW', 'RED']),
+        'waiting_time': rng.randint(0, 240),
+        'symptom_count': rng.randint(0, 4),
+        'risk_factor_count': rng.randint(0, 3)
+    } for _ in range(size)]
+
+
+def peak_bytes_per_call(fn, items):
+    """Mean peak of traced memory above the pre-call level"""
+    total = 0
+    tracemalloc.start()
+    try:
+        for item in items:
+            before = tracemalloc.get_traced_memory()[0]
+            tracemalloc.reset_peak()
+            fn(item)
+            total += tracemalloc.get_traced_memory()[1] - before
+    finally:
+        tracemalloc.stop()
+    return total / len(items)
+
+
+def held_per_result(fn, items):
+    """Mean traced bytes and GC-tracked objects kept alive by each result"""
+    gc.collect()
+    gc.disable()
+    tracemalloc.start()
+    try:
+        objects_before = len(gc.get_objects())
+        bytes_before = tracemalloc.get_traced_memory()[0]
+        results = [fn(item) for item in items]
+        held_bytes = tracemalloc.get_traced_memory()[0] - bytes_before
+        # The results list itself is one of the new objects
+        held_objects = len(gc.get_objects()) - objects_before - 1
+    finally:
+        tracemalloc.stop()
+        gc.enable()
+    del results
+    return held_bytes / len(items), held_objects / len(items)
+
+
+def microseconds_per_call(fn, items):
+    start = time.perf_counter()
+    for item in items:
+        fn(item)
+    return (time.perf_counter() - start) * 1e6 / len(items)
+
+
+def queue_score(prediction):
+    """What a hospital queue keys on, from either a response dict or a RiskAssessment"""
+    if isinstance(prediction, dict):
+        return prediction['risk_score'], prediction['predicted_priority']
+    return prediction.risk_score, prediction.predicted_priority
+
+
+def report(name, fn, items):
+    fn(items[0])
+    held_bytes, held_objects = held_per_result(fn, items)
+    print(f"  {name:<24} {peak_bytes_per_call(fn, items) / 1024:7.2f} KB peak"
+          f"  {held_bytes / 1024:7.2f} KB held  {held_objects:6.1f} GC objects held"
+          f"  {microseconds_per_call(fn, items):9.1f} us/call")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--calls', type=int, default=5000, help='patients per deterioration workload')
+    parser.add_argument('--complaints', type=int, default=300, help='complaints in the NLP corpus')
+    args = parser.parse_args()
+
+    features = build_features(args.calls)
+    corpus = build_corpus(args.complaints, repeat_ratio=0.3)
+    print_header("Allocation Benchmark")
+    print(f"  {len(features)} patients, {len(corpus)} complaints (per call / per result)\n")
+
+    predictor = DeteriorationPredictor()
+    queues = HospitalQueues(predictor)
+    extractor = NLPExtractor()
+    patients = list(enumerate(features))
+
+    print("  Queue score, same result both ways")
+    report("  from response dict", lambda f: queue_score(predictor.predict(f)), features)
+    report("  from assessment", lambda f: queue_score(predictor.assess(f)), features)
+    print("\n  Current code")
+    report("predict + serialize", lambda f: json.dumps(predictor.predict(f)), features)
+    report("queue upsert", lambda p: queues.upsert('benchmark', p[0] % 500, p[1]), patients)
+    report("extract + serialize", lambda t: json.dumps(extractor.extract(t)), corpus)
+
+
+if __name__ == "__main__":
+    main()
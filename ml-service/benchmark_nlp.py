@@ -0,0 +1,99 @@
+#!/usr/bin/env python3
+"""
+NLP Benchmark Script
+Compares latency and throughput of the dictionary extractor and the
+CPU-optimized transformer NER backend on a corpus seeded from the
+integration test complaints
+"""
+
+import argparse
+import random
+import statistics
+import time
+
+from nlp_extractor import NLPExtractor
+from test_integration import NLP_TEST_CASES, print_header
+from transformer_ner import TransformerNERBackend
+
+# Fragments appended to the seed complaints to vary length and content
+EXTRA_FRAGMENTS = [
+    "symptoms started 2 hours ago",
+    "history of diabetes and hypertension",
+    "no known allergies",
+    "nausea and vomiting since morning",
+    "fever of 39 degrees with cough",
+    "fell from stairs, possible fracture of left wrist",
+]
+
+
+def build_corpus(size: int, repeat_ratio: float, seed: int = 42):
+    """Seed complaints plus random fragment combinations; some items repeat verbatim"""
+    rng = random.Random(seed)
+    corpus = []
+    for _ in range(size):
+        if corpus and rng.random() < repeat_ratio:
+            corpus.append(rng.choice(corpus))
+            continue
+        base = rng.choice(NLP_TEST_CASES)
+        fragments = rng.sample(EXTRA_FRAGMENTS, rng.randint(0, 3))
+        corpus.append(', '.join([base] + fragments))
+    return corpus
+
+
+def summarize(name, latencies_ms, total_s, count):
+    latencies_ms = sorted(latencies_ms)
+    p95 = latencies_ms[int(len(latencies_ms) * 0.95) - 1] if latencies_ms else 0
+    print(f"  {name:<34} p50 {statistics.median(latencies_ms):8.2f} ms"
+          f"   p95 {p95:8.2f} ms   {count / total_s:9.1f} complaints/s")
+
+
+def time_calls(fn, items):
+    latencies = []
+    start = time.perf_counter()
+    for item in items:
+        t0 = time.perf_counter()
+        fn(item)
+        latencies.append((time.perf_counter() - t0) * 1000)
+    return latencies, time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--size', type=int, default=300, help='complaints in the corpus')
+    parser.add_argument('--repeat-ratio', type=float, default=0.3, help='share of verbatim repeats')
+    parser.add_argument('--batch-size', type=int, default=16)
+    parser.add_argument('--threads', type=int, default=None, help='torch intra-op threads')
+    parser.add_argument('--model', default='d4data/biomedical-ner-all')
+    args = parser.parse_args()
+
+    corpus = build_corpus(args.size, args.repeat_ratio)
+    print_header("NLP Extraction Benchmark")
+    print(f"  Corpus: {len(corpus)} complaints, {len(set(corpus))} unique\n")
+
+    dictionary = NLPExtractor()
+    dictionary.extract(corpus[0])
+    latencies, total = time_calls(dictionary.extract, corpus)
+    summarize("dictionary", latencies, total, len(corpus))
+
+    if not TransformerNERBackend.available():
+        print("\n  torch/transformers not installed - skipping transformer backend")
+        return
+
+    t0 = time.perf_counter()
+    backend = TransformerNERBackend(model_name=args.model, num_threads=args.threads, max_batch_size=args.batch_size)
+    print(f"  transformer load + int8 quantize: {time.perf_counter() - t0:.1f} s, {backend.num_threads} threads")
+
+    backend.extract_entities(corpus[0])
+    latencies, total = time_calls(backend.extract_entities, corpus)
+    summarize("transformer single (cold cache)", latencies, total, len(corpus))
+    latencies, total = time_calls(backend.extract_entities, corpus)
+    summarize("transformer single (warm cache)", latencies, total, len(corpus))
+
+    batches = [corpus[i:i + args.batch_size] for i in range(0, len(corpus), args.batch_size)]
+    latencies, total = time_calls(backend.extract_batch, batches)
+    summarize(f"transformer bucketed batch x{args.batch_size}", latencies, total, len(corpus))
+    print(f"  tokenizer cache: {backend.cache_info()}")
+
+
+if __name__ == "__main__":
+    main()
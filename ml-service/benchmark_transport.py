@@ -0,0 +1,122 @@
+#!/usr/bin/env python3
+"""
+Transport Benchmark Script
+Measures per-call latency of the ML service over a new TCP connection per
+call, a reused TCP keep-alive connection and a Unix domain socket (new and
+reused), against in-process waitress servers running the real app
+"""
+
+import argparse
+import http.client
+import json
+import os
+import socket
+import statistics
+import tempfile
+import threading
+import time
+
+from test_integration import print_header
+from transport import create_server
+
+DETERIORATION_PAYLOAD = {
+    "vitalSigns": {"heartRate": 110, "respiratoryRate": 22, "oxygenSaturation": 93},
+    "age": 67,
+    "currentPriority": "YELLOW",
+    "waitingTime": 45,
+    "symptoms": [{"symptom": "Chest Pain", "severity": "severe"}],
+    "riskFactors": []
+}
+
+
+class UnixHTTPConnection(http.client.HTTPConnection):
+    """HTTPConnection over a Unix domain socket"""
+
+    def __init__(self, socket_path: str):
+        super().__init__('localhost')
+        self.socket_path = socket_path
+
+    def connect(self):
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.sock.connect(self.socket_path)
+
+
+def serve(app, **kwargs):
+    server = create_server(app, **kwargs)
+    threading.Thread(target=server.run, daemon=True).start()
+    return server
+
+
+def call(connection, method, path, body):
+    headers = {'Content-Type': 'application/json'} if body is not None else {}
+    connection.request(method, path, body=body, headers=headers)
+    response = connection.getresponse()
+    response.read()
+    if response.status != 200:
+        raise RuntimeError(f"{method} {path} returned {response.status}")
+
+
+def time_calls(make_connection, reuse, method, path, body, count):
+    latencies = []
+    connection = make_connection() if reuse else None
+    start = time.perf_counter()
+    for _ in range(count):
+        t0 = time.perf_counter()
+        if reuse:
+            call(connection, method, path, body)
+        else:
+            fresh = make_connection()
+            call(fresh, method, path, body)
+            fresh.close()
+        latencies.append((time.perf_counter() - t0) * 1000)
+    total = time.perf_counter() - start
+    if connection is not None:
+        connection.close()
+    return latencies, total
+
+
+def summarize(name, latencies_ms, total_s, count):
+    latencies_ms = sorted(latencies_ms)
+    p99 = latencies_ms[int(len(latencies_ms) * 0.99) - 1] if latencies_ms else 0
+    print(f"  {name:<26} p50 {statistics.median(latencies_ms):7.3f} ms"
+          f"   p99 {p99:7.3f} ms   {count / total_s:8.1f} calls/s")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--calls', type=int, default=2000)
+    parser.add_argument('--endpoint', choices=('health', 'deterioration'), default='deterioration')
+    args = parser.parse_args()
+
+    from app import app
+
+    if args.endpoint == 'health':
+        method, path, body = 'GET', '/health', None
+    else:
+        method, path, body = 'POST', '/api/predict/deterioration', json.dumps(DETERIORATION_PAYLOAD)
+
+    socket_path = os.path.join(tempfile.mkdtemp(prefix='ml-transport-'), 'ml.sock')
+    tcp_server = serve(app)
+    uds_server = serve(app, socket_path=socket_path)
+    tcp_port = tcp_server.effective_port
+
+    transports = [
+        ("tcp new connection", lambda: http.client.HTTPConnection('127.0.0.1', tcp_port), False),
+        ("tcp keep-alive", lambda: http.client.HTTPConnection('127.0.0.1', tcp_port), True),
+        ("uds new connection", lambda: UnixHTTPConnection(socket_path), False),
+        ("uds keep-alive", lambda: UnixHTTPConnection(socket_path), True),
+    ]
+
+    print_header("ML Service Transport Benchmark")
+    print(f"  {method} {path}, {args.calls} sequential calls per transport\n")
+    for name, make_connection, reuse in transports:
+        time_calls(make_connection, reuse, method, path, body, min(100, args.calls))
+        latencies, total = time_calls(make_connection, reuse, method, path, body, args.calls)
+        summarize(name, latencies, total, args.calls)
+
+    tcp_server.close()
+    uds_server.close()
+
+
+if __name__ == "__main__":
+    main()
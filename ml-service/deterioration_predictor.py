@@ -1,10 +1,128 @@
 import numpy as np
-import pandas as pd
 from datetime import datetime, timedelta
 import joblib
 import os
+from typing import Dict, List
+
+from tracing import span
+
+# Order of the per-feature contributions in a score; to_dict() zips them into shap_values
+FEATURES = ('heart_rate', 'oxygen_saturation', 'systolic_bp', 'respiratory_rate', 'temperature',
+            'consciousness', 'age', 'waiting_time', 'symptom_count', 'risk_factors')
+(HEART_RATE, OXYGEN_SATURATION, SYSTOLIC_BP, RESPIRATORY_RATE, TEMPERATURE,
+ CONSCIOUSNESS, AGE, WAITING_TIME, SYMPTOM_COUNT, RISK_FACTORS) = range(len(FEATURES))
+
+ESCALATION_RED = "⚠️ CRITICAL: Immediate escalation to RED predicted"
+ESCALATION_YELLOW = "⚠️ WARNING: Escalation to YELLOW predicted"
+
+# Per feature, in FEATURES order: (input key, default, {contribution: reason template}).
+# Each band of a feature scores differently, so the reasons are rebuilt from the
+# contributions and inputs on serialization instead of being formatted while scoring.
+REASON_TEMPLATES = (
+    ('heart_rate', 80, {
+        30: "Critical heart rate detected: {} bpm",
+        20: "Abnormal heart rate: {} bpm",
+        10: "Elevated heart rate: {} bpm"
+    }),
+    ('oxygen_saturation', 98, {
+        30: "Critical oxygen saturation: {}%",
+        20: "Low oxygen saturation: {}%",
+        10: "Reduced oxygen saturation: {}%"
+    }),
+    ('systolic_bp', 120, {
+        30: "Critical blood pressure: {} mmHg",
+        20: "Abnormal blood pressure: {} mmHg",
+        12: "Elevated blood pressure: {} mmHg"
+    }),
+    ('respiratory_rate', 16, {
+        30: "Critical respiratory rate: {}/min",
+        20: "Abnormal respiratory rate: {}/min",
+        10: "Elevated respiratory rate: {}/min"
+    }),
+    ('temperature', 37.0, {
+        25: "Critical temperature: {}°C",
+        15: "Abnormal temperature: {}°C",
+        8: "Fever: {}°C"
+    }),
+    ('consciousness', 'alert', {
+        40: "Patient unresponsive - CRITICAL",
+        25: "Responds only to pain",
+        15: "Responds to verbal stimuli"
+    }),
+    ('age', 40, {
+        15: "Infant - high risk",
+        10: "Age-related risk: {} years",
+        8: "Young child: {} years",
+        5: "Elderly patient: {} years"
+    }),
+    # Only the step past two hours is worth a reason
+    ('waiting_time', 0, {
+        15: "Extended wait time: {} minutes"
+    }),
+    ('symptom_count', 0, {
+        20: "Multiple severe symptoms: {}",
+        10: "Presence of symptoms: {}"
+    }),
+    ('risk_factor_count', 0, {
+        15: "Multiple significant risk factors: {}",
+        8: "Presence of risk factors: {}"
+    }),
+)
+
+
+class RiskAssessment:
+    """
+    One prediction, kept compact until it is serialized. The reasoning text
+    and the shap_values dict are only built by to_dict(), so callers that
+    just rank by score (the hospital queues) never allocate them.
+    """
+
+    __slots__ = ('risk_score', 'deterioration_probability', 'predicted_escalation_time', 'confidence',
+                 'predicted_priority', 'escalation', 'contributions', 'features', 'model_version')
+
+    def __init__(self, risk_score, deterioration_probability, predicted_escalation_time, confidence,
+                 predicted_priority, escalation, contributions, features, model_version):
+        self.risk_score = risk_score
+        self.deterioration_probability = deterioration_probability
+        self.predicted_escalation_time = predicted_escalation_time
+        self.confidence = confidence
+        self.predicted_priority = predicted_priority
+        self.escalation = escalation
+        self.contributions = contributions
+        self.features = features
+        self.model_version = model_version
+
+    def reasoning(self) -> List[str]:
+        reasoning = [self.escalation] if self.escalation else []
+        for contribution, (key, default, templates) in zip(self.contributions, REASON_TEMPLATES):
+            template = templates.get(contribution)
+            if template is not None:
+                reasoning.append(template.format(self.features.get(key, default)))
+        return reasoning
+
+    def to_dict(self) -> Dict:
+        return {
+            'risk_score': self.risk_score,
+            'deterioration_probability': self.deterioration_probability,
+            'predicted_escalation_time': (self.predicted_escalation_time.isoformat()
+                                          if self.predicted_escalation_time else None),
+            'confidence': self.confidence,
+            'predicted_priority': self.predicted_priority,
+            'ai_reasoning': self.reasoning(),
+            'shap_values': dict(zip(FEATURES, self.contributions)),
+            'model_version': self.model_version
+        }
+
 
 class DeteriorationPredictor:
+    # (minutes waited, risk points) - the first threshold exceeded applies
+    WAITING_TIME_STEPS = ((120, 15), (60, 8))
+    # Risk scores at which escalation to RED / YELLOW is predicted
+    RED_THRESHOLD = 40
+    YELLOW_THRESHOLD = 25
+    # Longest waiting-time projection; the grid is patients x minutes
+    MAX_HORIZON_MINUTES = 24 * 60
+    
     def __init__(self):
         self.model = None
         self.model_version = "1.0.0"
@@ -46,7 +164,7 @@ class DeteriorationPredictor:
     def predict(self, features):
         """
         Predict deterioration risk
-        Returns: {
+        Returns assess(features).to_dict(): {
             'risk_score': float (0-100),
             'deterioration_probability': float (0-1),
             'predicted_escalation_time': datetime or None,
@@ -56,6 +174,63 @@ class DeteriorationPredictor:
             'shap_values': dict (feature importance)
         }
         """
+        return self.assess(features).to_dict()
+    
+    def assess(self, features) -> RiskAssessment:
+        """Predict deterioration risk without building the response dict"""
+        hr = features.get('heart_rate', 80)
+        spo2 = features.get('oxygen_saturation', 98)
+        age = features.get('age', 40)
+        current_priority = features.get('current_priority', 'GREEN')
+        
+        with span('deterioration.score'):
+            risk_score, contributions = self._score(features)
+        
+        # Calculate deterioration probability
+        deterioration_probability = risk_score / 100.0
+        
+        # Predict if escalation will occur (aligned with backend TriageEngine thresholds)
+        predicted_priority = current_priority
+        predicted_escalation_time = None
+        escalation = None
+        
+        # Adjust priority_level based on the new self.priority_map where GREEN is 0, YELLOW 1, RED 2
+        priority_level = self.priority_map.get(current_priority, 0) # Default to GREEN (0)
+        
+        if risk_score >= self.RED_THRESHOLD and priority_level < self.priority_map['RED']:
+            predicted_priority = 'RED'
+            predicted_escalation_time = datetime.now() + timedelta(minutes=8)
+            escalation = ESCALATION_RED
+        elif risk_score >= self.YELLOW_THRESHOLD and priority_level < self.priority_map['YELLOW']:
+            predicted_priority = 'YELLOW'
+            predicted_escalation_time = datetime.now() + timedelta(minutes=12)
+            escalation = ESCALATION_YELLOW
+        # No explicit condition for GREEN, as it's the base case. If risk_score is below YELLOW threshold, it stays/becomes GREEN.
+
+        
+        # Calculate confidence (based on data quality)
+        confidence = 0.85  # Base confidence
+        if hr == 0 or spo2 == 0:
+            confidence -= 0.2
+        if age == 0:
+            confidence -= 0.1
+        
+        confidence = max(0.5, min(1.0, confidence))
+        
+        return RiskAssessment(
+            round(risk_score, 2), round(deterioration_probability, 3), predicted_escalation_time,
+            round(confidence, 2), predicted_priority, escalation, contributions, features, self.model_version
+        )
+    
+    def _waiting_time_contribution(self, waiting_time):
+        """Risk points added for time spent waiting (steps at WAITING_TIME_STEPS)"""
+        for threshold, contribution in self.WAITING_TIME_STEPS:
+            if waiting_time > threshold:
+                return contribution
+        return 0
+    
+    def _score(self, features):
+        """Rule-based risk score (capped at 100) and per-feature contributions"""
         # Extract and normalize features
         hr = features.get('heart_rate', 80)
         rr = features.get('respiratory_rate', 16)
@@ -71,231 +246,237 @@ class DeteriorationPredictor:
         
         # Calculate risk score (rule-based for demo)
         risk_score = 0
-        reasoning = []
-        shap_values = {}
+        contributions = [0] * len(FEATURES)
         
         # Heart rate analysis
         if hr < 40 or hr > 140:
             contribution = 30
             risk_score += contribution
-            shap_values['heart_rate'] = contribution
-            reasoning.append(f"Critical heart rate detected: {hr} bpm")
+            contributions[HEART_RATE] = contribution
         elif hr < 50 or hr > 120:
             contribution = 20
             risk_score += contribution
-            shap_values['heart_rate'] = contribution
-            reasoning.append(f"Abnormal heart rate: {hr} bpm")
+            contributions[HEART_RATE] = contribution
         elif hr < 60 or hr > 100:
             contribution = 10
             risk_score += contribution
-            shap_values['heart_rate'] = contribution
-            reasoning.append(f"Elevated heart rate: {hr} bpm")
-        else:
-            shap_values['heart_rate'] = 0
+            contributions[HEART_RATE] = contribution
         
         # Oxygen saturation analysis
         if spo2 < 90:
             contribution = 30
             risk_score += contribution
-            shap_values['oxygen_saturation'] = contribution
-            reasoning.append(f"Critical oxygen saturation: {spo2}%")
+            contributions[OXYGEN_SATURATION] = contribution
         elif spo2 < 94:
             contribution = 20
             risk_score += contribution
-            shap_values['oxygen_saturation'] = contribution
-            reasoning.append(f"Low oxygen saturation: {spo2}%")
+            contributions[OXYGEN_SATURATION] = contribution
         elif spo2 < 96:
             contribution = 10
             risk_score += contribution
-            shap_values['oxygen_saturation'] = contribution
-            reasoning.append(f"Reduced oxygen saturation: {spo2}%")
-        else:
-            shap_values['oxygen_saturation'] = 0
+            contributions[OXYGEN_SATURATION] = contribution
         
         # Blood pressure analysis
         # Assuming only systolic is used for simplicity, matching TriageEngine's direct systolic contributions
         if bp < 90 or bp > 200:
             contribution = 30
             risk_score += contribution
-            shap_values['systolic_bp'] = contribution
-            reasoning.append(f"Critical blood pressure: {bp} mmHg")
+            contributions[SYSTOLIC_BP] = contribution
         elif bp < 100 or bp > 180:
             contribution = 20
             risk_score += contribution
-            shap_values['systolic_bp'] = contribution
-            reasoning.append(f"Abnormal blood pressure: {bp} mmHg")
+            contributions[SYSTOLIC_BP] = contribution
         elif bp > 140: # This specific rule is present in TriageEngine
             contribution = 12
             risk_score += contribution
-            shap_values['systolic_bp'] = contribution
-            reasoning.append(f"Elevated blood pressure: {bp} mmHg")
-        else:
-            shap_values['systolic_bp'] = 0
+            contributions[SYSTOLIC_BP] = contribution
         
         # Respiratory rate
         if rr < 8 or rr > 30:
             contribution = 30
             risk_score += contribution
-            shap_values['respiratory_rate'] = contribution
-            reasoning.append(f"Critical respiratory rate: {rr}/min")
+            contributions[RESPIRATORY_RATE] = contribution
         elif rr < 10 or rr > 24:
             contribution = 20
             risk_score += contribution
-            shap_values['respiratory_rate'] = contribution
-            reasoning.append(f"Abnormal respiratory rate: {rr}/min")
+            contributions[RESPIRATORY_RATE] = contribution
         elif rr < 12 or rr > 20:
             contribution = 10
             risk_score += contribution
-            shap_values['respiratory_rate'] = contribution
-            reasoning.append(f"Elevated respiratory rate: {rr}/min")
-        else:
-            shap_values['respiratory_rate'] = 0
+            contributions[RESPIRATORY_RATE] = contribution
         
         # Temperature
         if temp < 35 or temp > 40:
             contribution = 25
             risk_score += contribution
-            shap_values['temperature'] = contribution
-            reasoning.append(f"Critical temperature: {temp}°C")
+            contributions[TEMPERATURE] = contribution
         elif temp < 36 or temp > 39:
             contribution = 15
             risk_score += contribution
-            shap_values['temperature'] = contribution
-            reasoning.append(f"Abnormal temperature: {temp}°C")
+            contributions[TEMPERATURE] = contribution
         elif temp > 38: # This specific rule is present in TriageEngine
             contribution = 8
             risk_score += contribution
-            shap_values['temperature'] = contribution
-            reasoning.append(f"Fever: {temp}°C")
-        else:
-            shap_values['temperature'] = 0
+            contributions[TEMPERATURE] = contribution
         
         # Consciousness level
         if consciousness == 'unresponsive':
             contribution = 40
             risk_score += contribution
-            shap_values['consciousness'] = contribution
-            reasoning.append('Patient unresponsive - CRITICAL')
+            contributions[CONSCIOUSNESS] = contribution
         elif consciousness == 'pain':
             contribution = 25
             risk_score += contribution
-            shap_values['consciousness'] = contribution
-            reasoning.append('Responds only to pain')
+            contributions[CONSCIOUSNESS] = contribution
         elif consciousness == 'verbal':
             contribution = 15
             risk_score += contribution
-            shap_values['consciousness'] = contribution
-            reasoning.append('Responds to verbal stimuli')
-        else: # 'alert'
-            shap_values['consciousness'] = 0
+            contributions[CONSCIOUSNESS] = contribution
         
         # Age factor
         if age < 1:
             contribution = 15
             risk_score += contribution
-            shap_values['age'] = contribution
-            reasoning.append("Infant - high risk")
+            contributions[AGE] = contribution
         elif age >= 75:
             contribution = 10
             risk_score += contribution
-            shap_values['age'] = contribution
-            reasoning.append(f"Age-related risk: {age} years")
+            contributions[AGE] = contribution
         elif age < 5:
             contribution = 8
             risk_score += contribution
-            shap_values['age'] = contribution
-            reasoning.append(f"Young child: {age} years")
+            contributions[AGE] = contribution
         elif age > 65:
             contribution = 5
             risk_score += contribution
-            shap_values['age'] = contribution
-            reasoning.append(f"Elderly patient: {age} years")
-        else:
-            shap_values['age'] = 0
+            contributions[AGE] = contribution
         
         # Waiting time factor (deterioration risk increases with wait)
         # TriageEngine uses waiting time for escalation, not initial scoring.
         # This is a place where AI can add value by predicting deterioration due to wait.
-        if waiting_time > 120: # Example: more than 2 hours
-            contribution = 15
-            risk_score += contribution
-            shap_values['waiting_time'] = contribution
-            reasoning.append(f"Extended wait time: {waiting_time} minutes")
-        elif waiting_time > 60: # Example: more than 1 hour
-            contribution = 8
-            risk_score += contribution
-            shap_values['waiting_time'] = contribution
-        else:
-            shap_values['waiting_time'] = 0
+        contribution = self._waiting_time_contribution(waiting_time)
+        risk_score += contribution
+        contributions[WAITING_TIME] = contribution
         
         # Symptom burden (approximated from TriageEngine's detailed symptom scoring)
         if symptom_count >= 3: # Backend has critical symptoms contributing 30-40, urgent 15-25
             contribution = 20
             risk_score += contribution
-            shap_values['symptom_count'] = contribution
-            reasoning.append(f"Multiple severe symptoms: {symptom_count}")
+            contributions[SYMPTOM_COUNT] = contribution
         elif symptom_count >= 1:
             contribution = 10
             risk_score += contribution
-            shap_values['symptom_count'] = contribution
-            reasoning.append(f"Presence of symptoms: {symptom_count}")
-        else:
-            shap_values['symptom_count'] = 0
+            contributions[SYMPTOM_COUNT] = contribution
         
         # Risk factors (approximated from TriageEngine's detailed risk factor scoring)
         if risk_factor_count >= 2: # Backend has high-risk conditions contributing 20
             contribution = 15
             risk_score += contribution
-            shap_values['risk_factors'] = contribution
-            reasoning.append(f"Multiple significant risk factors: {risk_factor_count}")
+            contributions[RISK_FACTORS] = contribution
         elif risk_factor_count >= 1:
             contribution = 8
             risk_score += contribution
-            shap_values['risk_factors'] = contribution
-            reasoning.append(f"Presence of risk factors: {risk_factor_count}")
-        else:
-            shap_values['risk_factors'] = 0
+            contributions[RISK_FACTORS] = contribution
         
         # Cap at 100
         risk_score = min(risk_score, 100)
         
-        # Calculate deterioration probability
-        deterioration_probability = risk_score / 100.0
+        return risk_score, contributions
+    
+    def project_waiting_horizon(self, features, horizon_minutes=240):
+        """Risk curve over the next horizon_minutes of waiting for one patient"""
+        return self.project_waiting_horizon_batch([features], horizon_minutes)[0]
+    
+    def project_waiting_horizon_batch(self, features_list, horizon_minutes=240, include_curve=True):
+        """
+        Project how each patient's risk evolves if they keep waiting.
         
-        # Predict if escalation will occur (aligned with backend TriageEngine thresholds)
-        predicted_priority = current_priority
-        predicted_escalation_time = None
+        Everything except waiting time is held fixed, so the score is a step
+        function of waiting time. All patients are evaluated over a minute grid
+        in one vectorized pass.
         
-        # Adjust priority_level based on the new self.priority_map where GREEN is 0, YELLOW 1, RED 2
-        priority_level = self.priority_map.get(current_priority, 0) # Default to GREEN (0)
+        Returns one dict per patient: {
+            'risk_curve': list of {'waiting_time', 'risk_score', 'predicted_priority'}
+                breakpoints (each holds until the next),
+            'next_change_in_minutes': int or None within the horizon,
+            'next_change_at_waiting_time': int or None,
+            'next_risk_score': float or None,
+            'next_predicted_priority': str or None,
+            'rescore_in_minutes': int (next change, or the horizon if none)
+        }
+        With include_curve=False the risk_curve is left out, for callers that
+        only schedule the next rescore.
+        """
+        if not features_list:
+            return []
         
-        if risk_score >= 40 and priority_level < self.priority_map['RED']:
-            predicted_priority = 'RED'
-            predicted_escalation_time = datetime.now() + timedelta(minutes=8)
-            reasoning.insert(0, "⚠️ CRITICAL: Immediate escalation to RED predicted")
-        elif risk_score >= 25 and priority_level < self.priority_map['YELLOW']:
-            predicted_priority = 'YELLOW'
-            predicted_escalation_time = datetime.now() + timedelta(minutes=12)
-            reasoning.insert(0, "⚠️ WARNING: Escalation to YELLOW predicted")
-        # No explicit condition for GREEN, as it's the base case. If risk_score is below YELLOW threshold, it stays/becomes GREEN.
-
+        horizon_minutes = min(max(1, int(horizon_minutes)), self.MAX_HORIZON_MINUTES)
+        static_scores = np.empty(len(features_list))
+        start_waits = np.empty(len(features_list))
+        levels = np.empty(len(features_list), dtype=np.int64)
         
-        # Calculate confidence (based on data quality)
-        confidence = 0.85  # Base confidence
-        if hr == 0 or spo2 == 0:
-            confidence -= 0.2
-        if age == 0:
-            confidence -= 0.1
+        for i, features in enumerate(features_list):
+            waiting_time = features.get('waiting_time', 0)
+            score, contributions = self._score(features)
+            # Score without the waiting contribution; the 100 cap is reapplied below
+            static_scores[i] = score - contributions[WAITING_TIME]
+            start_waits[i] = waiting_time
+            levels[i] = self.priority_map.get(features.get('current_priority', 'GREEN'), 0)
         
-        confidence = max(0.5, min(1.0, confidence))
+        # (patients, minutes) grid of waiting times
+        minutes = start_waits[:, None] + np.arange(horizon_minutes + 1)[None, :]
+        waiting_contribution = np.zeros_like(minutes)
+        for threshold, contribution in reversed(self.WAITING_TIME_STEPS):
+            waiting_contribution = np.where(minutes > threshold, contribution, waiting_contribution)
+        risk = np.minimum(static_scores[:, None] + waiting_contribution, 100)
         
-        return {
-            'risk_score': round(risk_score, 2),
-            'deterioration_probability': round(deterioration_probability, 3),
-            'predicted_escalation_time': predicted_escalation_time.isoformat() if predicted_escalation_time else None,
-            'confidence': round(confidence, 2),
-            'predicted_priority': predicted_priority,
-            'ai_reasoning': reasoning,
-            'shap_values': shap_values,
-            'model_version': self.model_version
-        }
+        level_grid = np.broadcast_to(levels[:, None], risk.shape)
+        predicted = np.where(
+            (risk >= self.RED_THRESHOLD) & (level_grid < self.priority_map['RED']),
+            self.priority_map['RED'],
+            np.where(
+                (risk >= self.YELLOW_THRESHOLD) & (level_grid < self.priority_map['YELLOW']),
+                self.priority_map['YELLOW'],
+                level_grid
+            )
+        )
+        
+        # Breakpoints: columns where score or predicted priority differs from the previous minute
+        steps = np.zeros(risk.shape, dtype=bool)
+        steps[:, 1:] = (np.diff(risk, axis=1) != 0) | (np.diff(predicted, axis=1) != 0)
+        has_change = steps.any(axis=1)
+        first_change = steps.argmax(axis=1)
+        
+        priority_names = {level: name for name, level in self.priority_map.items()}
+        projections = []
+        for i in range(len(features_list)):
+            projection = {'horizon_minutes': horizon_minutes}
+            if include_curve:
+                columns = [0] + np.flatnonzero(steps[i]).tolist()
+                projection['risk_curve'] = [{
+                    'waiting_time': float(minutes[i, c]),
+                    'risk_score': round(float(risk[i, c]), 2),
+                    'predicted_priority': priority_names[int(predicted[i, c])]
+                } for c in columns]
+            
+            if has_change[i]:
+                c = int(first_change[i])
+                next_change = {
+                    'next_change_in_minutes': c,
+                    'next_change_at_waiting_time': float(minutes[i, c]),
+                    'next_risk_score': round(float(risk[i, c]), 2),
+                    'next_predicted_priority': priority_names[int(predicted[i, c])],
+                    'rescore_in_minutes': c
+                }
+            else:
+                next_change = {
+                    'next_change_in_minutes': None,
+                    'next_change_at_waiting_time': None,
+                    'next_risk_score': None,
+                    'next_predicted_priority': None,
+                    'rescore_in_minutes': horizon_minutes
+                }
+            
+            projection.update(next_change, model_version=self.model_version)
+            projections.append(projection)
+        return projections
@@ -0,0 +1,236 @@
+import hashlib
+import json
+import os
+import threading
+import time
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from typing import Any, Dict, Optional
+
+KEY_PREFIX = 'triagelock:ml'
+# Forecasts kept per process, in the in-memory store and in each Redis worker's local copy
+DEFAULT_MAX_FORECASTS = int(os.getenv('FORECAST_STORE_MAX_ENTRIES', 1024))
+
+
+def payload_fingerprint(payload: Any) -> str:
+    """Stable hash of a JSON-compatible payload, independent of key order"""
+    canonical = json.dumps(payload, sort_keys=True, separators=(',', ':'), default=str)
+    return hashlib.blake2b(canonical.encode('utf-8'), digest_size=16).hexdigest()
+
+
+class ForecastStore(ABC):
+    """
+    Shared store for surge forecasts and per-hospital forecaster state.
+
+    Forecast keys already encode the data they were computed from, so
+    entries are never invalidated; they expire after their TTL.
+    """
+
+    @abstractmethod
+    def get_forecast(self, hospital_id, key: str) -> Optional[Dict]:
+        ...
+
+    @abstractmethod
+    def set_forecast(self, hospital_id, key: str, forecast: Dict, ttl: int):
+        ...
+
+    @abstractmethod
+    def get_state(self, hospital_id) -> Optional[Dict]:
+        ...
+
+    @abstractmethod
+    def set_state(self, hospital_id, state: Dict):
+        ...
+
+    def status(self) -> Dict:
+        return {'backend': self.backend}
+
+
+def _prune(entries: OrderedDict, max_entries: int, now: float):
+    """Drop expired entries from the oldest end, then the oldest beyond max_entries"""
+    while entries:
+        key, (expires_at, _) = next(iter(entries.items()))
+        if expires_at >= now and len(entries) <= max_entries:
+            break
+        del entries[key]
+
+
+class InMemoryForecastStore(ForecastStore):
+    """Process-local stand-in with the same semantics, for tests and single-worker runs"""
+
+    backend = 'memory'
+
+    SNAPSHOT_VERSION = 2
+
+    def __init__(self, max_entries: int = DEFAULT_MAX_FORECASTS):
+        self._lock = threading.Lock()
+        self.max_entries = max_entries
+        # Insertion order is expiry order for a fixed TTL, so pruning on write is amortized O(1)
+        self._forecasts: OrderedDict = OrderedDict()
+        self._states: Dict[str, str] = {}
+
+    def get_forecast(self, hospital_id, key):
+        entry_key = (str(hospital_id), key)
+        with self._lock:
+            entry = self._forecasts.get(entry_key)
+            if entry is None:
+                return None
+            expires_at, forecast = entry
+            if expires_at < time.time():
+                del self._forecasts[entry_key]
+                return None
+            return json.loads(forecast)
+
+    def set_forecast(self, hospital_id, key, forecast, ttl):
+        entry_key = (str(hospital_id), key)
+        now = time.time()
+        with self._lock:
+            self._forecasts.pop(entry_key, None)
+            self._forecasts[entry_key] = (now + ttl, json.dumps(forecast))
+            _prune(self._forecasts, self.max_entries, now)
+
+    def get_state(self, hospital_id):
+        with self._lock:
+            state = self._states.get(str(hospital_id))
+        return json.loads(state) if state is not None else None
+
+    def set_state(self, hospital_id, state):
+        with self._lock:
+            self._states[str(hospital_id)] = json.dumps(state)
+
+    def snapshot_state(self) -> Dict:
+        now = time.time()
+        with self._lock:
+            return {
+                'states': [[hospital_id, state] for hospital_id, state in self._states.items()],
+                'forecasts': [[hospital_id, key, expires, forecast]
+                              for (hospital_id, key), (expires, forecast) in self._forecasts.items()
+                              if expires > now]
+            }
+
+    def restore_state(self, sections: Dict):
+        with self._lock:
+            self._states.update((hospital_id, state) for hospital_id, state in sections['states'])
+            for hospital_id, key, expires, forecast in sections['forecasts']:
+                self._forecasts[(hospital_id, key)] = (expires, forecast)
+            _prune(self._forecasts, self.max_entries, time.time())
+
+    def status(self):
+        with self._lock:
+            return {'backend': self.backend, 'forecasts': len(self._forecasts), 'hospitals': len(self._states)}
+
+
+class RedisForecastStore(ForecastStore):
+    """
+    Redis-protocol backend shared by every worker.
+
+    Each worker also keeps a small local copy of recently read forecasts,
+    never older than `local_ttl` seconds. After a failed command Redis is
+    skipped for `retry_after` seconds and a process-local store serves in
+    its place, so an outage costs one socket timeout rather than one per call.
+    """
+
+    backend = 'redis'
+
+    def __init__(self, url: str, local_ttl: float = 5.0, retry_after: float = 30.0,
+                 max_local: int = DEFAULT_MAX_FORECASTS):
+        import redis
+
+        self._errors = (redis.RedisError, OSError)
+        self.client = redis.Redis.from_url(url, socket_timeout=0.5, socket_connect_timeout=0.5)
+        self.local_ttl = local_ttl
+        self.retry_after = retry_after
+        self.max_local = max_local
+        self._local: OrderedDict = OrderedDict()
+        self._local_lock = threading.Lock()
+        self._fallback = InMemoryForecastStore(max_local)
+        self._down_until = 0.0
+
+    def _forecast_key(self, hospital_id, key):
+        return f'{KEY_PREFIX}:hospital:{hospital_id}:forecast:{key}'
+
+    def _state_key(self, hospital_id):
+        return f'{KEY_PREFIX}:hospital:{hospital_id}:state'
+
+    def _available(self) -> bool:
+        return time.time() >= self._down_until
+
+    def _trip(self, operation: str, error: Exception):
+        if self._available():
+            print(f"Forecast store {operation} failed, using local store for {self.retry_after:.0f}s: {error}")
+        self._down_until = time.time() + self.retry_after
+
+    def get_forecast(self, hospital_id, key):
+        hospital_id = str(hospital_id)
+        now = time.time()
+        with self._local_lock:
+            entry = self._local.get((hospital_id, key))
+        if entry is not None and entry[0] > now:
+            return json.loads(entry[1])
+        if not self._available():
+            return self._fallback.get_forecast(hospital_id, key)
+
+        try:
+            raw = self.client.get(self._forecast_key(hospital_id, key))
+        except self._errors as e:
+            self._trip('read', e)
+            return self._fallback.get_forecast(hospital_id, key)
+        if raw is None:
+            return None
+
+        with self._local_lock:
+            self._local.pop((hospital_id, key), None)
+            self._local[(hospital_id, key)] = (now + self.local_ttl, raw)
+            _prune(self._local, self.max_local, now)
+        return json.loads(raw)
+
+    def set_forecast(self, hospital_id, key, forecast, ttl):
+        hospital_id = str(hospital_id)
+        if self._available():
+            try:
+                self.client.set(self._forecast_key(hospital_id, key), json.dumps(forecast), ex=ttl)
+                return
+            except self._errors as e:
+                self._trip('write', e)
+        self._fallback.set_forecast(hospital_id, key, forecast, ttl)
+
+    def get_state(self, hospital_id):
+        if not self._available():
+            return self._fallback.get_state(hospital_id)
+        try:
+            raw = self.client.get(self._state_key(hospital_id))
+        except self._errors as e:
+            self._trip('read', e)
+            return self._fallback.get_state(hospital_id)
+        return json.loads(raw) if raw is not None else None
+
+    def set_state(self, hospital_id, state):
+        if self._available():
+            try:
+                self.client.set(self._state_key(hospital_id), json.dumps(state))
+                return
+            except self._errors as e:
+                self._trip('write', e)
+        self._fallback.set_state(hospital_id, state)
+
+    def status(self):
+        reachable = False
+        if self._available():
+            try:
+                reachable = bool(self.client.ping())
+            except self._errors as e:
+                self._trip('ping', e)
+        return {'backend': self.backend, 'reachable': reachable, 'local_copies': len(self._local)}
+
+
+def create_forecast_store() -> ForecastStore:
+    """Pick the store from FORECAST_STORE / REDIS_URL, falling back to in-memory"""
+    redis_url = os.getenv('REDIS_URL')
+    backend = os.getenv('FORECAST_STORE', 'redis' if redis_url else 'memory')
+    if backend == 'redis':
+        try:
+            return RedisForecastStore(redis_url or 'redis://localhost:6379/0',
+                                      retry_after=float(os.getenv('FORECAST_STORE_RETRY_SECONDS', 30)))
+        except ImportError:
+            print("redis package not installed, using in-memory forecast store")
+    return InMemoryForecastStore()
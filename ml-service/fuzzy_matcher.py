@@ -0,0 +1,204 @@
+import re
+import sys
+import time
+from itertools import combinations
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+_TOKEN = re.compile(r'\S+')
+_TOKEN_STRIP = '.,;:!?()[]{}"'
+
+
+def bounded_distance(a: str, b: str, limit: int) -> int:
+    """
+    Optimal-string-alignment (Damerau-Levenshtein with adjacent transpositions)
+    distance between a and b, or limit + 1 as soon as it must exceed limit.
+    """
+    if a == b:
+        return 0
+    if abs(len(a) - len(b)) > limit:
+        return limit + 1
+
+    previous_previous = None
+    previous = list(range(len(b) + 1))
+    for i in range(1, len(a) + 1):
+        current = [i] + [0] * len(b)
+        row_min = i
+        for j in range(1, len(b) + 1):
+            cost = 0 if a[i - 1] == b[j - 1] else 1
+            value = min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + cost)
+            if (previous_previous is not None and j > 1
+                    and a[i - 1] == b[j - 2] and a[i - 2] == b[j - 1]):
+                value = min(value, previous_previous[j - 2] + 1)
+            current[j] = value
+            row_min = min(row_min, value)
+        if row_min > limit:
+            return limit + 1
+        previous_previous, previous = previous, current
+    return previous[-1] if previous[-1] <= limit else limit + 1
+
+
+def _deletes(word: str, distance: int, max_length: Optional[int] = None) -> Set[str]:
+    """
+    Every string obtained by deleting up to `distance` characters from word;
+    none for words longer than `max_length`, whose variant count explodes
+    """
+    if max_length is not None and len(word) > max_length:
+        return set()
+    variants = {word}
+    for count in range(1, min(distance, len(word) - 1) + 1):
+        for positions in combinations(range(len(word)), count):
+            variants.add(''.join(char for index, char in enumerate(word) if index not in positions))
+    return variants
+
+
+class FuzzyMatcher:
+    """
+    Typo-tolerant keyword lookup over a symmetric-deletion (SymSpell) index.
+
+    Every word of every keyword is indexed under all its variants with up to
+    `max_distance` characters deleted. A typed token is looked up the same
+    way, so candidates come from a handful of dictionary probes regardless
+    of dictionary size, and only those candidates are verified with a
+    bounded edit distance. Multi-word keywords match when each word matches
+    and the total distance stays within `max_distance`.
+
+    Short tokens produce too many false corrections, so tokens shorter than
+    `min_length` are never corrected, one edit is allowed from `min_length`
+    characters and two from `min_length + 4`. Corrections must keep the first
+    letter, and tokens in `ignore` (real words near a keyword) are left alone.
+    Tokens longer than the longest dictionary word plus `max_distance` cannot
+    match and are skipped before any variants are generated.
+
+    `inflections` maps inflected forms or phrasings to the keyword they
+    stand for ("vomiting" -> "vomit", "not breathing" -> "can't breathe").
+    They are indexed like keywords, so both the form and its typos
+    ("not breathin") match the keyword, unless the tokens are already part
+    of a longer keyword match.
+    """
+
+    def __init__(self, keywords: Iterable[str], max_distance: int = 2, min_length: int = 5,
+                 ignore: Iterable[str] = (), inflections: Optional[Dict[str, str]] = None):
+        started = time.perf_counter()
+        self.max_distance = max_distance
+        self.min_length = min_length
+        self.ignore = set(ignore)
+        self._phrases: Dict[str, List[Tuple[str, Tuple[str, ...]]]] = {}
+        self._vocabulary: Set[str] = set()
+        self._index: Dict[str, List[str]] = {}
+
+        keywords = dict.fromkeys(keywords)
+        for keyword in keywords:
+            words = tuple(keyword.split())
+            if not words:
+                continue
+            self._phrases.setdefault(words[0], []).append((keyword, words))
+            self._vocabulary.update(words)
+
+        self._inflections: Set[Tuple[str, ...]] = set()
+        for form, keyword in (inflections or {}).items():
+            words = tuple(form.split())
+            if keyword in keywords and form not in keywords and words:
+                self._phrases.setdefault(words[0], []).append((keyword, words))
+                self._vocabulary.update(words)
+                self._inflections.add(words)
+
+        # Anything longer is more than max_distance deletions from every word
+        self.max_token_length = max(map(len, self._vocabulary), default=0) + max_distance
+
+        for word in self._vocabulary:
+            for variant in _deletes(word, self._allowed(len(word))):
+                self._index.setdefault(variant, []).append(word)
+
+        self.build_ms = (time.perf_counter() - started) * 1000
+
+    def _allowed(self, length: int) -> int:
+        if length < self.min_length:
+            return 0
+        if length < self.min_length + 4:
+            return min(1, self.max_distance)
+        return self.max_distance
+
+    def correct(self, token: str) -> Optional[Tuple[str, int]]:
+        """(dictionary word, distance) closest to token, or None"""
+        if token in self._vocabulary:
+            return token, 0
+        limit = self._allowed(len(token))
+        if limit == 0 or len(token) > self.max_token_length or token in self.ignore:
+            return None
+
+        best = None
+        seen = set()
+        for variant in _deletes(token, limit, self.max_token_length):
+            for word in self._index.get(variant, ()):
+                if word in seen or word[0] != token[0]:
+                    continue
+                seen.add(word)
+                distance = bounded_distance(token, word, limit)
+                if distance <= limit and (best is None or (distance, -len(word)) < (best[1], -len(best[0]))):
+                    best = (word, distance)
+        return best
+
+    def find(self, text: str, exclude: Set[str] = frozenset()) -> List[Tuple[int, int, str, int]]:
+        """
+        (start, end, keyword, distance) for keywords present in text only with
+        typos. Keywords in `exclude` (already matched exactly) are skipped.
+        """
+        tokens = []
+        for match in _TOKEN.finditer(text):
+            raw = match.group()
+            word = raw.strip(_TOKEN_STRIP)
+            if not word:
+                continue
+            start = match.start() + raw.find(word)
+            tokens.append((start, start + len(word), self.correct(word)))
+
+        matches = []
+        # Tokens inside a multi-word keyword match, exact or not
+        in_phrase = set()
+        for i, (start, _, corrected) in enumerate(tokens):
+            if corrected is None:
+                continue
+            for keyword, words in self._phrases.get(corrected[0], ()):
+                if i + len(words) > len(tokens):
+                    continue
+                distance = 0
+                for offset, word in enumerate(words):
+                    candidate = tokens[i + offset][2]
+                    if candidate is None or candidate[0] != word:
+                        break
+                    distance += candidate[1]
+                else:
+                    if distance <= self.max_distance:
+                        matches.append((i, words, keyword, distance))
+                        if len(words) > 1 and words not in self._inflections:
+                            in_phrase.update(range(i, i + len(words)))
+
+        found = []
+        for i, words, keyword, distance in matches:
+            if keyword in exclude:
+                continue
+            if words in self._inflections:
+                # Inflected forms count even when spelled right, but defer to longer keywords
+                if not in_phrase.isdisjoint(range(i, i + len(words))):
+                    continue
+            elif distance == 0:
+                continue
+            found.append((tokens[i][0], tokens[i + len(words) - 1][1], keyword, distance))
+        return found
+
+    def approx_size(self) -> int:
+        """Rough resident size of the deletion index in bytes"""
+        size = sys.getsizeof(self._index) + sys.getsizeof(self._phrases) + sys.getsizeof(self._vocabulary)
+        size += sum(sys.getsizeof(variant) + sys.getsizeof(words) for variant, words in self._index.items())
+        size += sum(sys.getsizeof(word) for word in self._vocabulary)
+        return size
+
+    def stats(self) -> Dict:
+        return {
+            'terms': len(self._vocabulary),
+            'inflections': len(self._inflections),
+            'index_entries': len(self._index),
+            'bytes': self.approx_size(),
+            'build_ms': round(self.build_ms, 2),
+            'max_distance': self.max_distance
+        }
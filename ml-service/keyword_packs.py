@@ -0,0 +1,209 @@
+import json
+import os
+import sys
+import threading
+from collections import OrderedDict
+from typing import Dict, Iterable, Iterator, List, Optional, Set, Tuple
+
+from fuzzy_matcher import FuzzyMatcher
+
+
+class KeywordMatcher:
+    """
+    Aho-Corasick automaton over a fixed keyword list.
+
+    Finds every keyword occurring as a substring of the text in a single
+    pass, so results match `keyword in text` for each keyword while the
+    cost no longer grows with dictionary size.
+    """
+
+    def __init__(self, keywords: List[str]):
+        self.keywords = list(dict.fromkeys(keywords))
+        self._goto: List[Dict[str, int]] = [{}]
+        self._fail: List[int] = [0]
+        self._output: List[List[int]] = [[]]
+        self._build()
+
+    def _build(self):
+        for index, keyword in enumerate(self.keywords):
+            state = 0
+            for char in keyword:
+                next_state = self._goto[state].get(char)
+                if next_state is None:
+                    next_state = len(self._goto)
+                    self._goto[state][char] = next_state
+                    self._goto.append({})
+                    self._fail.append(0)
+                    self._output.append([])
+                state = next_state
+            self._output[state].append(index)
+
+        # Breadth-first pass to wire failure links
+        queue = list(self._goto[0].values())
+        head = 0
+        while head < len(queue):
+            state = queue[head]
+            head += 1
+            for char, next_state in self._goto[state].items():
+                queue.append(next_state)
+                fallback = self._fail[state]
+                while fallback and char not in self._goto[fallback]:
+                    fallback = self._fail[fallback]
+                target = self._goto[fallback].get(char, 0)
+                self._fail[next_state] = target if target != next_state else 0
+                self._output[next_state] = self._output[next_state] + self._output[self._fail[next_state]]
+
+    def iter_matches(self, text: str) -> Iterator[Tuple[int, str]]:
+        """Yield (end_offset, keyword) for every occurrence in text"""
+        goto = self._goto
+        fail = self._fail
+        output = self._output
+        keywords = self.keywords
+        state = 0
+        for position, char in enumerate(text):
+            while state and char not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(char, 0)
+            for index in output[state]:
+                yield position + 1, keywords[index]
+
+    def find(self, text: str) -> Set[str]:
+        """Return the set of keywords present in text"""
+        return {keyword for _, keyword in self.iter_matches(text)}
+
+    def approx_size(self) -> int:
+        """Rough resident size of the compiled automaton in bytes"""
+        size = sys.getsizeof(self._goto) + sys.getsizeof(self._fail) + sys.getsizeof(self._output)
+        size += sum(sys.getsizeof(edges) for edges in self._goto)
+        size += sum(sys.getsizeof(out) for out in self._output)
+        size += sum(sys.getsizeof(keyword) for keyword in self.keywords)
+        return size
+
+
+class KeywordPack:
+    """
+    Symptom and condition dictionaries for one language plus their exact
+    matcher and, when `fuzzy_max_distance` > 0, a typo-tolerant index
+    """
+
+    def __init__(self, language: str, symptom_keywords: Dict, condition_keywords: Dict,
+                 fuzzy_max_distance: int = 0, fuzzy_ignore: Iterable[str] = (),
+                 inflections: Optional[Dict[str, str]] = None):
+        self.language = language
+        self.symptom_keywords = symptom_keywords
+        self.condition_keywords = condition_keywords
+        keywords = list(symptom_keywords) + list(condition_keywords)
+        # Display names and multi-word flags, shared by every extraction instead of rebuilt per match
+        self.titles = {keyword: sys.intern(keyword.title()) for keyword in keywords}
+        self.multiword = frozenset(keyword for keyword in keywords if len(keyword.split()) > 1)
+        self.matcher = KeywordMatcher(keywords)
+        self.fuzzy = FuzzyMatcher(
+            keywords, fuzzy_max_distance, ignore=fuzzy_ignore, inflections=inflections
+        ) if fuzzy_max_distance > 0 else None
+        self.size_bytes = self.matcher.approx_size() + (self.fuzzy.approx_size() if self.fuzzy else 0)
+
+    @classmethod
+    def load(cls, path: str, fuzzy_max_distance: int = 0) -> 'KeywordPack':
+        with open(path, encoding='utf-8') as f:
+            data = json.load(f)
+        return cls(
+            data['language'],
+            {k.lower(): v for k, v in data.get('symptom_keywords', {}).items()},
+            {k.lower(): v for k, v in data.get('condition_keywords', {}).items()},
+            fuzzy_max_distance=fuzzy_max_distance,
+            fuzzy_ignore=[w.lower() for w in data.get('fuzzy_ignore', [])],
+            inflections={k.lower(): v.lower() for k, v in data.get('inflections', {}).items()}
+        )
+
+
+class KeywordPackRegistry:
+    """
+    Loads per-language keyword packs from disk on first use and keeps them
+    in an LRU bounded by an approximate memory budget. Pinned packs (the
+    built-in English dictionaries) are always resident and never evicted.
+    """
+
+    SNAPSHOT_VERSION = 1
+
+    def __init__(self, pack_dir: str, memory_budget: int, pinned: Dict[str, KeywordPack],
+                 default_language: str = 'en', fuzzy_max_distance: int = 0):
+        self.pack_dir = pack_dir
+        self.fuzzy_max_distance = fuzzy_max_distance
+        self.memory_budget = memory_budget
+        self.default_language = default_language
+        self._pinned = dict(pinned)
+        self._packs: 'OrderedDict[str, KeywordPack]' = OrderedDict()
+        self._missing: Set[str] = set()
+        self._resident_bytes = 0
+        self._lock = threading.Lock()
+        self.stats = {'loads': 0, 'evictions': 0, 'hits': 0, 'fallbacks': 0}
+
+    def get(self, language: str) -> KeywordPack:
+        """Return the pack for language, falling back to the default language"""
+        pinned = self._pinned.get(language)
+        if pinned is not None:
+            return pinned
+
+        with self._lock:
+            pack = self._packs.get(language)
+            if pack is not None:
+                self._packs.move_to_end(language)
+                self.stats['hits'] += 1
+                return pack
+
+            if language not in self._missing:
+                pack = self._load(language)
+            if pack is None:
+                self.stats['fallbacks'] += 1
+                return self._pinned[self.default_language]
+
+            self._packs[language] = pack
+            self._resident_bytes += pack.size_bytes
+            self._evict()
+            return pack
+
+    def _load(self, language: str) -> Optional[KeywordPack]:
+        path = os.path.join(self.pack_dir, f"{language}.json")
+        if not os.path.exists(path):
+            self._missing.add(language)
+            return None
+        try:
+            pack = KeywordPack.load(path, self.fuzzy_max_distance)
+        except Exception as e:
+            print(f"Error loading keyword pack {path}: {e}")
+            self._missing.add(language)
+            return None
+        self.stats['loads'] += 1
+        return pack
+
+    def _evict(self):
+        # Keep the most recently loaded pack even if it alone exceeds the budget
+        while self._resident_bytes > self.memory_budget and len(self._packs) > 1:
+            _, evicted = self._packs.popitem(last=False)
+            self._resident_bytes -= evicted.size_bytes
+            self.stats['evictions'] += 1
+
+    def resident_languages(self) -> List[str]:
+        with self._lock:
+            return list(self._pinned) + list(self._packs)
+
+    def snapshot_state(self) -> Dict:
+        # Packs are rebuilt from their JSON in milliseconds; only which ones were warm is kept
+        with self._lock:
+            return {'languages': list(self._packs)}
+
+    def restore_state(self, sections: Dict):
+        """Compile the packs that were resident, least recently used first"""
+        for language in sections['languages']:
+            self.get(language)
+
+    def status(self) -> Dict:
+        with self._lock:
+            packs = {**self._pinned, **self._packs}
+            return {
+                'resident': list(packs),
+                'resident_bytes': self._resident_bytes,
+                'memory_budget': self.memory_budget,
+                'fuzzy_index': {language: pack.fuzzy.stats() for language, pack in packs.items() if pack.fuzzy},
+                **self.stats
+            }
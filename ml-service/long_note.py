@@ -0,0 +1,173 @@
+import re
+from bisect import bisect_left, bisect_right
+from typing import Dict, Iterator, List, Tuple
+
+from keyword_packs import KeywordMatcher
+
+# Cues that negate the terms that follow them (NegEx-style pre-negation)
+NEGATION_CUES = [
+    'no', 'not', 'denies', 'denied', 'deny', 'without', 'negative for', 'no signs of',
+    'no sign of', 'no evidence of', 'no history of', 'free of', 'absence of', 'never had',
+    'resolution of', 'ruled out for',
+]
+
+# Cues that negate the terms before them
+POST_NEGATION_CUES = [
+    'ruled out', 'has resolved', 'resolved', 'is absent', 'was absent', 'absent', 'unlikely',
+]
+
+# Phrases that contain a negation cue but do not negate ("no relief from chest pain").
+# They win over the shorter cue inside them and scope over nothing
+PSEUDO_NEGATION_CUES = [
+    'no relief', 'no improvement', 'no change', 'no better', 'not improving', 'not improved',
+    'not relieved', 'not resolved', 'not resolving', 'not stopping', 'did not stop', 'does not stop',
+    'will not stop', "won't stop", 'no increase', 'not only', 'not certain if', 'not sure if',
+]
+
+# Cues that make the terms that follow them uncertain
+UNCERTAINTY_CUES = [
+    'possible', 'possibly', 'probable', 'probably', 'likely', 'suspected', 'suspect', 'suspicion of',
+    'questionable', 'query', 'concern for', 'concerning for', 'may have', 'might have', 'could be',
+    'rule out', 'r/o', 'cannot exclude', 'differential includes', 'versus',
+]
+
+# Cues that make the terms before them uncertain
+POST_UNCERTAINTY_CUES = [
+    'is suspected', 'was suspected', 'not excluded', 'cannot be excluded', 'to be ruled out', 'is possible',
+]
+
+# Words that end a cue's scope inside a sentence ("no fever but chest pain"); a
+# comma or colon ends the scope after the word it follows
+SCOPE_TERMINATORS = {
+    'but', 'however', 'although', 'though', 'except', 'yet', 'aside', 'apart', 'which', 'whereas', 'still',
+}
+
+_SENTENCE = re.compile(r'[^.!?;\n]+')
+_WORD = re.compile(r'\S+')
+
+AFFIRMED = 'affirmed'
+UNCERTAIN = 'uncertain'
+NEGATED = 'negated'
+
+
+def iter_sentences(text: str, max_chars: int = 400) -> Iterator[Tuple[int, str]]:
+    """
+    Yield (offset, sentence) segments of text in one pass.
+
+    Sentences end at . ! ? ; or a newline. Runs longer than max_chars are
+    cut at the last whitespace before the limit so a note without
+    punctuation still streams in bounded pieces.
+    """
+    for match in _SENTENCE.finditer(text):
+        start, end = match.span()
+        while end - start > max_chars:
+            cut = text.rfind(' ', start + 1, start + max_chars)
+            if cut <= start:
+                cut = start + max_chars
+            yield start, text[start:cut]
+            start = cut
+        if text[start:end].strip():
+            yield start, text[start:end]
+
+
+class CueScopeScanner:
+    """
+    Classifies each dictionary match in a sentence as affirmed, uncertain
+    or negated.
+
+    Cues are found with their own Aho-Corasick automaton and scope over at
+    most `window` words, stopping early at a terminator such as "but" or at
+    a comma. A cue inside a match ("not breathing") is part of the term, not
+    a cue for it. Each sentence is bounded in length, so scanning a note is
+    linear in its size.
+    """
+
+    def __init__(self, window: int = 5):
+        self.window = window
+        self._cue_types: Dict[str, str] = {}
+        for cues, cue_type in ((PSEUDO_NEGATION_CUES, 'pseudo'), (NEGATION_CUES, 'neg'),
+                               (POST_NEGATION_CUES, 'post_neg'), (UNCERTAINTY_CUES, 'unc'),
+                               (POST_UNCERTAINTY_CUES, 'post_unc')):
+            for cue in cues:
+                self._cue_types.setdefault(cue, cue_type)
+        self.matcher = KeywordMatcher(list(self._cue_types))
+
+    def _cues(self, sentence: str) -> List[Tuple[int, int, str]]:
+        """Whole-word cue spans, keeping the longest where cues overlap"""
+        found = []
+        for end, cue in self.matcher.iter_matches(sentence):
+            start = end - len(cue)
+            if start > 0 and sentence[start - 1].isalnum():
+                continue
+            if end < len(sentence) and sentence[end].isalnum():
+                continue
+            found.append((start, end, self._cue_types[cue]))
+        found.sort(key=lambda span: (span[0], span[0] - span[1]))
+
+        cues = []
+        covered_until = -1
+        for start, end, cue_type in found:
+            if start >= covered_until:
+                cues.append((start, end, cue_type))
+                covered_until = end
+        return cues
+
+    def has_cues(self, text: str) -> bool:
+        """Whether text contains any whole-word cue"""
+        return bool(self._cues(text))
+
+    def classify(self, sentence: str, matches: List[Tuple[int, str]]) -> List[Tuple[str, int, str]]:
+        """(keyword, start offset, status) for each (end offset, keyword) match in sentence"""
+        if not matches:
+            return []
+        spans = [(end - len(keyword), end) for end, keyword in matches]
+        cues = [
+            (start, end, cue_type) for start, end, cue_type in self._cues(sentence)
+            if cue_type != 'pseudo' and not any(low <= start and end <= high for low, high in spans)
+        ]
+        if not cues:
+            return [(keyword, end - len(keyword), AFFIRMED) for end, keyword in matches]
+
+        # A scope may not cross a boundary: terminators are cut out on both sides,
+        # a word ending in a comma or colon closes the clause after itself
+        starts = []
+        clause_ends = []
+        scope_starts = []
+        for index, word in enumerate(_WORD.finditer(sentence)):
+            starts.append(word.start())
+            text = word.group()
+            if text.strip(',:()').lower() in SCOPE_TERMINATORS:
+                clause_ends.append(index - 1)
+                scope_starts.append(index + 1)
+            elif text[-1] in ',:':
+                clause_ends.append(index)
+                scope_starts.append(index + 1)
+
+        def word_at(offset: int) -> int:
+            return bisect_right(starts, offset) - 1
+
+        scopes = []
+        for start, end, cue_type in cues:
+            first, last = word_at(start), word_at(end - 1)
+            if cue_type in ('neg', 'unc'):
+                stop = bisect_left(clause_ends, last)
+                limit = clause_ends[stop] if stop < len(clause_ends) else last + self.window
+                scopes.append((last + 1, min(last + self.window, limit), cue_type == 'neg'))
+            else:
+                stop = bisect_right(scope_starts, first) - 1
+                floor = scope_starts[stop] if stop >= 0 else first - self.window
+                scopes.append((max(first - self.window, floor), first - 1, cue_type == 'post_neg'))
+
+        classified = []
+        for end, keyword in matches:
+            start = end - len(keyword)
+            first, last = word_at(start), word_at(end - 1)
+            status = AFFIRMED
+            for low, high, negates in scopes:
+                if low <= first <= high or low <= last <= high:
+                    if negates:
+                        status = NEGATED
+                        break
+                    status = UNCERTAIN
+            classified.append((keyword, start, status))
+        return classified
@@ -0,0 +1,316 @@
+import importlib.util
+import json
+import logging
+import os
+import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from typing import Dict, Optional, Tuple
+
+import numpy as np
+
+# Bumped when the on-disk layout changes; files with another version are refitted
+FORMAT_VERSION = 1
+# Half-width of a 90% normal interval in standard deviations
+_Z90 = 1.645
+
+
+class ProphetFitter:
+    """Fits one Prophet model per hospital with daily and weekly seasonality"""
+
+    name = 'prophet'
+
+    def __init__(self, interval_width: float = 0.9):
+        self.interval_width = interval_width
+        # cmdstanpy logs every chain at INFO unless a handler is already configured
+        stan_logger = logging.getLogger('cmdstanpy')
+        if not stan_logger.handlers:
+            handler = logging.StreamHandler()
+            handler.setLevel(logging.WARNING)
+            stan_logger.addHandler(handler)
+        stan_logger.setLevel(logging.WARNING)
+
+    @staticmethod
+    def available() -> bool:
+        return importlib.util.find_spec('prophet') is not None
+
+    def fit(self, timestamps: np.ndarray, counts: np.ndarray):
+        import pandas as pd
+        from prophet import Prophet
+
+        model = Prophet(daily_seasonality=True, weekly_seasonality=True, yearly_seasonality=False,
+                        interval_width=self.interval_width)
+        model.fit(pd.DataFrame({'ds': pd.to_datetime(timestamps, unit='s'), 'y': counts}))
+        return model
+
+    def predict(self, model, timestamps: np.ndarray) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        import pandas as pd
+
+        frame = model.predict(pd.DataFrame({'ds': pd.to_datetime(timestamps, unit='s')}))
+        return (frame['yhat'].to_numpy(), frame['yhat_lower'].to_numpy(), frame['yhat_upper'].to_numpy())
+
+    def dumps(self, model) -> str:
+        from prophet.serialize import model_to_json
+        return model_to_json(model)
+
+    def loads(self, data: str):
+        from prophet.serialize import model_from_json
+        return model_from_json(data)
+
+
+class SeasonalModel:
+    """Precomputed hourly forecast table of one fitted model; the model itself stays on disk"""
+
+    __slots__ = ('hospital_id', 'fitted_at', 'fit_seconds', 'points', 'data_end',
+                 'table_start', 'yhat', 'lower', 'upper')
+
+    def __init__(self, hospital_id: str, fitted_at: float, fit_seconds: float, points: int,
+                 data_end: int, table_start: int, yhat: np.ndarray, lower: np.ndarray, upper: np.ndarray):
+        self.hospital_id = hospital_id
+        self.fitted_at = fitted_at
+        self.fit_seconds = fit_seconds
+        self.points = points
+        self.data_end = data_end
+        # Epoch hour (seconds // 3600) of the first row of the table
+        self.table_start = table_start
+        self.yhat = yhat
+        self.lower = lower
+        self.upper = upper
+
+    def table_end(self) -> int:
+        return self.table_start + len(self.yhat)
+
+    def lookup(self, epoch_hours: np.ndarray) -> Optional[Tuple[np.ndarray, np.ndarray]]:
+        """(means, variances) for the given epoch hours, or None if the table does not cover them"""
+        rows = epoch_hours - self.table_start
+        if len(rows) == 0 or rows.min() < 0 or rows.max() >= len(self.yhat):
+            return None
+        means = np.maximum(self.yhat[rows], 0.0)
+        # Recover a spread from the model's predictive interval (trend, seasonality and noise)
+        spread = (self.upper[rows] - self.lower[rows]) / (2 * _Z90)
+        return means, spread ** 2
+
+    def summary(self, now: float) -> Dict:
+        return {
+            'fitted_at': datetime.fromtimestamp(self.fitted_at).isoformat(),
+            'age_seconds': round(now - self.fitted_at, 1),
+            'fit_seconds': round(self.fit_seconds, 3),
+            'points': self.points,
+            'forecast_hours_left': max(0, self.table_end() - int(now) // 3600)
+        }
+
+
+class SeasonalModelCache:
+    """
+    Per-hospital cache of fitted seasonal forecasters.
+
+    Fitting takes seconds, so it never happens on the request path. Each
+    forecast request hands its history to `observe`, which only decides
+    whether a refit is due (no model yet, `refit_points` new observations,
+    or a model older than `refit_seconds`) and queues it on a small worker
+    pool. A background loop also refits stale models on schedule from the
+    last history seen. Each fit precomputes an hourly forecast table for
+    `horizon_hours`, so serving a forecast is an array lookup.
+
+    Models are written to `directory` with an atomic rename and reloaded in
+    the background at startup, so a restart serves the previous fits while
+    new ones are computed. Until a hospital has a model, callers fall back
+    to their own method.
+    """
+
+    SNAPSHOT_VERSION = 1
+
+    def __init__(self, fitter, directory: str, workers: int = 1, min_history: int = 24 * 14,
+                 refit_points: int = 24, refit_seconds: float = 6 * 3600, horizon_hours: int = 24 * 7):
+        self.fitter = fitter
+        self.directory = directory
+        self.min_history = min_history
+        self.refit_points = refit_points
+        self.refit_seconds = refit_seconds
+        self.horizon_hours = horizon_hours
+        self.stats = {'fits': 0, 'failures': 0, 'loaded': 0, 'total_fit_seconds': 0.0, 'last_fit_seconds': None}
+
+        self._models: Dict[str, SeasonalModel] = {}
+        # Latest history per hospital, used for scheduled refits
+        self._history: Dict[str, Tuple[np.ndarray, np.ndarray]] = {}
+        self._fitting = set()
+        # Hospitals whose last fit failed are not retried before this time
+        self._retry_at: Dict[str, float] = {}
+        self._lock = threading.Lock()
+        self._pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='seasonal-fit')
+        self._stop = threading.Event()
+
+        os.makedirs(directory, exist_ok=True)
+        self._pool.submit(self._load_all)
+        self._scheduler = threading.Thread(target=self._refit_loop, name='seasonal-refit', daemon=True)
+        self._scheduler.start()
+
+    def get(self, hospital_id) -> Optional[SeasonalModel]:
+        return self._models.get(str(hospital_id))
+
+    def observe(self, hospital_id, timestamps: np.ndarray, counts: np.ndarray):
+        """Record the latest history for a hospital and queue a refit if one is due"""
+        if len(counts) < self.min_history:
+            return
+        key = str(hospital_id)
+        self._history[key] = (timestamps, counts)
+        current = self._models.get(key)
+        if current is None or self._stale(current) or np.count_nonzero(timestamps > current.data_end) >= self.refit_points:
+            self._schedule(key)
+
+    def _stale(self, model: SeasonalModel) -> bool:
+        now = time.time()
+        # Refit well before the precomputed table runs out
+        return (now - model.fitted_at >= self.refit_seconds
+                or model.table_end() - int(now) // 3600 < self.horizon_hours // 2)
+
+    def _schedule(self, key: str):
+        with self._lock:
+            if key in self._fitting or time.time() < self._retry_at.get(key, 0.0):
+                return
+            self._fitting.add(key)
+        self._pool.submit(self._fit, key)
+
+    def _fit(self, key: str):
+        try:
+            timestamps, counts = self._history[key]
+            started = time.perf_counter()
+            model = self.fitter.fit(timestamps, counts)
+            fit_seconds = time.perf_counter() - started
+            fitted = self._tabulate(key, model, time.time(), fit_seconds, len(counts), int(timestamps.max()))
+            self._models[key] = fitted
+            self._save(fitted, model)
+            with self._lock:
+                self._retry_at.pop(key, None)
+                self.stats['fits'] += 1
+                self.stats['total_fit_seconds'] += fit_seconds
+                self.stats['last_fit_seconds'] = round(fit_seconds, 3)
+        except Exception as e:
+            print(f"Seasonal model fit failed for hospital {key}: {e}")
+            with self._lock:
+                self.stats['failures'] += 1
+                self._retry_at[key] = time.time() + min(self.refit_seconds, 600.0)
+        finally:
+            with self._lock:
+                self._fitting.discard(key)
+
+    def _tabulate(self, key: str, model, fitted_at: float, fit_seconds: float, points: int,
+                  data_end: int) -> SeasonalModel:
+        table_start = int(time.time()) // 3600
+        hours = (table_start + np.arange(self.horizon_hours)) * 3600
+        yhat, lower, upper = self.fitter.predict(model, hours)
+        return SeasonalModel(key, fitted_at, fit_seconds, points, data_end, table_start,
+                             np.asarray(yhat, dtype=float), np.asarray(lower, dtype=float),
+                             np.asarray(upper, dtype=float))
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, re.sub(r'[^A-Za-z0-9_-]', '_', key) + '.json')
+
+    def _save(self, fitted: SeasonalModel, model):
+        path = self._path(fitted.hospital_id)
+        temp_path = f"{path}.tmp"
+        with open(temp_path, 'w', encoding='utf-8') as f:
+            json.dump({
+                'format': FORMAT_VERSION,
+                'backend': self.fitter.name,
+                'hospital_id': fitted.hospital_id,
+                'fitted_at': fitted.fitted_at,
+                'fit_seconds': fitted.fit_seconds,
+                'points': fitted.points,
+                'data_end': fitted.data_end,
+                'model': self.fitter.dumps(model)
+            }, f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(temp_path, path)
+
+    def _load_all(self):
+        """Restore saved models; the forecast table is recomputed, which is far cheaper than a fit"""
+        for name in os.listdir(self.directory):
+            if not name.endswith('.json'):
+                continue
+            try:
+                with open(os.path.join(self.directory, name), encoding='utf-8') as f:
+                    saved = json.load(f)
+                if saved.get('format') != FORMAT_VERSION or saved.get('backend') != self.fitter.name:
+                    continue
+                key = saved['hospital_id']
+                model = self.fitter.loads(saved['model'])
+                fitted = self._tabulate(key, model, saved['fitted_at'], saved['fit_seconds'],
+                                        saved['points'], saved['data_end'])
+                # A fit that finished while loading is newer
+                self._models.setdefault(key, fitted)
+                with self._lock:
+                    self.stats['loaded'] += 1
+            except Exception as e:
+                print(f"Skipping saved seasonal model {name}: {e}")
+
+    def _refit_loop(self):
+        interval = max(60.0, min(self.refit_seconds / 4, 900.0))
+        while not self._stop.wait(interval):
+            for key in list(self._history):
+                current = self._models.get(key)
+                if current is None or self._stale(current):
+                    self._schedule(key)
+
+    def snapshot_state(self) -> Dict:
+        """Latest history per hospital, concatenated so it can be mapped back without copying"""
+        history = list(self._history.items())
+        return {
+            'hospitals': [[key, len(counts)] for key, (_, counts) in history],
+            'timestamps': np.concatenate([t for _, (t, _) in history]) if history else np.empty(0, np.int64),
+            'counts': np.concatenate([c for _, (_, c) in history]) if history else np.empty(0, np.float64)
+        }
+
+    def restore_state(self, sections: Dict):
+        """Reinstate histories; the refit loop then fits any hospital without a current model"""
+        timestamps, counts = sections['timestamps'], sections['counts']
+        start = 0
+        for key, length in sections['hospitals']:
+            self._history.setdefault(key, (timestamps[start:start + length], counts[start:start + length]))
+            start += length
+
+    def close(self):
+        self._stop.set()
+        self._pool.shutdown(wait=False)
+
+    def status(self) -> Dict:
+        now = time.time()
+        with self._lock:
+            stats = dict(self.stats)
+            fitting = len(self._fitting)
+        fits = stats.pop('fits')
+        total_fit_seconds = stats.pop('total_fit_seconds')
+        return {
+            'enabled': True,
+            'backend': self.fitter.name,
+            'fits': fits,
+            'avg_fit_seconds': round(total_fit_seconds / fits, 3) if fits else None,
+            'fitting': fitting,
+            **stats,
+            'models': {key: model.summary(now) for key, model in list(self._models.items())}
+        }
+
+
+def create_seasonal_cache() -> Optional[SeasonalModelCache]:
+    """Cache configured from SEASONAL_* settings, or None when disabled or prophet is missing"""
+    backend = os.getenv('SEASONAL_BACKEND', 'prophet')
+    if backend == 'none':
+        return None
+    if backend != 'prophet':
+        print(f"Unknown seasonal backend '{backend}', using hourly averages")
+        return None
+    if not ProphetFitter.available():
+        print("prophet not installed, surge forecasts use hourly averages")
+        return None
+    return SeasonalModelCache(
+        ProphetFitter(),
+        os.getenv('SEASONAL_MODEL_DIR', os.path.join(os.path.dirname(__file__), 'models', 'seasonal')),
+        workers=int(os.getenv('SEASONAL_FIT_WORKERS', 1)),
+        min_history=int(os.getenv('SEASONAL_MIN_HISTORY', 24 * 14)),
+        refit_points=int(os.getenv('SEASONAL_REFIT_POINTS', 24)),
+        refit_seconds=float(os.getenv('SEASONAL_REFIT_SECONDS', 6 * 3600)),
+        horizon_hours=int(os.getenv('SEASONAL_HORIZON_HOURS', 24 * 7))
+    )
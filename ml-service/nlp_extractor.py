@@ -1,8 +1,29 @@
+import itertools
 import re
-from typing import Dict, List
+from typing import Dict, List, Set, Tuple
 from langdetect import detect
 import os
 
+from keyword_packs import KeywordPack, KeywordPackRegistry
+from long_note import AFFIRMED, NEGATED, UNCERTAIN, CueScopeScanner, iter_sentences
+from tracing import span
+
+# Approximate bytes of compiled non-English packs kept resident per worker
+DEFAULT_PACK_MEMORY_BUDGET = 2 * 1024 * 1024
+
+# Output caps for long notes, so response size does not grow with the note
+MAX_LONG_NOTE_SYMPTOMS = 25
+MAX_LONG_NOTE_NEGATIONS = 25
+MAX_AUTO_DETECTED_SYMPTOMS = 5
+# Language detection only needs the start of a long note
+LANGUAGE_SAMPLE_CHARS = 2000
+# Confidence removed per edit for typo-tolerant matches
+FUZZY_DISTANCE_PENALTY = 0.15
+# Confidence kept by a critical symptom that only appears negated
+NEGATED_CRITICAL_CONFIDENCE = 0.5
+# Most specific category first when predicting the specialty
+CATEGORY_PRIORITY = ('cardiac', 'respiratory', 'neurological', 'trauma', 'gastrointestinal', 'infectious', 'general')
+
 class NLPExtractor:
     def __init__(self):
         self.model_loaded = True
@@ -64,61 +85,214 @@ class NLPExtractor:
             'infectious': 'General',
             'general': 'General'
         }
+        
+        # Real words one or two edits from a keyword that must not be "corrected" to it
+        self.fuzzy_ignore = {
+            'heard', 'hearth', 'fewer', 'couch', 'strike', 'strode', 'hypotension',
+            'chess', 'cheat', 'attach', 'sever', 'blond', 'breadth'
+        }
+        # Inflected forms and phrasings the substring matcher cannot see; the fuzzy index
+        # matches them and their typos to the keyword. Breathing maps only onto the
+        # distress phrases, since "breathing normally" is a normal finding
+        self.inflections = {
+            'not breathing': "can't breathe", 'cannot breathe': "can't breathe",
+            'cant breathe': "can't breathe", 'unable to breathe': "can't breathe",
+            'trouble breathing': 'difficulty breathing', 'labored breathing': 'difficulty breathing',
+            'laboured breathing': 'difficulty breathing', 'struggling to breathe': 'difficulty breathing',
+            'vomiting': 'vomit', 'vomited': 'vomit',
+            'coughing': 'cough', 'coughs': 'cough',
+            'headaches': 'headache',
+            'seizures': 'seizure', 'seizing': 'seizure',
+            'injuries': 'injury', 'injured': 'injury',
+            'fractured': 'fracture', 'fractures': 'fracture',
+            'burns': 'burn', 'burned': 'burn',
+            'bleeds': 'bleeding', 'bleed': 'bleeding',
+            'weakened': 'weak'
+        }
+        # Typo tolerance (edits per keyword); 0 disables the deletion index
+        fuzzy_max_distance = int(os.getenv('NLP_FUZZY_MAX_DISTANCE', 2))
+        
+        # Per-language dictionaries; English is built in, the rest load lazily from disk
+        self.default_language = 'en'
+        self.keyword_packs = KeywordPackRegistry(
+            pack_dir=os.getenv('NLP_KEYWORD_PACK_DIR', os.path.join(os.path.dirname(__file__), 'keyword_packs')),
+            memory_budget=int(os.getenv('NLP_PACK_MEMORY_BUDGET', DEFAULT_PACK_MEMORY_BUDGET)),
+            pinned={
+                self.default_language: KeywordPack(
+                    self.default_language, self.symptom_keywords, self.condition_keywords,
+                    fuzzy_max_distance=fuzzy_max_distance, fuzzy_ignore=self.fuzzy_ignore,
+                    inflections=self.inflections
+                )
+            },
+            default_language=self.default_language,
+            fuzzy_max_distance=fuzzy_max_distance
+        )
+        english = self.keyword_packs.get(self.default_language)
+        if english.fuzzy:
+            stats = english.fuzzy.stats()
+            print(f"Built fuzzy symptom index: {stats['terms']} terms, {stats['index_entries']} entries, "
+                  f"{stats['bytes'] / 1024:.0f} KB in {stats['build_ms']:.1f} ms")
+        
+        # Complaints at least this long take the sentence-windowed long-note path
+        self.long_note_threshold = int(os.getenv('NLP_LONG_NOTE_CHARS', 1000))
+        # Negation cues are English; packs without their own cue lists skip negation
+        self.cue_scanners = {'en': CueScopeScanner(window=int(os.getenv('NLP_NEGATION_WINDOW', 5)))}
+        self.severity_order = ['mild', 'moderate', 'severe', 'critical']
+        self.symptom_patterns = [
+            'pain', 'ache', 'sore', 'hurt', 'discomfort',
+            'swelling', 'swollen', 'inflammation', 'inflamed',
+            'rash', 'itching', 'burning', 'tingling',
+            'discharge', 'bleeding', 'bruising',
+            'numbness', 'stiffness', 'cramping'
+        ]
+        
+        # Follow-up suggestions per symptom category, in the order they are listed
+        self.suggestion_bundles = {
+            'cardiac': {
+                'additional_symptoms_to_check': ('Radiation of pain to arm/jaw', 'Sweating', 'Shortness of breath'),
+                'recommended_tests': ('ECG', 'Troponin levels'),
+                'risk_factors_to_assess': ('Diabetes', 'Hypertension', 'Smoking history')
+            },
+            'respiratory': {
+                'additional_symptoms_to_check': ('Wheezing', 'Cough', 'Sputum production'),
+                'recommended_tests': ('Oxygen saturation', 'Chest X-ray'),
+                'risk_factors_to_assess': ('Asthma', 'COPD', 'Smoking history')
+            },
+            'neurological': {
+                'additional_symptoms_to_check': ('Vision changes', 'Speech difficulty', 'Facial drooping', 'Limb weakness'),
+                'recommended_tests': ('CT scan', 'Neurological assessment'),
+                'risk_factors_to_assess': ()
+            },
+            'trauma': {
+                'additional_symptoms_to_check': ('Mechanism of injury', 'Loss of consciousness', 'Range of motion'),
+                'recommended_tests': ('X-ray', 'Physical examination'),
+                'risk_factors_to_assess': ()
+            }
+        }
+        # Every combination of bundles concatenated up front; responses share these tuples
+        self.suggestion_sets = {}
+        for flags in itertools.product((False, True), repeat=len(self.suggestion_bundles)):
+            bundles = [bundle for bundle, on in zip(self.suggestion_bundles.values(), flags) if on]
+            self.suggestion_sets[flags] = {
+                field: tuple(item for bundle in bundles for item in bundle[field])
+                for field in ('additional_symptoms_to_check', 'recommended_tests', 'risk_factors_to_assess')
+            }
     
     def is_loaded(self):
         return self.model_loaded
     
-    def extract(self, text: str) -> Dict:
+    def extract(self, text: str, mode: str = 'auto') -> Dict:
         """
         Extract symptoms, conditions, and metadata from chief complaint text
+        
+        Args:
+            text: Chief complaint or pasted triage note
+            mode: 'short', 'long', or 'auto' (long for text over NLP_LONG_NOTE_CHARS)
         """
+        if mode == 'long' or (mode == 'auto' and len(text) >= self.long_note_threshold):
+            with span('nlp.long_note', chars=len(text)):
+                return self.extract_long(text)
+        
         text_lower = text.lower()
         
         # Detect language
-        try:
-            language = detect(text)
-        except:
-            language = 'en'
+        with span('nlp.language') as language_span:
+            try:
+                language = detect(text)
+            except:
+                language = self.default_language
+            
+            pack = self.keyword_packs.get(language)
+            language_span.set(language=language)
+        
+        with span('nlp.keywords'):
+            mentions = list(pack.matcher.iter_matches(text_lower))
+            matched_keywords = {keyword for _, keyword in mentions}
+        
+        fuzzy_matches = []
+        if pack.fuzzy:
+            with span('nlp.fuzzy'):
+                fuzzy_matches = pack.fuzzy.find(text_lower, exclude=matched_keywords)
+        
+        # Mentions in a negation cue's scope ("no chest pain") do not count, except
+        # critical terms, which are kept and marked so a misread cue cannot under-triage
+        negated, negated_offsets = {}, set()
+        scanner = self.cue_scanners.get(pack.language)
+        if scanner is not None:
+            with span('nlp.negation'):
+                negated, negated_offsets = self._negated_mentions(scanner, text_lower, mentions, fuzzy_matches)
+        dropped = {keyword for keyword in negated if not self._is_critical(pack, keyword)}
+        if dropped:
+            matched_keywords.difference_update(dropped)
+            fuzzy_matches = [match for match in fuzzy_matches if match[2] not in dropped]
         
         # Extract symptoms
         extracted_symptoms = []
         symptom_categories = set()
         max_severity = 'mild'
         
-        severity_order = ['mild', 'moderate', 'severe', 'critical']
+        severity_order = self.severity_order
         
         # 1. Extract from keyword dictionary
-        for keyword, info in self.symptom_keywords.items():
-            if keyword in text_lower:
+        for keyword, info in pack.symptom_keywords.items():
+            if keyword in matched_keywords:
                 extracted_symptoms.append({
-                    'symptom': keyword.title(),
+                    'symptom': pack.titles[keyword],
                     'severity': info['severity'],
                     'category': info['category'],
-                    'confidence': 0.85 if len(keyword.split()) > 1 else 0.70
+                    'confidence': 0.85 if keyword in pack.multiword else 0.70
                 })
+                if keyword in negated:
+                    extracted_symptoms[-1]['confidence'] = round(
+                        extracted_symptoms[-1]['confidence'] * NEGATED_CRITICAL_CONFIDENCE, 2)
+                    extracted_symptoms[-1]['certainty'] = 'negated'
                 symptom_categories.add(info['category'])
                 
                 # Update max severity
                 if severity_order.index(info['severity']) > severity_order.index(max_severity):
                     max_severity = info['severity']
         
+        # 1b. Typo-tolerant matches ("chset pain"), confidence reduced per edit
+        fuzzy_conditions = []
+        for start, end, keyword, distance in fuzzy_matches:
+            if keyword in pack.condition_keywords:
+                fuzzy_conditions.append((keyword, distance, text[start:end]))
+            info = pack.symptom_keywords.get(keyword)
+            title = pack.titles[keyword]
+            if info is None or any(s['symptom'] == title for s in extracted_symptoms):
+                continue
+            base_confidence = 0.85 if keyword in pack.multiword else 0.70
+            if keyword in negated:
+                base_confidence *= NEGATED_CRITICAL_CONFIDENCE
+            extracted_symptoms.append({
+                'symptom': title,
+                'severity': info['severity'],
+                'category': info['category'],
+                'confidence': round(max(0.3, base_confidence - FUZZY_DISTANCE_PENALTY * distance), 2),
+                'match_distance': distance,
+                'matched_text': text[start:end]
+            })
+            if keyword in negated:
+                extracted_symptoms[-1]['certainty'] = 'negated'
+            symptom_categories.add(info['category'])
+            if severity_order.index(info['severity']) > severity_order.index(max_severity):
+                max_severity = info['severity']
+        
         # 2. NEW: Extract potential symptoms from text using word patterns
         # Look for medical-sounding words not in dictionary
-        words = text_lower.split()
+        words = []
+        negated_words = set()
+        for i, word in enumerate(re.finditer(r'\S+', text_lower)):
+            words.append(word.group())
+            if negated_offsets and not negated_offsets.isdisjoint(range(word.start(), word.end())):
+                negated_words.add(i)
         potential_symptoms = []
         
-        # Common symptom patterns
-        symptom_patterns = [
-            'pain', 'ache', 'sore', 'hurt', 'discomfort',
-            'swelling', 'swollen', 'inflammation', 'inflamed',
-            'rash', 'itching', 'burning', 'tingling',
-            'discharge', 'bleeding', 'bruising',
-            'numbness', 'stiffness', 'cramping'
-        ]
-        
         for i, word in enumerate(words):
+            if i in negated_words:
+                continue
             # Check if word matches symptom patterns
-            for pattern in symptom_patterns:
+            for pattern in self.symptom_patterns:
                 if pattern in word or word in pattern:
                     # Try to get context (body part or descriptor)
                     context = []
@@ -146,19 +320,29 @@ class NLPExtractor:
         
         # Extract conditions
         extracted_conditions = []
-        for keyword, condition_type in self.condition_keywords.items():
-            if keyword in text_lower:
+        for keyword, condition_type in pack.condition_keywords.items():
+            if keyword in matched_keywords and keyword not in negated:
                 extracted_conditions.append({
-                    'condition': keyword.title(),
+                    'condition': pack.titles[keyword],
                     'type': condition_type,
                     'confidence': 0.90
                 })
+        for keyword, distance, matched_text in fuzzy_conditions:
+            title = pack.titles[keyword]
+            if keyword in negated or any(c['condition'] == title for c in extracted_conditions):
+                continue
+            extracted_conditions.append({
+                'condition': title,
+                'type': pack.condition_keywords[keyword],
+                'confidence': round(0.90 - FUZZY_DISTANCE_PENALTY * distance, 2),
+                'match_distance': distance,
+                'matched_text': matched_text
+            })
         
         # Determine specialty
         if symptom_categories:
             # Get most critical category
-            category_priority = ['cardiac', 'respiratory', 'neurological', 'trauma', 'gastrointestinal', 'infectious', 'general']
-            for cat in category_priority:
+            for cat in CATEGORY_PRIORITY:
                 if cat in symptom_categories:
                     predicted_specialty = self.specialty_map.get(cat, 'General')
                     break
@@ -179,59 +363,247 @@ class NLPExtractor:
         return {
             'extracted_symptoms': extracted_symptoms,
             'extracted_conditions': extracted_conditions,
+            'negated_findings': [
+                {'term': pack.titles[keyword], 'first_offset': first_offset}
+                for keyword, first_offset in sorted(negated.items(), key=lambda item: item[1])
+            ],
             'predicted_specialty': predicted_specialty,
             'predicted_severity': max_severity,
             'confidence': round(avg_confidence, 2),
             'language_detected': language,
+            'keyword_pack': pack.language,
             'suggestions': suggestions,
+            'mode': 'short',
             'raw_text': text
         }
     
-    def _generate_suggestions(self, symptoms: List, conditions: List, text: str) -> Dict:
-        """Generate additional suggestions based on extracted information"""
-        suggestions = {
-            'additional_symptoms_to_check': [],
-            'recommended_tests': [],
-            'risk_factors_to_assess': []
+    def extract_long(self, text: str) -> Dict:
+        """
+        Streaming extraction for long triage notes.
+        
+        The note is read one sentence at a time. Each dictionary match is
+        classified against negation and uncertainty cues within a few words
+        of it, so "denies chest pain" no longer raises severity. Work is linear
+        in the note length, memory is bounded by the dictionary size, and the
+        reported lists are capped.
+        """
+        try:
+            language = detect(text[:LANGUAGE_SAMPLE_CHARS])
+        except:
+            language = self.default_language
+        
+        pack = self.keyword_packs.get(language)
+        scanner = self.cue_scanners.get(pack.language)
+        # keyword -> [mentions, first offset, uncertain mentions, negated mentions]; negated-only
+        # keywords are tracked apart unless critical, which are never dropped on a cue alone
+        affirmed: Dict[str, List[int]] = {}
+        negated: Dict[str, int] = {}
+        auto_detected: Dict[str, int] = {}
+        # Smallest edit distance for keywords only ever seen with typos
+        fuzzy_distance: Dict[str, int] = {}
+        exact_seen = set()
+        sentence_count = 0
+        
+        for offset, sentence in iter_sentences(text):
+            sentence_count += 1
+            sentence_lower = sentence.lower()
+            matches = list(pack.matcher.iter_matches(sentence_lower))
+            fuzzy = {}
+            if pack.fuzzy:
+                exact = {keyword for _, keyword in matches}
+                for start, end, keyword, distance in pack.fuzzy.find(sentence_lower, exclude=exact):
+                    fuzzy[start] = (sentence_lower[start:end], keyword, distance)
+                    matches.append((end, sentence_lower[start:end]))
+            candidates = {}
+            if len(auto_detected) < MAX_AUTO_DETECTED_SYMPTOMS:
+                candidates = self._pattern_candidates(sentence_lower, matches)
+                matches.extend((end, token) for end, token, _ in candidates.values())
+            
+            if scanner is not None:
+                classified = scanner.classify(sentence_lower, matches)
+            else:
+                classified = [(keyword, end - len(keyword), AFFIRMED) for end, keyword in matches]
+            for keyword, start, status in classified:
+                if start in candidates:
+                    phrase = candidates[start][2]
+                    if status != NEGATED and len(auto_detected) < MAX_AUTO_DETECTED_SYMPTOMS:
+                        auto_detected.setdefault(phrase, offset + start)
+                    continue
+                typo = fuzzy.get(start)
+                if typo is not None and typo[0] == keyword:
+                    keyword = typo[1]
+                    if status != NEGATED:
+                        fuzzy_distance[keyword] = min(typo[2], fuzzy_distance.get(keyword, typo[2]))
+                elif status != NEGATED:
+                    exact_seen.add(keyword)
+                if status == NEGATED:
+                    negated.setdefault(keyword, offset + start)
+                    if not self._is_critical(pack, keyword):
+                        continue
+                entry = affirmed.setdefault(keyword, [0, offset + start, 0, 0])
+                entry[0] += 1
+                if status == UNCERTAIN:
+                    entry[2] += 1
+                elif status == NEGATED:
+                    entry[3] += 1
+        
+        extracted_symptoms = []
+        symptom_categories = set()
+        max_severity = 'mild'
+        for keyword, (mentions, first_offset, uncertain, negations) in affirmed.items():
+            info = pack.symptom_keywords.get(keyword)
+            if info is None:
+                continue
+            confidence = 0.85 if keyword in pack.multiword else 0.70
+            # Only hedged or negated mentions ("possible stroke") lower confidence; severity still counts
+            certainty = 'affirmed'
+            if negations == mentions:
+                confidence *= NEGATED_CRITICAL_CONFIDENCE
+                certainty = 'negated'
+            elif uncertain + negations == mentions:
+                confidence *= 0.6
+                certainty = 'uncertain'
+            symptom = {
+                'symptom': pack.titles[keyword],
+                'severity': info['severity'],
+                'category': info['category'],
+                'confidence': round(confidence, 2),
+                'certainty': certainty,
+                'mentions': mentions,
+                'first_offset': first_offset
+            }
+            if keyword in fuzzy_distance and keyword not in exact_seen:
+                symptom['match_distance'] = fuzzy_distance[keyword]
+                symptom['confidence'] = round(max(0.3, confidence - FUZZY_DISTANCE_PENALTY * fuzzy_distance[keyword]), 2)
+            extracted_symptoms.append(symptom)
+            symptom_categories.add(info['category'])
+            if self.severity_order.index(info['severity']) > self.severity_order.index(max_severity):
+                max_severity = info['severity']
+        
+        extracted_symptoms.sort(
+            key=lambda s: (-self.severity_order.index(s['severity']), s['first_offset'])
+        )
+        extracted_symptoms = extracted_symptoms[:MAX_LONG_NOTE_SYMPTOMS]
+        
+        known = {s['symptom'].lower() for s in extracted_symptoms}
+        for symptom_text, first_offset in auto_detected.items():
+            if symptom_text in known or len(extracted_symptoms) >= MAX_LONG_NOTE_SYMPTOMS:
+                continue
+            extracted_symptoms.append({
+                'symptom': symptom_text.title(),
+                'severity': 'moderate',
+                'category': 'general',
+                'confidence': 0.50,
+                'certainty': 'affirmed',
+                'mentions': 1,
+                'first_offset': first_offset
+            })
+            symptom_categories.add('general')
+        
+        extracted_conditions = []
+        for keyword, (mentions, first_offset, uncertain, negations) in affirmed.items():
+            condition_type = pack.condition_keywords.get(keyword)
+            if condition_type is None or negations == mentions:
+                continue
+            uncertain += negations
+            condition = {
+                'condition': pack.titles[keyword],
+                'type': condition_type,
+                'confidence': 0.54 if uncertain == mentions else 0.90,
+                'certainty': 'uncertain' if uncertain == mentions else 'affirmed'
+            }
+            if keyword in fuzzy_distance and keyword not in exact_seen:
+                condition['match_distance'] = fuzzy_distance[keyword]
+                condition['confidence'] = round(condition['confidence'] - FUZZY_DISTANCE_PENALTY * fuzzy_distance[keyword], 2)
+            extracted_conditions.append(condition)
+        
+        negated_findings = [
+            {'term': pack.titles[keyword], 'first_offset': first_offset}
+            for keyword, first_offset in sorted(negated.items(), key=lambda item: item[1])
+            if keyword not in affirmed or affirmed[keyword][3] == affirmed[keyword][0]
+        ][:MAX_LONG_NOTE_NEGATIONS]
+        
+        predicted_specialty = 'General'
+        for cat in CATEGORY_PRIORITY:
+            if cat in symptom_categories:
+                predicted_specialty = self.specialty_map.get(cat, 'General')
+                break
+        
+        if extracted_symptoms:
+            avg_confidence = sum(s['confidence'] for s in extracted_symptoms) / len(extracted_symptoms)
+        else:
+            avg_confidence = 0.3
+        
+        return {
+            'extracted_symptoms': extracted_symptoms,
+            'extracted_conditions': extracted_conditions,
+            'negated_findings': negated_findings,
+            'predicted_specialty': predicted_specialty,
+            'predicted_severity': max_severity,
+            'confidence': round(avg_confidence, 2),
+            'language_detected': language,
+            'keyword_pack': pack.language,
+            'suggestions': self._generate_suggestions(extracted_symptoms, extracted_conditions, ''),
+            'mode': 'long',
+            'sentences': sentence_count,
+            'raw_text': text
         }
+    
+    def _is_critical(self, pack: KeywordPack, keyword: str) -> bool:
+        info = pack.symptom_keywords.get(keyword)
+        return info is not None and info['severity'] == 'critical'
+    
+    def _negated_mentions(self, scanner: CueScopeScanner, text: str, mentions: List,
+                          fuzzy_matches: List) -> Tuple[Dict[str, int], Set[int]]:
+        """Keywords whose every mention is negated (-> first offset), and the character offsets of negated mentions"""
+        if not scanner.has_cues(text):
+            return {}, set()
+        typos = {(start, end): keyword for start, end, keyword, _ in fuzzy_matches}
+        mentions = mentions + [(end, text[start:end]) for start, end in typos]
+        candidates = self._pattern_candidates(text, mentions)
+        mentions.extend((end, token) for end, token, _ in candidates.values())
+        mentions.sort()
         
-        # Cardiac-related
-        if any('cardiac' in s.get('category', '') for s in symptoms):
-            suggestions['additional_symptoms_to_check'].extend([
-                'Radiation of pain to arm/jaw',
-                'Sweating',
-                'Shortness of breath'
-            ])
-            suggestions['recommended_tests'].extend(['ECG', 'Troponin levels'])
-            suggestions['risk_factors_to_assess'].extend(['Diabetes', 'Hypertension', 'Smoking history'])
-        
-        # Respiratory
-        if any('respiratory' in s.get('category', '') for s in symptoms):
-            suggestions['additional_symptoms_to_check'].extend([
-                'Wheezing',
-                'Cough',
-                'Sputum production'
-            ])
-            suggestions['recommended_tests'].extend(['Oxygen saturation', 'Chest X-ray'])
-            suggestions['risk_factors_to_assess'].extend(['Asthma', 'COPD', 'Smoking history'])
-        
-        # Neurological
-        if any('neurological' in s.get('category', '') for s in symptoms):
-            suggestions['additional_symptoms_to_check'].extend([
-                'Vision changes',
-                'Speech difficulty',
-                'Facial drooping',
-                'Limb weakness'
-            ])
-            suggestions['recommended_tests'].extend(['CT scan', 'Neurological assessment'])
-        
-        # Trauma
-        if any('trauma' in s.get('category', '') for s in symptoms):
-            suggestions['additional_symptoms_to_check'].extend([
-                'Mechanism of injury',
-                'Loss of consciousness',
-                'Range of motion'
-            ])
-            suggestions['recommended_tests'].extend(['X-ray', 'Physical examination'])
-        
-        return suggestions
+        affirmed, offsets = set(), set()
+        negated: Dict[str, int] = {}
+        index = 0
+        for offset, sentence in iter_sentences(text):
+            local = []
+            while index < len(mentions) and mentions[index][0] <= offset + len(sentence):
+                end, keyword = mentions[index]
+                local.append((end - offset, keyword))
+                index += 1
+            for keyword, start, status in scanner.classify(sentence, local):
+                start += offset
+                end = start + len(keyword)
+                if status == NEGATED:
+                    offsets.update(range(start, end))
+                if start in candidates:
+                    continue
+                keyword = typos.get((start, end), keyword)
+                if status == NEGATED:
+                    negated.setdefault(keyword, start)
+                else:
+                    affirmed.add(keyword)
+        return {keyword: start for keyword, start in negated.items() if keyword not in affirmed}, offsets
+    
+    def _pattern_candidates(self, sentence: str, matches: List) -> Dict[int, tuple]:
+        """start -> (end, word, '<previous word> <word>') for symptom-like words outside dictionary matches"""
+        covered = set()
+        for end, keyword in matches:
+            covered.update(range(end - len(keyword), end))
+        
+        candidates = {}
+        previous = None
+        for word in re.finditer(r"[a-z']+", sentence):
+            token = word.group()
+            if word.start() not in covered and any(pattern in token for pattern in self.symptom_patterns):
+                candidates[word.start()] = (word.end(), token, f"{previous} {token}" if previous else token)
+            previous = token
+        return candidates
+    
+    def _generate_suggestions(self, symptoms: List, conditions: List, text: str) -> Dict:
+        """Suggestions for the categories present, looked up from the precomputed bundle combinations"""
+        categories = {s.get('category', '') for s in symptoms}
+        flags = tuple(any(name in category for category in categories) for name in self.suggestion_bundles)
+        return dict(self.suggestion_sets[flags])
@@ -0,0 +1,350 @@
+import heapq
+import itertools
+import os
+import threading
+import time
+from datetime import datetime
+from typing import Dict, Hashable, Iterator, List, Optional, Tuple
+
+import numpy as np
+
+
+class IndexedPriorityQueue:
+    """
+    Addressable binary min-heap keyed by patient id.
+
+    A position map lets an existing entry be re-keyed or removed in
+    O(log n) instead of rebuilding the heap. Smaller keys are more urgent.
+    """
+
+    def __init__(self):
+        self._heap: List[Tuple[tuple, Hashable]] = []
+        self._position: Dict[Hashable, int] = {}
+        self._payload: Dict[Hashable, Dict] = {}
+
+    def __len__(self):
+        return len(self._heap)
+
+    def __contains__(self, item_id):
+        return item_id in self._position
+
+    def get(self, item_id) -> Optional[Dict]:
+        return self._payload.get(item_id)
+
+    def key(self, item_id) -> Optional[tuple]:
+        index = self._position.get(item_id)
+        return None if index is None else self._heap[index][0]
+
+    def push_or_update(self, item_id, key: tuple, payload: Dict):
+        self._payload[item_id] = payload
+        index = self._position.get(item_id)
+        if index is None:
+            self._heap.append((key, item_id))
+            self._position[item_id] = len(self._heap) - 1
+            self._sift_up(len(self._heap) - 1)
+            return
+
+        old_key = self._heap[index][0]
+        self._heap[index] = (key, item_id)
+        if key < old_key:
+            self._sift_up(index)
+        else:
+            self._sift_down(index)
+
+    def remove(self, item_id) -> bool:
+        index = self._position.pop(item_id, None)
+        if index is None:
+            return False
+        self._payload.pop(item_id, None)
+
+        last = self._heap.pop()
+        if index < len(self._heap):
+            self._heap[index] = last
+            self._position[last[1]] = index
+            self._sift_up(index)
+            self._sift_down(self._position[last[1]])
+        return True
+
+    def top_k(self, k: int) -> List[Dict]:
+        """The k most urgent payloads in order, in O(k log k) without touching the heap"""
+        result = []
+        if not self._heap or k <= 0:
+            return result
+        frontier = [(self._heap[0][0], 0)]
+        while frontier and len(result) < k:
+            _, index = heapq.heappop(frontier)
+            result.append(self._payload[self._heap[index][1]])
+            for child in (2 * index + 1, 2 * index + 2):
+                if child < len(self._heap):
+                    heapq.heappush(frontier, (self._heap[child][0], child))
+        return result
+
+    def ordered(self) -> List[Dict]:
+        return [self._payload[item_id] for _, item_id in sorted(self._heap)]
+
+    def ordered_items(self) -> Iterator[Tuple[tuple, Hashable]]:
+        """(key, id) pairs from most urgent, lazily, in O(log n) per item without touching the heap"""
+        if not self._heap:
+            return
+        frontier = [(self._heap[0][0], 0)]
+        while frontier:
+            key, index = heapq.heappop(frontier)
+            yield key, self._heap[index][1]
+            for child in (2 * index + 1, 2 * index + 2):
+                if child < len(self._heap):
+                    heapq.heappush(frontier, (self._heap[child][0], child))
+
+    def _swap(self, i: int, j: int):
+        heap = self._heap
+        heap[i], heap[j] = heap[j], heap[i]
+        self._position[heap[i][1]] = i
+        self._position[heap[j][1]] = j
+
+    def _sift_up(self, index: int):
+        heap = self._heap
+        while index > 0:
+            parent = (index - 1) // 2
+            if heap[index][0] >= heap[parent][0]:
+                break
+            self._swap(index, parent)
+            index = parent
+
+    def _sift_down(self, index: int):
+        heap = self._heap
+        size = len(heap)
+        while True:
+            smallest = index
+            for child in (2 * index + 1, 2 * index + 2):
+                if child < size and heap[child][0] < heap[smallest][0]:
+                    smallest = child
+            if smallest == index:
+                return
+            self._swap(index, smallest)
+            index = smallest
+
+
+class QueueFull(Exception):
+    """A new hospital or patient would exceed the configured queue limits"""
+
+
+class HospitalQueues:
+    """
+    Per-hospital waiting queues ordered by DeteriorationPredictor output.
+
+    Arrivals and vitals updates score only the affected patient and re-key it
+    in its hospital's heap; discharges remove it. Risk also grows with
+    waiting time, so each score comes with the waiting-time projection's
+    `rescore_in_minutes`, kept in a second heap ordered by when it falls
+    due. Reads first rescore the patients that are due, at their current
+    waiting time, so the order stays live without rescoring everyone.
+
+    Reads never create a queue. The number of hospitals and of patients per
+    hospital is capped, and a patient not upserted for `patient_ttl`
+    seconds is dropped when next due, so a missed discharge does not stay
+    in the order.
+    """
+
+    SNAPSHOT_VERSION = 3
+    # Projection horizon; a patient with no change ahead is rechecked this often
+    RESCORE_HORIZON_MINUTES = 240
+
+    def __init__(self, predictor, clock=time.time, max_hospitals: Optional[int] = None,
+                 max_patients: Optional[int] = None, patient_ttl: Optional[float] = None):
+        self.predictor = predictor
+        self.clock = clock
+        self.max_hospitals = max_hospitals or int(os.getenv('ML_MAX_QUEUES', 1000))
+        self.max_patients = max_patients or int(os.getenv('ML_MAX_QUEUE_PATIENTS', 5000))
+        self.patient_ttl = patient_ttl or float(os.getenv('ML_QUEUE_PATIENT_TTL_HOURS', 24)) * 3600
+        self._queues: Dict[str, IndexedPriorityQueue] = {}
+        # Per hospital: patient id -> (due_at,) with the features and time of the last score
+        self._due: Dict[str, IndexedPriorityQueue] = {}
+        self._locks: Dict[str, threading.Lock] = {}
+        self._registry_lock = threading.Lock()
+        self._arrivals = itertools.count()
+
+    def _queue(self, hospital_id, create: bool = False
+               ) -> Optional[Tuple[IndexedPriorityQueue, IndexedPriorityQueue, threading.Lock]]:
+        """The hospital's heaps and lock; None if it has none and create is False"""
+        hospital_id = str(hospital_id)
+        with self._registry_lock:
+            if hospital_id not in self._queues:
+                if not create:
+                    return None
+                if len(self._queues) >= self.max_hospitals:
+                    raise QueueFull(f'Queue limit of {self.max_hospitals} hospitals reached')
+                self._queues[hospital_id] = IndexedPriorityQueue()
+                self._due[hospital_id] = IndexedPriorityQueue()
+                self._locks[hospital_id] = threading.Lock()
+            return self._queues[hospital_id], self._due[hospital_id], self._locks[hospital_id]
+
+    def _key(self, predicted_priority: str, risk_score: float, arrival: int) -> tuple:
+        # Most urgent predicted priority first, then highest risk, then longest in queue
+        level = self.predictor.priority_map.get(predicted_priority, 0)
+        return (-level, -risk_score, arrival)
+
+    def _score(self, features_list: List[Dict]) -> List[tuple]:
+        """Per patient: assessment and minutes until waiting alone would change their rank"""
+        # Only the scores are stored, so the reasoning text is never built; one projection pass for all
+        projections = self.predictor.project_waiting_horizon_batch(
+            features_list, self.RESCORE_HORIZON_MINUTES, include_curve=False
+        )
+        return [(self.predictor.assess(features), projection['rescore_in_minutes'])
+                for features, projection in zip(features_list, projections)]
+
+    def _store(self, queue, due, patient_id: str, features: Dict, scored_at: float, seen_at: float,
+               assessment, rescore_in_minutes: int, arrival: int) -> Dict:
+        """Key the patient in both heaps; the hospital lock must be held"""
+        entry = {
+            'patient_id': patient_id,
+            'risk_score': assessment.risk_score,
+            'predicted_priority': assessment.predicted_priority,
+            'current_priority': features.get('current_priority', 'GREEN'),
+            'deterioration_probability': assessment.deterioration_probability,
+            'arrival': arrival,
+            'updated_at': datetime.now().isoformat()
+        }
+        key = self._key(assessment.predicted_priority, assessment.risk_score, arrival)
+        queue.push_or_update(patient_id, key, entry)
+        due.push_or_update(patient_id, (scored_at + rescore_in_minutes * 60,),
+                           {'features': features, 'scored_at': scored_at, 'seen_at': seen_at})
+        return entry
+
+    def _rescore_due(self, queue, due):
+        """
+        Rescore patients whose projected change has been reached, dropping those
+        not upserted within the TTL; the hospital lock must be held
+        """
+        now = self.clock()
+        patient_ids, features_list, expired = [], [], []
+        for (due_at,), patient_id in due.ordered_items():
+            if due_at > now:
+                break
+            scheduled = due.get(patient_id)
+            if now - scheduled['seen_at'] > self.patient_ttl:
+                expired.append(patient_id)
+                continue
+            waited = (now - scheduled['scored_at']) / 60
+            patient_ids.append(patient_id)
+            features_list.append(dict(scheduled['features'],
+                                      waiting_time=scheduled['features'].get('waiting_time', 0) + waited))
+        for patient_id in expired:
+            due.remove(patient_id)
+            queue.remove(patient_id)
+        if not patient_ids:
+            return
+        for patient_id, features, (assessment, rescore_in_minutes) in zip(
+                patient_ids, features_list, self._score(features_list)):
+            self._store(queue, due, patient_id, features, now, due.get(patient_id)['seen_at'],
+                        assessment, rescore_in_minutes, queue.get(patient_id)['arrival'])
+
+    def upsert(self, hospital_id, patient_id, features: Dict) -> Dict:
+        """Score one patient and insert or re-key them; returns the stored entry"""
+        return self._upsert(hospital_id, [(patient_id, features)])[0]
+
+    def upsert_many(self, hospital_id, patients: List[Tuple[Hashable, Dict]]) -> int:
+        self._upsert(hospital_id, patients)
+        return self.size(hospital_id)
+
+    def _upsert(self, hospital_id, patients: List[Tuple[Hashable, Dict]]) -> List[Dict]:
+        if not patients:
+            return []
+        scored_at = self.clock()
+        scores = self._score([features for _, features in patients])
+        queue, due, lock = self._queue(hospital_id, create=True)
+        entries = []
+        with lock:
+            arrivals = {str(patient_id) for patient_id, _ in patients if str(patient_id) not in queue}
+            if len(queue) + len(arrivals) > self.max_patients:
+                raise QueueFull(f'Queue limit of {self.max_patients} patients reached')
+            for (patient_id, features), (assessment, rescore_in_minutes) in zip(patients, scores):
+                patient_id = str(patient_id)
+                existing = queue.get(patient_id)
+                arrival = existing['arrival'] if existing else next(self._arrivals)
+                entry = self._store(queue, due, patient_id, features, scored_at, scored_at, assessment,
+                                    rescore_in_minutes, arrival)
+                entries.append(dict(entry, queue_size=len(queue)))
+        return entries
+
+    def discharge(self, hospital_id, patient_id) -> bool:
+        found = self._queue(hospital_id)
+        if found is None:
+            return False
+        queue, due, lock = found
+        with lock:
+            due.remove(str(patient_id))
+            return queue.remove(str(patient_id))
+
+    def top(self, hospital_id, k: Optional[int] = None) -> List[Dict]:
+        found = self._queue(hospital_id)
+        if found is None:
+            return []
+        queue, due, lock = found
+        with lock:
+            self._rescore_due(queue, due)
+            return queue.ordered() if k is None else queue.top_k(k)
+
+    def size(self, hospital_id) -> int:
+        found = self._queue(hospital_id)
+        if found is None:
+            return 0
+        queue, _, lock = found
+        with lock:
+            return len(queue)
+
+    def snapshot_state(self) -> Dict:
+        """
+        Queued entries as columns: hospital (id, count) runs, ids and priorities,
+        numeric arrays, and the features and times the rescore schedule needs
+        """
+        with self._registry_lock:
+            queues = [(hospital_id, queue, self._due[hospital_id], self._locks[hospital_id])
+                      for hospital_id, queue in self._queues.items()]
+        hospitals, entries, scheduled = [], [], []
+        for hospital_id, queue, due, lock in queues:
+            with lock:
+                ordered = queue.ordered()
+                scheduled.extend((due.key(e['patient_id'])[0], due.get(e['patient_id'])) for e in ordered)
+            hospitals.append([hospital_id, len(ordered)])
+            entries.extend(ordered)
+        return {
+            'hospitals': hospitals,
+            'patients': [[e['patient_id'], e['predicted_priority'], e['current_priority'], e['updated_at']]
+                         for e in entries],
+            'scores': np.array([[e['risk_score'], e['deterioration_probability']] for e in entries],
+                               dtype=np.float64).reshape(-1, 2),
+            'arrivals': np.array([e['arrival'] for e in entries], dtype=np.int64),
+            'features': [s['features'] for _, s in scheduled],
+            'schedule': np.array([[s['scored_at'], due_at, s['seen_at']] for due_at, s in scheduled],
+                                 dtype=np.float64).reshape(-1, 3)
+        }
+
+    def restore_state(self, sections: Dict):
+        """Rebuild queues and rescore schedules from stored entries without rescoring"""
+        scores, arrivals, schedule = sections['scores'], sections['arrivals'], sections['schedule']
+        features = sections['features']
+        patients = iter(enumerate(sections['patients']))
+        for hospital_id, count in sections['hospitals']:
+            queue, due, lock = self._queue(hospital_id, create=True)
+            with lock:
+                for _ in range(count):
+                    row, (patient_id, predicted, current, updated_at) = next(patients)
+                    entry = {
+                        'patient_id': patient_id,
+                        'risk_score': float(scores[row, 0]),
+                        'predicted_priority': predicted,
+                        'current_priority': current,
+                        'deterioration_probability': float(scores[row, 1]),
+                        'arrival': int(arrivals[row]),
+                        'updated_at': updated_at
+                    }
+                    key = self._key(predicted, entry['risk_score'], entry['arrival'])
+                    queue.push_or_update(patient_id, key, entry)
+                    due.push_or_update(patient_id, (float(schedule[row, 1]),),
+                                       {'features': features[row], 'scored_at': float(schedule[row, 0]),
+                                        'seen_at': float(schedule[row, 2])})
+        if len(arrivals):
+            self._arrivals = itertools.count(int(arrivals.max()) + 1)
+
+    def status(self) -> Dict:
+        with self._registry_lock:
+            return {hospital_id: len(queue) for hospital_id, queue in self._queues.items()}
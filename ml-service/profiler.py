@@ -0,0 +1,235 @@
+import cProfile
+import functools
+import hmac
+import io
+import json
+import marshal
+import os
+import pstats
+import threading
+import time
+import tracemalloc
+from typing import Callable, Dict, Optional
+
+ADMIN_TOKEN_HEADER = 'X-Admin-Token'
+
+# Source files attributed to each model in memory reports
+MODEL_FILES = {
+    'deterioration': ('deterioration_predictor.py', 'priority_queue.py'),
+    'nlp': ('nlp_extractor.py', 'keyword_packs.py', 'fuzzy_matcher.py', 'long_note.py', 'tiered_nlp.py', 'transformer_ner.py'),
+    'surge': ('surge_forecaster.py', 'forecast_store.py', 'model_cache.py'),
+}
+
+
+def _model_for(filename: str) -> str:
+    basename = os.path.basename(filename)
+    for model, files in MODEL_FILES.items():
+        if basename in files:
+            return model
+    return 'other'
+
+
+class ProfilingSession:
+    """One bounded profiling run over a single route"""
+
+    def __init__(self, mode: str, route: str, max_requests: int, max_seconds: float):
+        self.mode = mode
+        self.route = route
+        self.max_requests = max_requests
+        self.max_seconds = max_seconds
+        self.started_at = time.time()
+        self.requests = 0
+        self.finished = False
+        self.stats: Optional[pstats.Stats] = None
+        self.start_snapshot = None
+        self.artifact: Optional[bytes] = None
+
+    def summary(self) -> Dict:
+        return {
+            'mode': self.mode,
+            'route': self.route,
+            'requests': self.requests,
+            'max_requests': self.max_requests,
+            'max_seconds': self.max_seconds,
+            'elapsed_seconds': round(time.time() - self.started_at, 2),
+            'finished': self.finished
+        }
+
+
+class RequestProfiler:
+    """
+    Admin-only, environment-gated profiler for the live service.
+
+    CPU mode runs cProfile around matching requests, both on the request
+    thread (parsing, JSON encoding) and inside the model worker. Memory mode
+    traces allocations with tracemalloc for the session and reports the top
+    allocators per model. Each session stops after a bounded number of
+    requests or seconds. When no session is running the hooks reduce to a
+    single attribute check.
+    """
+
+    def __init__(self):
+        self.enabled = os.getenv('ML_PROFILING_ENABLED', 'false').lower() in ('1', 'true', 'yes')
+        self.admin_token = os.getenv('ML_ADMIN_TOKEN', '')
+        self.max_requests_limit = int(os.getenv('ML_PROFILING_MAX_REQUESTS', 500))
+        self.max_seconds_limit = float(os.getenv('ML_PROFILING_MAX_SECONDS', 120))
+        # Rows in the text report
+        self.max_report_limit = 500
+        self.session: Optional[ProfilingSession] = None
+        self._lock = threading.Lock()
+        self._timer: Optional[threading.Timer] = None
+        self._local = threading.local()
+
+    def authorized(self, headers) -> bool:
+        if not self.enabled or not self.admin_token:
+            return False
+        return hmac.compare_digest(headers.get(ADMIN_TOKEN_HEADER, ''), self.admin_token)
+
+    def active_for(self, path: str) -> bool:
+        session = self.session
+        return session is not None and not session.finished and session.route == path
+
+    def start(self, mode: str, route: str, max_requests: int, max_seconds: float) -> Dict:
+        if mode not in ('cpu', 'memory'):
+            raise ValueError("mode must be 'cpu' or 'memory'")
+        max_requests = max(1, min(int(max_requests), self.max_requests_limit))
+        max_seconds = max(1.0, min(float(max_seconds), self.max_seconds_limit))
+
+        with self._lock:
+            if self.session is not None and not self.session.finished:
+                raise RuntimeError('A profiling session is already running')
+            session = ProfilingSession(mode, route, max_requests, max_seconds)
+            if mode == 'memory':
+                tracemalloc.start(int(os.getenv('ML_PROFILING_TRACE_FRAMES', 1)))
+                session.start_snapshot = tracemalloc.take_snapshot()
+            self.session = session
+            self._timer = threading.Timer(max_seconds, self.finish)
+            self._timer.daemon = True
+            self._timer.start()
+        return session.summary()
+
+    def begin_request(self, path: str):
+        """Called before a request; starts CPU profiling on this thread if it matches"""
+        if not self.active_for(path):
+            return
+        self._local.profile = None
+        if self.session.mode == 'cpu':
+            profile = cProfile.Profile()
+            profile.enable()
+            self._local.profile = profile
+
+    def end_request(self, path: str):
+        """Called after a request; folds its profile into the session"""
+        if self.session is None:
+            return
+        profile = getattr(self._local, 'profile', None)
+        if profile is not None:
+            # Always stop this thread's profiler, even if the session ended mid-request
+            profile.disable()
+            self._local.profile = None
+            self._add_profile(profile)
+
+        session = self.session
+        if session.finished or session.route != path:
+            return
+        with self._lock:
+            session.requests += 1
+            done = session.requests >= session.max_requests
+        if done:
+            self.finish()
+
+    def wrap(self, path: str, fn: Callable) -> Callable:
+        """Profile fn where it actually runs (the model worker thread) during a CPU session"""
+        if not self.active_for(path) or self.session.mode != 'cpu':
+            return fn
+
+        @functools.wraps(fn)
+        def profiled(*args, **kwargs):
+            profile = cProfile.Profile()
+            profile.enable()
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                profile.disable()
+                self._add_profile(profile)
+        return profiled
+
+    def _add_profile(self, profile: cProfile.Profile):
+        with self._lock:
+            session = self.session
+            if session is None or session.finished:
+                return
+            if session.stats is None:
+                session.stats = pstats.Stats(profile)
+            else:
+                session.stats.add(profile)
+
+    def finish(self):
+        """Stop the current session and render its artifact"""
+        with self._lock:
+            session = self.session
+            if session is None or session.finished:
+                return
+            session.finished = True
+            if self._timer is not None:
+                self._timer.cancel()
+                self._timer = None
+
+            if session.mode == 'cpu':
+                # Same layout as pstats.Stats.dump_stats, loadable with pstats/snakeviz
+                session.artifact = marshal.dumps(session.stats.stats if session.stats else {})
+            else:
+                end_snapshot = tracemalloc.take_snapshot()
+                tracemalloc.stop()
+                session.artifact = json.dumps(
+                    self._memory_report(session, end_snapshot), indent=2
+                ).encode('utf-8')
+                session.start_snapshot = None
+
+    def _memory_report(self, session: ProfilingSession, end_snapshot, top: int = 10) -> Dict:
+        stats = end_snapshot.compare_to(session.start_snapshot, 'lineno')
+        by_model: Dict[str, list] = {}
+        totals: Dict[str, int] = {}
+        for stat in stats:
+            frame = stat.traceback[0]
+            model = _model_for(frame.filename)
+            totals[model] = totals.get(model, 0) + stat.size_diff
+            entries = by_model.setdefault(model, [])
+            if len(entries) < top:
+                entries.append({
+                    'location': f"{frame.filename}:{frame.lineno}",
+                    'size_diff_bytes': stat.size_diff,
+                    'count_diff': stat.count_diff
+                })
+        return {
+            'session': session.summary(),
+            'net_bytes_by_model': totals,
+            'top_allocators_by_model': by_model
+        }
+
+    def status(self) -> Dict:
+        session = self.session
+        return {
+            'enabled': self.enabled,
+            'session': session.summary() if session else None
+        }
+
+    def artifact(self) -> Optional[tuple]:
+        """(bytes, filename, mimetype) for the last finished session"""
+        session = self.session
+        if session is None or not session.finished or session.artifact is None:
+            return None
+        stamp = time.strftime('%Y%m%d-%H%M%S', time.localtime(session.started_at))
+        if session.mode == 'cpu':
+            return session.artifact, f'ml-profile-cpu-{stamp}.pstats', 'application/octet-stream'
+        return session.artifact, f'ml-profile-memory-{stamp}.json', 'application/json'
+
+    def text_report(self, limit: int = 40) -> Optional[str]:
+        """Human-readable cumulative-time report for a finished CPU session"""
+        session = self.session
+        if session is None or not session.finished or session.mode != 'cpu' or session.stats is None:
+            return None
+        out = io.StringIO()
+        session.stats.stream = out
+        session.stats.sort_stats('cumulative').print_stats(max(1, min(int(limit), self.max_report_limit)))
+        return out.getvalue()
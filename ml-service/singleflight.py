@@ -0,0 +1,86 @@
+import threading
+import time
+from typing import Callable, Dict
+
+from admission import DeadlineExceeded
+from tracing import span
+
+
+class _Call:
+    __slots__ = ('done', 'result', 'error', 'followers')
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+        self.followers = 0
+
+
+class SingleFlight:
+    """
+    Collapses concurrent identical requests into one computation.
+
+    The first caller for a key runs the work; callers arriving while it is
+    in flight wait for it and receive the same result, or the same
+    exception. The key is removed before waiters are released, so nothing
+    outlives the computation and a later request always recomputes. This is
+    not a cache: results are never kept once the flight lands.
+
+    A waiter whose deadline passes gets DeadlineExceeded. If the leader
+    itself ran out of time, waiters that still have time retry rather than
+    inherit a deadline shorter than their own.
+    """
+
+    def __init__(self, enabled: bool = True):
+        self.enabled = enabled
+        self._lock = threading.Lock()
+        self._calls: Dict[str, _Call] = {}
+        self.stats = {'leaders': 0, 'shared': 0, 'shared_errors': 0, 'wait_timeouts': 0}
+
+    def do(self, key: str, deadline: float, fn: Callable, /, *args, **kwargs):
+        """Run fn(*args, **kwargs) once for all concurrent callers with the same key"""
+        if not self.enabled:
+            return fn(*args, **kwargs)
+        while True:
+            with self._lock:
+                call = self._calls.get(key)
+                leader = call is None
+                if leader:
+                    call = self._calls[key] = _Call()
+                    self.stats['leaders'] += 1
+                else:
+                    call.followers += 1
+
+            if leader:
+                try:
+                    call.result = fn(*args, **kwargs)
+                except BaseException as e:
+                    call.error = e
+                    raise
+                finally:
+                    with self._lock:
+                        del self._calls[key]
+                    call.done.set()
+                return call.result
+
+            with span('singleflight.wait'):
+                landed = call.done.wait(timeout=max(0.0, deadline - time.monotonic()))
+            if not landed:
+                self._count('wait_timeouts')
+                raise DeadlineExceeded('Deadline exceeded waiting for an identical request')
+            if call.error is None:
+                self._count('shared')
+                return call.result
+            # The leader's deadline may have been shorter than ours
+            if isinstance(call.error, DeadlineExceeded) and deadline > time.monotonic():
+                continue
+            self._count('shared_errors')
+            raise call.error
+
+    def _count(self, key: str):
+        with self._lock:
+            self.stats[key] += 1
+
+    def status(self) -> Dict:
+        with self._lock:
+            return {'enabled': self.enabled, 'in_flight': len(self._calls), **self.stats}
@@ -0,0 +1,254 @@
+import atexit
+import json
+import mmap
+import os
+import signal
+import struct
+import tempfile
+import threading
+import time
+import zlib
+from typing import Any, Dict, Optional
+
+import numpy as np
+
+MAGIC = b'TRIAGESN'
+# Bumped when the container layout changes; each component versions its own sections
+FORMAT_VERSION = 1
+# magic, format version, reserved, table offset, table length, table crc32
+_HEADER = struct.Struct('<8sIIQQI')
+_ALIGN = 64
+
+
+class SnapshotError(Exception):
+    pass
+
+
+def _aligned(offset: int) -> int:
+    return (offset + _ALIGN - 1) // _ALIGN * _ALIGN
+
+
+def write_snapshot(path: str, components: Dict[str, int], sections: Dict[str, Any]):
+    """
+    Write sections to path crash-safely.
+
+    Layout: a fixed header, then each section at a 64-byte aligned offset,
+    then a JSON section table (name, kind, offset, length, crc32, and dtype
+    and shape for arrays) whose position and crc32 are in the header.
+    NumPy arrays are stored raw so they can be mapped back without copying;
+    anything else is stored as JSON. The file is written to a uniquely named
+    temporary file beside its target, fsynced and renamed over it, so a crash
+    or a concurrent writer leaves a complete snapshot.
+    """
+    directory = os.path.dirname(os.path.abspath(path))
+    fd, temp_path = tempfile.mkstemp(dir=directory, prefix=f"{os.path.basename(path)}.", suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            _write_sections(f, components, sections)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(temp_path, path)
+    except BaseException:
+        try:
+            os.unlink(temp_path)
+        except OSError:
+            pass
+        raise
+    try:
+        directory_fd = os.open(directory, os.O_RDONLY)
+    except OSError:
+        return
+    try:
+        os.fsync(directory_fd)
+    finally:
+        os.close(directory_fd)
+
+
+def _write_sections(f, components: Dict[str, int], sections: Dict[str, Any]):
+    """Header, aligned sections and section table, written to an open file"""
+    table = []
+    f.write(b'\0' * _aligned(_HEADER.size))
+    for name, value in sections.items():
+        if isinstance(value, np.ndarray):
+            if value.dtype.hasobject:
+                raise SnapshotError(f"Section {name} has object dtype")
+            data = np.ascontiguousarray(value).tobytes()
+            entry = {'name': name, 'kind': 'array', 'dtype': value.dtype.str, 'shape': list(value.shape)}
+        else:
+            data = json.dumps(value, separators=(',', ':')).encode('utf-8')
+            entry = {'name': name, 'kind': 'json'}
+        offset = _aligned(f.tell())
+        f.seek(offset)
+        f.write(data)
+        entry.update(offset=offset, length=len(data), crc32=zlib.crc32(data))
+        table.append(entry)
+
+    table_bytes = json.dumps({
+        'created_at': time.time(),
+        'components': components,
+        'sections': table
+    }, separators=(',', ':')).encode('utf-8')
+    table_offset = _aligned(f.tell())
+    f.seek(table_offset)
+    f.write(table_bytes)
+    f.seek(0)
+    f.write(_HEADER.pack(MAGIC, FORMAT_VERSION, 0, table_offset, len(table_bytes), zlib.crc32(table_bytes)))
+
+
+class SnapshotReader:
+    """Memory-mapped view of a snapshot; arrays are read-only views into the mapping"""
+
+    def __init__(self, path: str):
+        with open(path, 'rb') as f:
+            self._map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        size = len(self._map)
+        if size < _HEADER.size:
+            raise SnapshotError('Truncated header')
+        magic, version, _, table_offset, table_length, table_crc = _HEADER.unpack_from(self._map, 0)
+        if magic != MAGIC:
+            raise SnapshotError('Not a snapshot file')
+        if version != FORMAT_VERSION:
+            raise SnapshotError(f'Snapshot format {version}, expected {FORMAT_VERSION}')
+        if table_offset + table_length > size:
+            raise SnapshotError('Truncated section table')
+        table_bytes = self._map[table_offset:table_offset + table_length]
+        if zlib.crc32(table_bytes) != table_crc:
+            raise SnapshotError('Section table checksum mismatch')
+        table = json.loads(table_bytes)
+        self.created_at = table['created_at']
+        self.components: Dict[str, int] = table['components']
+        self._sections = {entry['name']: entry for entry in table['sections']}
+        for entry in self._sections.values():
+            if entry['offset'] + entry['length'] > size:
+                raise SnapshotError(f"Truncated section {entry['name']}")
+
+    def names(self):
+        return list(self._sections)
+
+    def get(self, name: str):
+        entry = self._sections[name]
+        offset, length = entry['offset'], entry['length']
+        view = memoryview(self._map)[offset:offset + length]
+        if zlib.crc32(view) != entry['crc32']:
+            raise SnapshotError(f'Section {name} checksum mismatch')
+        if entry['kind'] == 'array':
+            dtype = np.dtype(entry['dtype'])
+            return np.frombuffer(self._map, dtype=dtype, count=length // dtype.itemsize,
+                                 offset=offset).reshape(entry['shape'])
+        return json.loads(bytes(view))
+
+
+class SnapshotManager:
+    """
+    Periodic, crash-safe snapshots of in-memory service state.
+
+    Components expose `SNAPSHOT_VERSION`, `snapshot_state()` returning named
+    sections (NumPy arrays or JSON-serializable values) and
+    `restore_state(sections)`. A component whose stored version differs from
+    its current one is skipped, and a file that is truncated, corrupt or of
+    another format is discarded, so an incompatible snapshot can only cost
+    a cold start. Snapshots are taken every `interval` seconds, at exit and
+    on SIGTERM.
+    """
+
+    def __init__(self, path: str, interval: float = 60.0):
+        self.path = path
+        self.interval = interval
+        self.stats = {'saves': 0, 'save_errors': 0, 'last_save_ms': None, 'last_saved_at': None,
+                      'restored': [], 'skipped': [], 'restore_ms': None, 'discarded': None}
+        self._components: Dict[str, Any] = {}
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def register(self, name: str, component):
+        self._components[name] = component
+
+    def restore(self):
+        """Load every compatible component from the last snapshot, if any"""
+        if not os.path.exists(self.path):
+            return
+        started = time.perf_counter()
+        try:
+            reader = SnapshotReader(self.path)
+        except (OSError, ValueError, SnapshotError) as e:
+            print(f"Discarding state snapshot {self.path}: {e}")
+            self.stats['discarded'] = str(e)
+            return
+
+        for name, component in self._components.items():
+            if reader.components.get(name) != component.SNAPSHOT_VERSION:
+                self.stats['skipped'].append(name)
+                continue
+            prefix = f"{name}/"
+            try:
+                component.restore_state({
+                    section[len(prefix):]: reader.get(section)
+                    for section in reader.names() if section.startswith(prefix)
+                })
+                self.stats['restored'].append(name)
+            except Exception as e:
+                print(f"Could not restore {name} from snapshot: {e}")
+                self.stats['skipped'].append(name)
+        self.stats['restore_ms'] = round((time.perf_counter() - started) * 1000, 2)
+        print(f"Restored {', '.join(self.stats['restored']) or 'nothing'} from snapshot "
+              f"({time.time() - reader.created_at:.0f}s old) in {self.stats['restore_ms']} ms")
+
+    def save(self):
+        with self._lock:
+            started = time.perf_counter()
+            try:
+                sections = {}
+                for name, component in self._components.items():
+                    for section, value in component.snapshot_state().items():
+                        sections[f"{name}/{section}"] = value
+                os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+                write_snapshot(self.path, {name: c.SNAPSHOT_VERSION for name, c in self._components.items()},
+                               sections)
+            except Exception as e:
+                print(f"State snapshot failed: {e}")
+                self.stats['save_errors'] += 1
+                return
+            self.stats['saves'] += 1
+            self.stats['last_save_ms'] = round((time.perf_counter() - started) * 1000, 2)
+            self.stats['last_saved_at'] = time.time()
+
+    def start(self):
+        """Save periodically, at interpreter exit and on SIGTERM"""
+        if self.interval > 0:
+            self._thread = threading.Thread(target=self._run, name='state-snapshot', daemon=True)
+            self._thread.start()
+        atexit.register(self.save)
+        if threading.current_thread() is threading.main_thread():
+            previous = signal.getsignal(signal.SIGTERM)
+
+            def on_sigterm(signum, frame):
+                self._stop.set()
+                self.save()
+                if callable(previous):
+                    previous(signum, frame)
+                else:
+                    raise SystemExit(0)
+            signal.signal(signal.SIGTERM, on_sigterm)
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self.save()
+
+    def status(self) -> Dict:
+        stats = dict(self.stats)
+        if stats['last_saved_at'] is not None:
+            stats['last_save_age_seconds'] = round(time.time() - stats.pop('last_saved_at'), 1)
+        else:
+            stats.pop('last_saved_at')
+        return {'path': self.path, 'interval': self.interval, **stats}
+
+
+def create_snapshot_manager() -> Optional[SnapshotManager]:
+    """Manager configured from ML_SNAPSHOT_*; None when ML_SNAPSHOT_ENABLED is off"""
+    if os.getenv('ML_SNAPSHOT_ENABLED', 'true').lower() not in ('1', 'true', 'yes'):
+        return None
+    return SnapshotManager(
+        os.getenv('ML_SNAPSHOT_PATH', os.path.join(os.path.dirname(__file__), 'state', 'ml-state.snap')),
+        interval=float(os.getenv('ML_SNAPSHOT_INTERVAL', 60))
+    )
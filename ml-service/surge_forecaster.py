@@ -1,92 +1,228 @@
 import numpy as np
-import pandas as pd
-from datetime import datetime, timedelta
-from typing import List, Dict
+from datetime import datetime, timedelta, timezone
+from typing import List, Dict, Optional, Tuple, Union
+import hashlib
+import math
+import os
+import re
+import time
+
+from forecast_store import ForecastStore
+from model_cache import SeasonalModel, SeasonalModelCache
+from tracing import span
+
+# Minimum history points before a fitted forecast is attempted
+MIN_HISTORY_POINTS = 10
+
+# Fractional seconds; Python 3.10's fromisoformat accepts only 3 or 6 digits
+_ISO_FRACTION = re.compile(r'(?<=:\d\d)\.(\d+)')
+
+
+def _epoch_seconds(value) -> Optional[int]:
+    """ISO string or epoch number to epoch seconds, or None if it does not parse; naive times are taken as UTC"""
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        return int(value) if math.isfinite(value) else None
+    if not isinstance(value, str):
+        return None
+    value = value.strip()
+    if value.endswith(('Z', 'z')):
+        value = value[:-1] + '+00:00'
+    value = _ISO_FRACTION.sub(lambda m: '.' + m.group(1)[:6].ljust(6, '0'), value, count=1)
+    try:
+        parsed = datetime.fromisoformat(value)
+    except ValueError:
+        return None
+    if parsed.tzinfo is None:
+        parsed = parsed.replace(tzinfo=timezone.utc)
+    return int(parsed.timestamp())
+
+
+def to_columnar(historical_data: Union[Dict, List[Dict], None]) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Normalize forecast input to (timestamps, counts) arrays.
+    
+    Accepts the columnar form {'timestamps': [epoch seconds], 'counts': [...]}
+    or the original list of {'timestamp': ISO string, 'patient_count': n} dicts.
+    List rows whose timestamp does not parse are dropped.
+    """
+    if not historical_data:
+        return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float64)
+    
+    if isinstance(historical_data, dict):
+        timestamps = np.asarray(historical_data['timestamps'], dtype=np.int64)
+        counts = np.asarray(historical_data['counts'], dtype=np.float64)
+        if timestamps.shape != counts.shape:
+            raise ValueError('timestamps and counts must have the same length')
+        return timestamps, counts
+    
+    parsed = [(_epoch_seconds(row.get('timestamp')), row['patient_count']) for row in historical_data]
+    rows = [(timestamp, count) for timestamp, count in parsed if timestamp is not None]
+    if len(rows) < len(parsed):
+        print(f"Dropped {len(parsed) - len(rows)} surge history rows with invalid timestamps")
+    timestamps = np.fromiter((timestamp for timestamp, _ in rows), dtype=np.int64, count=len(rows))
+    counts = np.fromiter((count for _, count in rows), dtype=np.float64, count=len(rows))
+    return timestamps, counts
 
 class SurgeForecaster:
-    def __init__(self):
+    # Longest forecast; simulation allocates paths x hours
+    MAX_HOURS_AHEAD = 7 * 24
+    
+    def __init__(self, store: Optional[ForecastStore] = None, seasonal: Optional[SeasonalModelCache] = None):
         self.model_loaded = True
         self.model_version = "1.0.0"
+        # Shared across workers so one worker's computation serves every dashboard
+        self.store = store
+        # Per-hospital seasonal models fitted in the background; hourly averages until one exists
+        self.seasonal = seasonal
+        self.forecast_ttl = int(os.getenv('FORECAST_CACHE_TTL', 300))
+        # Monte Carlo paths per forecast hour and the two-sided tail of the interval (90%)
+        self.simulations = int(os.getenv('FORECAST_SIMULATIONS', 4000))
+        self.interval_alpha = 0.05
+        self.rng = np.random.default_rng()
     
     def is_loaded(self):
         return self.model_loaded
     
-    def forecast(self, historical_data: List[Dict], hours_ahead: int = 6) -> Dict:
+    def forecast(self, historical_data: Union[Dict, List[Dict]], hours_ahead: int = 6, hospital_id=None) -> Dict:
         """
         Forecast patient surge
         
         Args:
-            historical_data: List of dicts with 'timestamp' and 'patient_count'
+            historical_data: Columnar dict with 'timestamps' (epoch seconds) and 'counts',
+                or a list of dicts with 'timestamp' and 'patient_count'
             hours_ahead: Number of hours to forecast
+            hospital_id: When given with a store, results and aggregates are shared across workers;
+                with a seasonal cache, the hospital's fitted model is used once available
         
         Returns:
             Dictionary with forecast data
         """
-        if not historical_data or len(historical_data) < 10:
-            # Not enough data, return baseline forecast
-            return self._baseline_forecast(hours_ahead)
-        
-        # Convert to DataFrame
-        df = pd.DataFrame(historical_data)
-        df['timestamp'] = pd.to_datetime(df['timestamp'])
-        df = df.sort_values('timestamp')
+        now = datetime.now()
+        hours_ahead = min(max(1, int(hours_ahead)), self.MAX_HOURS_AHEAD)
+        with span('surge.columnar') as columnar_span:
+            timestamps, counts = to_columnar(historical_data)
+            columnar_span.set(points=int(len(counts)))
         
-        # Calculate hourly averages
-        df['hour'] = df['timestamp'].dt.hour
-        df['day_of_week'] = df['timestamp'].dt.dayofweek
+        seasonal = None
+        if self.seasonal is not None and hospital_id is not None:
+            self.seasonal.observe(hospital_id, timestamps, counts)
+            seasonal = self.seasonal.get(hospital_id)
         
-        hourly_avg = df.groupby('hour')['patient_count'].mean().to_dict()
+        if self.store is None or hospital_id is None:
+            with span('surge.aggregate'):
+                aggregates = self._aggregate(timestamps, counts)
+            return self._render(self._profile(aggregates, hours_ahead, seasonal, now), now)
         
-        # Generate forecast
-        now = datetime.now()
-        forecasts = []
+        # Hash the normalized arrays so both input formats share cache entries. New data
+        # changes the key, so entries for other histories stay valid until they expire.
+        with span('surge.cache_lookup') as lookup_span:
+            fingerprint = hashlib.blake2b(timestamps.tobytes() + counts.tobytes(), digest_size=16).hexdigest()
+            # A newly fitted model supersedes forecasts cached from the previous one
+            model_tag = f"{seasonal.fitted_at:.0f}" if seasonal is not None else 'avg'
+            # Forecast hours are clock hours, so an entry only serves the hour it was made in
+            cache_key = f"{fingerprint}:{hours_ahead}:{model_tag}:{int(now.timestamp()) // 3600}"
+            profile = self.store.get_forecast(hospital_id, cache_key)
+            lookup_span.set(hit=profile is not None)
+        if profile is not None:
+            return self._render(profile, now)
         
-        for i in range(hours_ahead):
-            target_time = now + timedelta(hours=i+1)
-            target_hour = target_time.hour
-            
-            # Base prediction on historical hourly average
-            base_prediction = hourly_avg.get(target_hour, df['patient_count'].mean())
-            
-            # Add some variation
-            variation = np.random.normal(0, base_prediction * 0.15)
-            predicted_count = max(0, int(base_prediction + variation))
-            
-            forecasts.append({
-                'timestamp': target_time.isoformat(),
-                'hour': target_hour,
-                'predicted_patient_count': predicted_count,
-                'confidence_lower': int(predicted_count * 0.8),
-                'confidence_upper': int(predicted_count * 1.2)
+        state = self.store.get_state(hospital_id)
+        if state is not None and state['fingerprint'] == fingerprint:
+            aggregates = state['aggregates']
+        else:
+            with span('surge.aggregate'):
+                aggregates = self._aggregate(timestamps, counts)
+            self.store.set_state(hospital_id, {
+                'fingerprint': fingerprint,
+                'aggregates': aggregates,
+                'updated_at': now.isoformat()
             })
         
-        # Detect surge
-        avg_patients = df['patient_count'].mean()
-        std_patients = df['patient_count'].std()
-        surge_threshold = avg_patients + (1.5 * std_patients)
+        profile = self._profile(aggregates, hours_ahead, seasonal, now)
+        self.store.set_forecast(hospital_id, cache_key, profile, self.forecast_ttl)
+        return self._render(profile, now)
+    
+    def _aggregate(self, timestamps: np.ndarray, counts: np.ndarray) -> Optional[Dict]:
+        """Reduce history to JSON-serializable per-hour statistics, or None if too short"""
+        if len(counts) < MIN_HISTORY_POINTS:
+            return None
         
-        surge_detected = any(f['predicted_patient_count'] > surge_threshold for f in forecasts)
-        peak_hour = max(forecasts, key=lambda x: x['predicted_patient_count'])
+        # Hour of day (UTC) by integer arithmetic
+        hours = (timestamps // 3600) % 24
+        
+        hour_n = np.bincount(hours, minlength=24)
+        hour_sum = np.bincount(hours, weights=counts, minlength=24)
+        hour_sq = np.bincount(hours, weights=counts * counts, minlength=24)
         
-        # Generate recommendations
-        recommendations = self._generate_recommendations(forecasts, surge_detected, avg_patients)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            hourly_mean = hour_sum / hour_n
+            # Sample variance (ddof=1), defined only for hours seen at least twice
+            hourly_var = (hour_sq - hour_sum * hourly_mean) / (hour_n - 1)
         
         return {
-            'hourly_forecast': forecasts,
-            'surge_detected': surge_detected,
-            'surge_threshold': int(surge_threshold),
-            'current_average': int(avg_patients),
-            'peak_hour': peak_hour,
-            'recommendations': recommendations,
-            'confidence': 0.75,
-            'model_version': self.model_version
+            'hourly_mean': [float(hourly_mean[h]) if hour_n[h] > 0 else None for h in range(24)],
+            'hourly_var': [float(max(hourly_var[h], 0.0)) if hour_n[h] > 1 else None for h in range(24)],
+            'mean': float(counts.mean()),
+            'std': float(counts.std(ddof=1)),
+            'count': int(len(counts))
         }
     
-    def _baseline_forecast(self, hours_ahead: int) -> Dict:
-        """Generate baseline forecast when insufficient data"""
-        now = datetime.now()
-        current_hour = now.hour
+    def _profile(self, aggregates: Optional[Dict], hours_ahead: int,
+                 seasonal: Optional[SeasonalModel], now: datetime) -> Dict:
+        """
+        Per-hour predictions and intervals from aggregated history, or from the
+        seasonal model's table. Holds nothing that changes within the clock hour,
+        so it can be cached and rendered for any request in that hour.
+        """
+        if aggregates is None:
+            # Not enough data, return baseline forecast
+            return self._baseline_profile(hours_ahead, now)
+        
+        hourly_mean = aggregates['hourly_mean']
+        hourly_var = aggregates.get('hourly_var') or [None] * 24
+        overall_var = aggregates['std'] ** 2
+        
+        # Fitted per-hour distribution for each forecast hour
+        target_times = [now + timedelta(hours=i+1) for i in range(hours_ahead)]
+        means = np.array([
+            hourly_mean[t.hour] if hourly_mean[t.hour] is not None else aggregates['mean']
+            for t in target_times
+        ], dtype=float)
+        variances = np.array([
+            hourly_var[t.hour] if hourly_var[t.hour] is not None else overall_var
+            for t in target_times
+        ], dtype=float)
         
+        forecast_model = {'forecast_model': 'hourly_average'}
+        fitted_at = None
+        predictive = False
+        if seasonal is not None:
+            fitted = seasonal.lookup(np.array([int(t.timestamp()) // 3600 for t in target_times]))
+            if fitted is not None:
+                means, variances = fitted
+                # Prophet's interval already includes observation noise
+                predictive = True
+                fitted_at = seasonal.fitted_at
+                forecast_model = {
+                    'forecast_model': 'seasonal',
+                    'model_fitted_at': datetime.fromtimestamp(fitted_at).isoformat()
+                }
+        
+        avg_patients = aggregates['mean']
+        std_patients = aggregates['std']
+        surge_threshold = avg_patients + (1.5 * std_patients)
+        
+        with span('surge.simulate', hours=hours_ahead, paths=self.simulations):
+            lower, upper, surge_probability = self._simulate(means, variances, surge_threshold, predictive)
+        
+        return self._profile_dict(means, lower, upper, surge_probability, surge_threshold, avg_patients, {
+            'confidence': 0.85 if forecast_model['forecast_model'] == 'seasonal' else 0.75,
+            'model_version': self.model_version,
+            **forecast_model
+        }, fitted_at)
+    
+    def _baseline_profile(self, hours_ahead: int, now: datetime) -> Dict:
+        """Baseline profile when there is not enough history"""
         # Simple hourly pattern (higher during day, lower at night)
         hourly_pattern = {
             0: 5, 1: 3, 2: 2, 3: 2, 4: 3, 5: 5,
@@ -95,33 +231,96 @@ class SurgeForecaster:
             18: 22, 19: 18, 20: 15, 21: 12, 22: 10, 23: 7
         }
         
-        forecasts = []
-        for i in range(hours_ahead):
-            target_time = now + timedelta(hours=i+1)
-            target_hour = target_time.hour
-            predicted_count = hourly_pattern.get(target_hour, 15)
-            
-            forecasts.append({
-                'timestamp': target_time.isoformat(),
-                'hour': target_hour,
-                'predicted_patient_count': predicted_count,
-                'confidence_lower': int(predicted_count * 0.7),
-                'confidence_upper': int(predicted_count * 1.3)
-            })
+        target_times = [now + timedelta(hours=i+1) for i in range(hours_ahead)]
+        means = np.array([hourly_pattern.get(t.hour, 15) for t in target_times], dtype=float)
+        
+        # No history to fit dispersion from, so arrivals are treated as Poisson
+        lower, upper, surge_probability = self._simulate(means, means, 20)
+        return self._profile_dict(means, lower, upper, surge_probability, 20, 15, {
+            'confidence': 0.60,
+            'model_version': self.model_version
+        })
+    
+    @staticmethod
+    def _profile_dict(means, lower, upper, surge_probability, surge_threshold: float,
+                      average: float, fields: Dict, fitted_at: Optional[float] = None) -> Dict:
+        return {
+            'means': [float(m) for m in means],
+            'lower': [float(v) for v in lower],
+            'upper': [float(v) for v in upper],
+            'surge_probability': [float(p) for p in surge_probability],
+            'surge_threshold': float(surge_threshold),
+            'average': float(average),
+            'fields': fields,
+            'fitted_at': fitted_at
+        }
+    
+    def _render(self, profile: Dict, now: datetime) -> Dict:
+        """Forecast response for a profile, with timestamps and model age taken at now"""
+        target_times = [now + timedelta(hours=i+1) for i in range(len(profile['means']))]
+        forecasts = self._hourly_entries(target_times, profile['means'], profile['lower'],
+                                         profile['upper'], profile['surge_probability'])
+        surge_threshold = profile['surge_threshold']
         
+        # Detect surge
+        surge_detected = any(f['predicted_patient_count'] > surge_threshold for f in forecasts)
         peak_hour = max(forecasts, key=lambda x: x['predicted_patient_count'])
-        surge_detected = peak_hour['predicted_patient_count'] > 20
         
-        return {
+        result = {
             'hourly_forecast': forecasts,
             'surge_detected': surge_detected,
-            'surge_threshold': 20,
-            'current_average': 15,
+            'surge_threshold': int(surge_threshold),
+            'current_average': int(profile['average']),
             'peak_hour': peak_hour,
-            'recommendations': self._generate_recommendations(forecasts, surge_detected, 15),
-            'confidence': 0.60,
-            'model_version': self.model_version
+            'max_surge_probability': max(f['surge_probability'] for f in forecasts),
+            'recommendations': self._generate_recommendations(forecasts, surge_detected, profile['average']),
+            **profile['fields']
         }
+        if profile['fitted_at'] is not None:
+            result['model_age_seconds'] = round(time.time() - profile['fitted_at'], 1)
+        return result
+    
+    def _simulate(self, means: np.ndarray, variances: np.ndarray, surge_threshold: float,
+                  predictive: bool = False):
+        """
+        Simulate arrival paths for every forecast hour in one vectorized draw.
+        
+        Hours whose variance exceeds their mean are modelled as negative binomial
+        (a gamma-Poisson mixture), the rest as Poisson. With `predictive`, the
+        variances are a model's full predictive spread and counts are drawn from
+        that normal distribution directly, without Poisson noise on top.
+        
+        Returns:
+            (lower, upper, surge_probability) arrays, one value per hour
+        """
+        means = np.maximum(means, 0.0)
+        size = (self.simulations, len(means))
+        if predictive:
+            paths = np.maximum(np.rint(self.rng.normal(means, np.sqrt(variances), size=size)), 0.0)
+        else:
+            excess = variances - means
+            overdispersed = (excess > 1e-9) & (means > 0)
+            safe_excess = np.where(overdispersed, excess, 1.0)
+            safe_means = np.where(means > 0, means, 1.0)
+            shape = np.where(overdispersed, means ** 2 / safe_excess, 1.0)
+            scale = np.where(overdispersed, safe_excess / safe_means, 1.0)
+            
+            rates = np.where(overdispersed, self.rng.gamma(shape, scale, size=size), means)
+            paths = self.rng.poisson(rates)
+        
+        lower, upper = np.quantile(paths, [self.interval_alpha, 1 - self.interval_alpha], axis=0)
+        surge_probability = (paths > surge_threshold).mean(axis=0)
+        return lower, upper, surge_probability
+    
+    def _hourly_entries(self, target_times, means, lower, upper, surge_probability) -> List[Dict]:
+        return [{
+            'timestamp': target_time.isoformat(),
+            'hour': target_time.hour,
+            'predicted_patient_count': int(round(means[i])),
+            'confidence_lower': int(np.floor(lower[i])),
+            'confidence_upper': int(np.ceil(upper[i])),
+            'surge_probability': round(float(surge_probability[i]), 3)
+        } for i, target_time in enumerate(target_times)]
     
     def _generate_recommendations(self, forecasts: List[Dict], surge_detected: bool, avg_patients: float) -> List[Dict]:
         """Generate actionable recommendations based on forecast"""
@@ -16,6 +16,13 @@ RED = "\033[91m"
 YELLOW = "\033[93m"
 BLUE = "\033[94m"
 
+# Sample chief complaints, also used as the seed corpus by benchmark_nlp.py
+NLP_TEST_CASES = [
+    "Patient complains of severe chest pain radiating to left arm and shortness of breath",
+    "65-year-old male with crushing chest pain, sweating, and difficulty breathing",
+    "Patient has headache and dizziness, feeling weak"
+]
+
 def print_header(text):
     print(f"\n{BLUE}{'='*60}{BASE_COLOR}")
     print(f"{BLUE}{text:^60}{BASE_COLOR}")
@@ -109,18 +116,279 @@ def test_deterioration_prediction():
         print_test("Deterioration Prediction", False, f"Error: {str(e)}")
         return False
 
+def test_deterioration_horizon():
+    """Test waiting-time horizon projection endpoint"""
+    print_header("Testing Deterioration Horizon")
+    
+    patient = {
+        "vitalSigns": {"heartRate": 110, "oxygenSaturation": 97},
+        "currentPriority": "GREEN",
+        "waitingTime": 30,
+        "symptoms": [{"symptom": "Headache", "severity": "moderate"}]
+    }
+    
+    try:
+        response = requests.post(
+            f"{ML_SERVICE_URL}/api/predict/deterioration/horizon",
+            json={**patient, "horizonMinutes": 240},
+            timeout=5
+        )
+        data = response.json()
+        
+        if response.status_code == 200 and data.get('success'):
+            projection = data['projection']
+            print_test("Single Patient Projection", True)
+            print(f"  Next change in: {YELLOW}{projection['next_change_in_minutes']} min{BASE_COLOR}")
+            print(f"  Next priority: {projection['next_predicted_priority']}")
+            for point in projection['risk_curve']:
+                print(f"    • {point['waiting_time']} min -> {point['risk_score']} ({point['predicted_priority']})")
+            
+            # Risk steps up once waiting time passes 60 minutes
+            assert projection['next_change_in_minutes'] == 31
+            assert projection['risk_curve'][0]['waiting_time'] == 30
+        else:
+            print_test("Single Patient Projection", False, f"Status: {response.status_code}")
+            return False
+        
+        response = requests.post(
+            f"{ML_SERVICE_URL}/api/predict/deterioration/horizon",
+            json={"patients": [{**patient, "patientId": 1}, {**patient, "patientId": 2, "waitingTime": 100}]},
+            timeout=5
+        )
+        data = response.json()
+        if response.status_code == 200 and data.get('success'):
+            projections = data['projections']
+            assert [p['patient_id'] for p in projections] == [1, 2]
+            assert projections[1]['next_change_in_minutes'] == 21
+            print_test("Batch Projection", True, f"{len(projections)} patients")
+        else:
+            print_test("Batch Projection", False, f"Status: {response.status_code}")
+            return False
+        
+        # Oversized horizons are capped, invalid ones rejected
+        response = requests.post(
+            f"{ML_SERVICE_URL}/api/predict/deterioration/horizon",
+            json={**patient, "horizonMinutes": 10 ** 9},
+            timeout=5
+        )
+        capped = response.status_code == 200 and response.json()['projection']['horizon_minutes'] == 1440
+        rejected = all(
+            requests.post(
+                f"{ML_SERVICE_URL}/api/predict/deterioration/horizon",
+                json={**patient, "horizonMinutes": value},
+                timeout=5
+            ).status_code == 400
+            for value in ("abc", -5)
+        )
+        passed = capped and rejected
+        print_test("Horizon Bounds", passed, f"Capped: {capped}, rejected: {rejected}")
+        return passed
+    except Exception as e:
+        print_test("Deterioration Horizon", False, f"Error: {str(e)}")
+        return False
+
+def test_patient_queue():
+    """Test incremental per-hospital queue endpoints"""
+    print_header("Testing Hospital Queue")
+    
+    queue_url = f"{ML_SERVICE_URL}/api/queue/integration-test"
+    try:
+        patients = [
+            {"patientId": "stable", "vitalSigns": {"heartRate": 80}},
+            {"patientId": "critical", "vitalSigns": {"heartRate": 130, "oxygenSaturation": 88}},
+            {"patientId": "watch", "vitalSigns": {"heartRate": 110, "oxygenSaturation": 93}}
+        ]
+        response = requests.post(f"{queue_url}/patients", json={"patients": patients}, timeout=5)
+        assert response.status_code == 200 and response.json()['size'] == 3
+        
+        response = requests.get(queue_url, params={"k": 2}, timeout=5)
+        order = [p['patient_id'] for p in response.json()['patients']]
+        print_test("Initial Order", order == ["critical", "watch"], f"Top 2: {order}")
+        
+        # Vitals update for the stable patient moves them to the front
+        response = requests.post(
+            f"{queue_url}/patients",
+            json={"patientId": "stable", "vitalSigns": {"heartRate": 140, "oxygenSaturation": 85}},
+            timeout=5
+        )
+        print(f"  Updated risk: {YELLOW}{response.json()['patient']['risk_score']}{BASE_COLOR}")
+        
+        requests.delete(f"{queue_url}/patients/critical", timeout=5)
+        response = requests.get(queue_url, timeout=5)
+        order = [p['patient_id'] for p in response.json()['patients']]
+        passed = order == ["stable", "watch"]
+        print_test("Update and Discharge", passed, f"Order: {order}")
+        
+        requests.delete(f"{queue_url}/patients/stable", timeout=5)
+        requests.delete(f"{queue_url}/patients/watch", timeout=5)
+        return passed
+    except Exception as e:
+        print_test("Hospital Queue", False, f"Error: {str(e)}")
+        return False
+
+def test_queue_waiting_rescore():
+    """Test that queued patients are re-ranked as their wait crosses a threshold (in-process)"""
+    print_header("Testing Queue Waiting-Time Rescore")
+    
+    from deterioration_predictor import DeteriorationPredictor
+    from priority_queue import HospitalQueues, QueueFull
+    
+    try:
+        now = [1000.0]
+        queues = HospitalQueues(DeteriorationPredictor(), clock=lambda: now[0])
+        queues.upsert('rescore-test', 'waiting', {'heart_rate': 105, 'waiting_time': 119})
+        queues.upsert('rescore-test', 'abnormal', {'heart_rate': 125})
+        before = [p['patient_id'] for p in queues.top('rescore-test')]
+        
+        # Two minutes later the first patient has waited past two hours
+        now[0] += 120
+        after = queues.top('rescore-test')
+        order = [p['patient_id'] for p in after]
+        
+        passed = before == ['abnormal', 'waiting'] and order == ['waiting', 'abnormal']
+        print_test("Rescored On Read", passed, f"Before: {before}, after: {order}")
+        print(f"  Waiting patient now: {YELLOW}{after[0]['risk_score']} ({after[0]['predicted_priority']}){BASE_COLOR}")
+        
+        # Reads do not create queues, limits hold, and patients never upserted again expire
+        limited = HospitalQueues(DeteriorationPredictor(), clock=lambda: now[0],
+                                 max_hospitals=1, max_patients=2, patient_ttl=4 * 3600)
+        limited.upsert('limit-test', 'kept', {'heart_rate': 80})
+        limited.upsert('limit-test', 'ghost', {'heart_rate': 80})
+        unknown = limited.top('unknown') == [] and 'unknown' not in limited.status()
+        rejected = []
+        for hospital_id, patient_id in (('limit-test', 'third'), ('other', 'first')):
+            try:
+                limited.upsert(hospital_id, patient_id, {'heart_rate': 80})
+            except QueueFull:
+                rejected.append(hospital_id)
+        now[0] += 3 * 3600
+        limited.upsert('limit-test', 'kept', {'heart_rate': 80})
+        now[0] += 2 * 3600
+        remaining = [p['patient_id'] for p in limited.top('limit-test')]
+        bounded = unknown and rejected == ['limit-test', 'other'] and remaining == ['kept']
+        print_test("Queue Limits", bounded, f"Rejected: {rejected}, remaining: {remaining}")
+        return passed and bounded
+    except Exception as e:
+        print_test("Queue Waiting-Time Rescore", False, f"Error: {str(e)}")
+        return False
+
+def test_queue_snapshot_restore():
+    """Test that queues restored from a state snapshot keep their order (in-process)"""
+    print_header("Testing Queue Snapshot Restore")
+    
+    import os
+    import tempfile
+    from deterioration_predictor import DeteriorationPredictor
+    from priority_queue import HospitalQueues
+    from snapshot import SnapshotManager
+    
+    try:
+        predictor = DeteriorationPredictor()
+        queues = HospitalQueues(predictor)
+        queues.upsert_many('snapshot-test', [
+            ('stable', {'heart_rate': 80}),
+            ('critical', {'heart_rate': 130, 'oxygen_saturation': 88}),
+            ('watch', {'heart_rate': 110, 'oxygen_saturation': 93})
+        ])
+        before = [p['patient_id'] for p in queues.top('snapshot-test')]
+        
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'state.snap')
+            manager = SnapshotManager(path, interval=0)
+            manager.register('queues', queues)
+            manager.save()
+            
+            restored = HospitalQueues(predictor)
+            manager = SnapshotManager(path, interval=0)
+            manager.register('queues', restored)
+            manager.restore()
+        after = [p['patient_id'] for p in restored.top('snapshot-test')]
+        
+        passed = manager.stats['restored'] == ['queues'] and after == before
+        print_test("Restored Order", passed, f"Before: {before}, after: {after}")
+        
+        # Concurrent writers each use their own temporary file
+        from concurrent.futures import ThreadPoolExecutor
+        from snapshot import SnapshotReader, write_snapshot
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'state.snap')
+            with ThreadPoolExecutor(max_workers=4) as writers:
+                list(writers.map(lambda i: write_snapshot(path, {'n': 1}, {'value': {'writer': i}}), range(16)))
+            reader = SnapshotReader(path)
+            written = reader.get('value')['writer']
+            leftovers = [name for name in os.listdir(directory) if name != 'state.snap']
+        concurrent = written in range(16) and not leftovers
+        print_test("Concurrent Writers", concurrent, f"Last writer: {written}, leftovers: {leftovers}")
+        return passed and concurrent
+    except Exception as e:
+        print_test("Queue Snapshot Restore", False, f"Error: {str(e)}")
+        return False
+
+def test_fair_scheduling():
+    """Test that ML work is accounted per hospital"""
+    print_header("Testing Per-Hospital Scheduling")
+    
+    try:
+        for _ in range(3):
+            requests.post(
+                f"{ML_SERVICE_URL}/api/nlp/extract",
+                json={"text": "chest pain and fever"},
+                headers={"X-Hospital-Id": "fairness-test"},
+                timeout=5
+            )
+        load = requests.get(f"{ML_SERVICE_URL}/health", timeout=3).json()['load']
+        tenant = load['tenants'].get('fairness-test', {})
+        passed = tenant.get('completed', 0) >= 3
+        print_test("Tenant Accounting", passed,
+                   f"Completed: {tenant.get('completed')}, avg wait: {tenant.get('avg_wait_ms')}ms")
+        print(f"  Per-hospital limits: {YELLOW}{load['tenant_max_running']} running, "
+              f"{load['tenant_max_queue']} queued{BASE_COLOR}")
+        
+        # Work that raises is counted as failed, not completed (in-process)
+        from admission import AdmissionController
+        controller = AdmissionController(max_workers=2, max_queue=4)
+        controller.run(len, 'ok', deadline=time.monotonic() + 5, tenant='accounting-test')
+        try:
+            controller.run(int, 'not a number', deadline=time.monotonic() + 5, tenant='accounting-test')
+        except ValueError:
+            pass
+        counts = controller.status()['tenants']['accounting-test']
+        failures_counted = counts['completed'] == 1 and counts['failed'] == 1
+        print_test("Failure Accounting", failures_counted,
+                   f"Completed: {counts['completed']}, failed: {counts['failed']}")
+        return passed and failures_counted
+    except Exception as e:
+        print_test("Per-Hospital Scheduling", False, f"Error: {str(e)}")
+        return False
+
+def test_tracing():
+    """Test that trace ids are accepted and echoed"""
+    print_header("Testing Request Tracing")
+    
+    try:
+        response = requests.post(
+            f"{ML_SERVICE_URL}/api/predict/deterioration",
+            json={"vitalSigns": {"heartRate": 120}},
+            headers={"X-Trace-Id": "integration-trace-1"},
+            timeout=5
+        )
+        passed = response.headers.get("X-Trace-Id") == "integration-trace-1"
+        print_test("Trace Id Propagation", passed, f"Echoed: {response.headers.get('X-Trace-Id')}")
+        
+        tracing = requests.get(f"{ML_SERVICE_URL}/health", timeout=3).json()['tracing']
+        print(f"  Traced: {YELLOW}{tracing['traced']}{BASE_COLOR}, kept slow: {tracing['kept_slow']}, "
+              f"sample rate: {tracing['sample_rate']}")
+        return passed
+    except Exception as e:
+        print_test("Request Tracing", False, f"Error: {str(e)}")
+        return False
+
 def test_nlp_extraction():
     """Test NLP extraction endpoint"""
     print_header("Testing NLP Extraction")
     
-    test_cases = [
-        "Patient complains of severe chest pain radiating to left arm and shortness of breath",
-        "65-year-old male with crushing chest pain, sweating, and difficulty breathing",
-        "Patient has headache and dizziness, feeling weak"
-    ]
-    
     all_passed = True
-    for i, text in enumerate(test_cases, 1):
+    for i, text in enumerate(NLP_TEST_CASES, 1):
         print(f"\n{BLUE}Test Case {i}:{BASE_COLOR}")
         print(f"  Input: \"{text[:60]}...\"")
         
@@ -155,6 +423,169 @@ def test_nlp_extraction():
     
     return all_passed
 
+def test_typo_tolerance():
+    """Test that misspelled symptoms are matched with reduced confidence"""
+    print_header("Testing Typo Tolerance")
+    
+    try:
+        response = requests.post(
+            f"{ML_SERVICE_URL}/api/nlp/extract",
+            json={"text": "chset pain and dizzyness, trouble breathin, hx of hypertention"},
+            timeout=3
+        )
+        extraction = response.json()['extraction']
+        symptoms = {s['symptom']: s for s in extraction['extracted_symptoms']}
+        conditions = {c['condition']: c for c in extraction['extracted_conditions']}
+        for symptom in symptoms.values():
+            if 'match_distance' in symptom:
+                print(f"    • {symptom['matched_text']} -> {symptom['symptom']} (distance {symptom['match_distance']})")
+        
+        passed = (
+            symptoms['Chest Pain']['match_distance'] == 1
+            and symptoms['Dizziness']['confidence'] < 0.70
+            and symptoms['Difficulty Breathing']['match_distance'] == 1
+            and 'Hypertension' in conditions
+            and extraction['predicted_severity'] == 'critical'
+        )
+        print_test("Fuzzy Symptom Matching", passed)
+        
+        # Breathing on its own is a normal finding, not a respiratory symptom
+        normal_passed = True
+        for text in ("patient is breathing normally", "breathing comfortably on room air"):
+            extraction = requests.post(
+                f"{ML_SERVICE_URL}/api/nlp/extract", json={"text": text}, timeout=3
+            ).json()['extraction']
+            respiratory = [s['symptom'] for s in extraction['extracted_symptoms'] if s['category'] == 'respiratory']
+            normal_passed = (normal_passed and not respiratory
+                             and extraction['predicted_severity'] == 'mild'
+                             and extraction['predicted_specialty'] == 'General')
+        print_test("Normal Breathing", normal_passed)
+        passed = passed and normal_passed
+        
+        # An unbroken token longer than any keyword must not be expanded into deletion variants
+        started = time.time()
+        response = requests.post(
+            f"{ML_SERVICE_URL}/api/nlp/extract",
+            json={"text": "pain " + "x" * 999},
+            timeout=3
+        )
+        elapsed_ms = (time.time() - started) * 1000
+        long_token_passed = response.status_code == 200 and elapsed_ms < 1000
+        print_test("Long Token", long_token_passed, f"{elapsed_ms:.0f} ms")
+        return passed and long_token_passed
+    except Exception as e:
+        print_test("Fuzzy Symptom Matching", False, f"Error: {str(e)}")
+        return False
+
+def test_long_note_extraction():
+    """Test sentence-windowed extraction with negation on a long note"""
+    print_header("Testing Long Note Extraction")
+    
+    note = (
+        "Patient denies chest pain and fever but reports dizziness since this morning. "
+        "No history of diabetes. Possible stroke per EMS crew. "
+    ) * 20
+    try:
+        response = requests.post(
+            f"{ML_SERVICE_URL}/api/nlp/extract",
+            json={"text": note},
+            timeout=5
+        )
+        data = response.json()
+        if response.status_code != 200 or not data.get('success'):
+            print_test("Long Note Extraction", False, f"Status: {response.status_code}")
+            return False
+        
+        extraction = data['extraction']
+        symptoms = {s['symptom']: s for s in extraction['extracted_symptoms']}
+        negated = {f['term'] for f in extraction['negated_findings']}
+        print(f"  Sentences: {extraction['sentences']}, mode: {extraction['mode']}")
+        print(f"  Negated: {YELLOW}{sorted(negated)}{BASE_COLOR}")
+        
+        assert extraction['mode'] == 'long'
+        assert 'Fever' not in symptoms and 'Fever' in negated
+        # Critical terms are kept, marked negated, rather than dropped on a cue
+        assert symptoms['Chest Pain']['certainty'] == 'negated' and 'Chest Pain' in negated
+        assert symptoms['Dizziness']['mentions'] == 20
+        assert symptoms['Stroke']['certainty'] == 'uncertain'
+        print_test("Negation and Uncertainty", True)
+        
+        # Short complaints are checked for negation too
+        response = requests.post(
+            f"{ML_SERVICE_URL}/api/nlp/extract",
+            json={"text": "no fever but severe headache"},
+            timeout=5
+        )
+        extraction = response.json()['extraction']
+        symptoms = {s['symptom'] for s in extraction['extracted_symptoms']}
+        negated = {f['term'] for f in extraction['negated_findings']}
+        assert extraction['mode'] == 'short'
+        assert 'Fever' not in symptoms and 'Fever' in negated
+        assert 'Severe Headache' in symptoms and extraction['predicted_severity'] == 'severe'
+        print_test("Short Note Negation", True, f"Negated: {sorted(negated)}")
+        
+        # Cues that belong to the finding, pseudo-negations, clause ends and other
+        # languages must not hide a critical symptom
+        cases = {
+            "patient not breathing": "Can'T Breathe",
+            "did not stop bleeding": "Bleeding",
+            "not responding, unconscious": "Unconscious",
+            "no relief from chest pain": "Chest Pain",
+            "no improvement, chest pain": "Chest Pain",
+            "el paciente no puede respirar, dolor de pecho": "No Puede Respirar",
+            "denies chest pain": "Chest Pain",
+        }
+        for text, expected in cases.items():
+            extraction = requests.post(
+                f"{ML_SERVICE_URL}/api/nlp/extract", json={"text": text}, timeout=5
+            ).json()['extraction']
+            symptoms = {s['symptom'] for s in extraction['extracted_symptoms']}
+            assert expected in symptoms, f"{text!r} lost {expected}"
+            assert extraction['predicted_severity'] == 'critical', f"{text!r} is {extraction['predicted_severity']}"
+        print_test("Critical Findings Kept", True, f"{len(cases)} sentences")
+        return True
+    except Exception as e:
+        print_test("Long Note Extraction", False, f"Error: {str(e)}")
+        return False
+
+def test_deep_batching():
+    """Test that concurrent escalations reach the deep backend as one batch (in-process)"""
+    print_header("Testing Deep Tier Batching")
+    
+    from concurrent.futures import Future, ThreadPoolExecutor
+    from nlp_extractor import NLPExtractor
+    from tiered_nlp import TieredNLPExtractor
+    
+    class RecordingBackend:
+        def __init__(self):
+            self.batch_sizes = []
+        
+        def extract_batch(self, texts):
+            self.batch_sizes.append(len(texts))
+            time.sleep(0.05)
+            return [[{'text': 'odd sensation', 'label': 'SYMPTOM', 'score': 0.65}] for _ in texts]
+    
+    try:
+        tiered = TieredNLPExtractor(NLPExtractor(), backend_name='none')
+        backend = RecordingBackend()
+        tiered._backend = backend
+        tiered._pool = ThreadPoolExecutor(max_workers=1)
+        tiered._loading = Future()
+        tiered._loading.set_result(None)
+        
+        complaints = [f"odd sensation in arm number {i}" for i in range(4)]
+        with ThreadPoolExecutor(max_workers=4) as callers:
+            results = list(callers.map(tiered.extract, complaints))
+        tiered._pool.shutdown()
+        
+        passed = (all(r['tier'] == 'deep' for r in results)
+                  and sum(backend.batch_sizes) == 4 and len(backend.batch_sizes) < 4)
+        print_test("Concurrent Escalations Batched", passed, f"Batch sizes: {backend.batch_sizes}")
+        return passed
+    except Exception as e:
+        print_test("Deep Tier Batching", False, f"Error: {str(e)}")
+        return False
+
 def test_surge_forecast():
     """Test surge forecasting endpoint"""
     print_header("Testing Surge Forecasting")
@@ -189,6 +620,7 @@ def test_surge_forecast():
             print(f"  Forecast Hours: {GREEN}{len(forecast['hourly_forecast'])}{BASE_COLOR}")
             print(f"  Peak Count: {forecast['peak_hour']['predicted_patient_count']}")
             print(f"  Confidence: {forecast['confidence']}")
+            print(f"  Forecast Model: {forecast['forecast_model']}")
             print(f"  Recommendations: {len(forecast['recommendations'])}")
             
             for rec in forecast['recommendations'][:2]:
@@ -198,10 +630,40 @@ def test_surge_forecast():
             assert 'hourly_forecast' in forecast
             assert 'surge_detected' in forecast
             assert 'recommendations' in forecast
+            assert forecast['forecast_model'] in ('seasonal', 'hourly_average')
             assert len(forecast['hourly_forecast']) == 6
             
             print_test("Response Structure", True, "All required fields present")
-            return True
+            
+            # A cached forecast is re-timed to the request rather than replayed
+            time.sleep(1.1)
+            repeat = requests.post(
+                f"{ML_SERVICE_URL}/api/forecast/surge",
+                json=test_data,
+                timeout=5
+            ).json()['forecast']
+            first = datetime.fromisoformat(forecast['hourly_forecast'][0]['timestamp'])
+            again = datetime.fromisoformat(repeat['hourly_forecast'][0]['timestamp'])
+            retimed = (again - first).total_seconds() >= 1
+            print_test("Cached Timestamps", retimed, f"Advanced {(again - first).total_seconds():.1f}s")
+            
+            # Oversized horizons are capped, invalid ones rejected
+            response = requests.post(
+                f"{ML_SERVICE_URL}/api/forecast/surge",
+                json={**test_data, "hoursAhead": 20000},
+                timeout=10
+            )
+            capped = response.status_code == 200 and len(response.json()['forecast']['hourly_forecast']) == 168
+            rejected = all(
+                requests.post(
+                    f"{ML_SERVICE_URL}/api/forecast/surge",
+                    json={**test_data, "hoursAhead": value},
+                    timeout=5
+                ).status_code == 400
+                for value in ("abc", 0, -3, None)
+            )
+            print_test("Forecast Hours Bounds", capped and rejected, f"Capped: {capped}, rejected: {rejected}")
+            return retimed and capped and rejected
         else:
             print_test("Surge Forecast", False, f"Status: {response.status_code}")
             return False
@@ -209,6 +671,90 @@ def test_surge_forecast():
         print_test("Surge Forecast", False, f"Error: {str(e)}")
         return False
 
+def test_seasonal_interval():
+    """Test that seasonal-model intervals follow the model's spread without extra noise (in-process)"""
+    print_header("Testing Seasonal Forecast Intervals")
+    
+    import numpy as np
+    from surge_forecaster import SurgeForecaster
+    
+    class FixedModel:
+        # Prophet-style table: mean 30 per hour, predictive standard deviation 1
+        fitted_at = time.time()
+        
+        def lookup(self, epoch_hours):
+            return np.full(len(epoch_hours), 30.0), np.full(len(epoch_hours), 1.0)
+    
+    try:
+        forecaster = SurgeForecaster()
+        forecaster.rng = np.random.default_rng(7)
+        aggregates = {'hourly_mean': [30.0] * 24, 'mean': 30.0, 'std': 5.0}
+        profile = forecaster._profile(aggregates, 6, FixedModel(), datetime.now())
+        widths = [upper - lower for lower, upper in zip(profile['lower'], profile['upper'])]
+        
+        # A 90% interval of N(30, 1) is about 3.3 wide; a Poisson draw on top would make it about 18
+        passed = profile['fields']['forecast_model'] == 'seasonal' and max(widths) <= 5
+        print_test("Predictive Spread Only", passed, f"Interval widths: {widths}")
+        return passed
+    except Exception as e:
+        print_test("Seasonal Forecast Intervals", False, f"Error: {str(e)}")
+        return False
+
+def test_history_timestamps():
+    """Test that list-form surge history accepts ISO forms and drops unparseable rows (in-process)"""
+    print_header("Testing Surge History Timestamps")
+    
+    from surge_forecaster import to_columnar
+    
+    try:
+        rows = [{"timestamp": value, "patient_count": 5} for value in (
+            "2026-01-01T00:00:00Z", "2026-01-01T01:00:00.12Z", "2026-01-01T04:00:00+02:00",
+            "2026-01-01 03:00:00", "not a time", None
+        )]
+        timestamps, counts = to_columnar(rows)
+        expected = [1767225600, 1767229200, 1767232800, 1767236400]
+        passed = timestamps.tolist() == expected and len(counts) == 4
+        print_test("ISO Timestamps", passed, f"Parsed: {timestamps.tolist()}")
+        return passed
+    except Exception as e:
+        print_test("Surge History Timestamps", False, f"Error: {str(e)}")
+        return False
+
+def test_request_coalescing():
+    """Test that identical concurrent forecasts get identical answers"""
+    print_header("Testing Request Coalescing")
+    
+    from concurrent.futures import ThreadPoolExecutor
+    now = int(datetime.now().timestamp()) // 3600 * 3600
+    payload = {
+        "hospitalId": "coalescing-test",
+        "historicalData": {
+            "timestamps": [now - 3600 * i for i in range(48)],
+            "counts": [10 + (i % 24) for i in range(48)]
+        },
+        "hoursAhead": 6
+    }
+    try:
+        with ThreadPoolExecutor(max_workers=8) as pool:
+            responses = list(pool.map(
+                lambda _: requests.post(f"{ML_SERVICE_URL}/api/forecast/surge", json=payload, timeout=10),
+                range(8)
+            ))
+        bodies = [r.json() for r in responses]
+        # Timestamps are taken per response; the predictions themselves must agree
+        hourly = [
+            [{k: v for k, v in hour.items() if k != 'timestamp'} for hour in b['forecast']['hourly_forecast']]
+            for b in bodies if b.get('success')
+        ]
+        passed = len(hourly) == len(bodies) and all(h == hourly[0] for h in hourly)
+        stats = requests.get(f"{ML_SERVICE_URL}/health", timeout=3).json()['single_flight']
+        print_test("Concurrent Identical Forecasts", passed, f"{len(bodies)} responses agree")
+        print(f"  Computed: {YELLOW}{stats['leaders']}{BASE_COLOR}, shared: {stats['shared']}")
+        return passed
+    except Exception as e:
+        print_test("Request Coalescing", False, f"Error: {str(e)}")
+        return False
+
 def test_error_handling():
     """Test error handling"""
     print_header("Testing Error Handling")
@@ -252,8 +798,20 @@ def main():
     results = {
         "Health Check": test_ml_service_health(),
         "Deterioration Prediction": test_deterioration_prediction(),
+        "Deterioration Horizon": test_deterioration_horizon(),
+        "Hospital Queue": test_patient_queue(),
+        "Queue Waiting-Time Rescore": test_queue_waiting_rescore(),
+        "Queue Snapshot Restore": test_queue_snapshot_restore(),
+        "Per-Hospital Scheduling": test_fair_scheduling(),
+        "Request Tracing": test_tracing(),
         "NLP Extraction": test_nlp_extraction(),
+        "Typo Tolerance": test_typo_tolerance(),
+        "Long Note Extraction": test_long_note_extraction(),
+        "Deep Tier Batching": test_deep_batching(),
         "Surge Forecasting": test_surge_forecast(),
+        "Seasonal Forecast Intervals": test_seasonal_interval(),
+        "Surge History Timestamps": test_history_timestamps(),
+        "Request Coalescing": test_request_coalescing(),
         "Error Handling": test_error_handling()
     }
     
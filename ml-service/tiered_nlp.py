@@ -0,0 +1,271 @@
+import importlib.util
+import os
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+from typing import Dict, List, Optional
+
+from tracing import span
+
+# Noun-chunk heads that mark a phrase as a candidate symptom for the spaCy backend
+SYMPTOM_HEADS = {
+    'pain', 'ache', 'discomfort', 'pressure', 'tightness', 'swelling', 'rash',
+    'bleeding', 'bruise', 'fever', 'chill', 'cough', 'numbness', 'tingling',
+    'weakness', 'fatigue', 'nausea', 'vomiting', 'dizziness', 'headache',
+    'breath', 'breathing', 'injury', 'wound', 'burn', 'fracture', 'cramp',
+    'spasm', 'palpitation', 'confusion', 'sweating', 'seizure', 'itching',
+    'stiffness', 'discharge', 'diarrhea', 'faint', 'collapse'
+}
+
+
+class SpacyNERBackend:
+    """Noun-chunk based symptom spotting on top of a spaCy pipeline"""
+
+    name = 'spacy'
+
+    def __init__(self, model_name: str = 'en_core_web_sm'):
+        import spacy
+        self.model_name = model_name
+        self.nlp = spacy.load(model_name)
+
+    def extract_entities(self, text: str) -> List[Dict]:
+        return self._entities(self.nlp(text))
+
+    def extract_batch(self, texts: List[str]) -> List[List[Dict]]:
+        return [self._entities(doc) for doc in self.nlp.pipe(texts)]
+
+    def _entities(self, doc) -> List[Dict]:
+        entities = []
+        for chunk in doc.noun_chunks:
+            if chunk.root.lemma_.lower() in SYMPTOM_HEADS:
+                entities.append({
+                    'text': chunk.text,
+                    'label': 'SYMPTOM',
+                    'score': 0.65
+                })
+        return entities
+
+    @staticmethod
+    def available(model_name: str = 'en_core_web_sm') -> bool:
+        # spaCy models are installed as packages, so both can be checked without importing
+        return importlib.util.find_spec('spacy') is not None and importlib.util.find_spec(model_name) is not None
+
+
+def _backend_class(name: str):
+    if name == 'spacy':
+        return SpacyNERBackend
+    if name == 'transformer':
+        from transformer_ner import TransformerNERBackend
+        return TransformerNERBackend
+    raise ValueError(f"Unknown NLP deep backend: {name}")
+
+
+class TieredNLPExtractor:
+    """
+    Two-tier chief complaint extraction.
+
+    The dictionary extractor answers every request. Only when its confidence
+    falls below the escalation threshold is the complaint sent to a heavier
+    NER backend running in a separate, bounded worker pool. The deep tier
+    gets a hard deadline; if it misses it, the fast result is returned so the
+    Node caller's budget is never exceeded. Escalations that arrive together
+    are queued and run through the backend as one batch.
+    """
+
+    def __init__(self, fast_extractor, backend_name: Optional[str] = None):
+        self.fast = fast_extractor
+        self.backend_name = backend_name or os.getenv('NLP_DEEP_BACKEND', 'spacy')
+        self.escalation_confidence = float(os.getenv('NLP_ESCALATION_CONFIDENCE', 0.6))
+        self.deadline_ms = int(os.getenv('NLP_DEEP_DEADLINE_MS', 1500))
+        self.max_workers = int(os.getenv('NLP_DEEP_WORKERS', 1))
+        self.max_pending = int(os.getenv('NLP_DEEP_MAX_PENDING', 4))
+        # How long a worker waits for concurrent escalations to join its batch
+        self.batch_wait = int(os.getenv('NLP_DEEP_BATCH_WAIT_MS', 5)) / 1000.0
+        self.backend_options = {}
+        if self.backend_name == 'spacy':
+            self.backend_options = {'model_name': os.getenv('NLP_SPACY_MODEL', 'en_core_web_sm')}
+        elif self.backend_name == 'transformer':
+            self.backend_options = {'model_name': os.getenv('NLP_NER_MODEL', 'd4data/biomedical-ner-all')}
+
+        self._pool = None
+        self._backend = None
+        self._pending = threading.BoundedSemaphore(self.max_pending)
+        self._lock = threading.Lock()
+        self._loading = None
+        # Escalations waiting for a worker, and the workers draining them
+        self._queued: List[tuple] = []
+        self._draining = 0
+        self.tier_counts = {'fast': 0, 'deep': 0, 'deep_timeout': 0, 'deep_busy': 0,
+                            'deep_loading': 0, 'deep_error': 0}
+        self.batches = 0
+
+        if self.backend_name != 'none' and self._backend_available():
+            self._pool = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix='nlp-deep')
+            # Load the model off the request path; until it is ready escalations get the fast result
+            self._loading = self._pool.submit(self._load_backend)
+        elif self.backend_name != 'none':
+            print(f"NLP deep backend '{self.backend_name}' unavailable, serving dictionary tier only")
+
+    def _backend_available(self) -> bool:
+        try:
+            return _backend_class(self.backend_name).available(**self.backend_options)
+        except ValueError as e:
+            print(str(e))
+            return False
+
+    def _load_backend(self):
+        try:
+            self._backend = _backend_class(self.backend_name)(**self.backend_options)
+            print(f"Loaded NLP deep backend '{self.backend_name}'")
+        except Exception as e:
+            print(f"Error loading NLP deep backend '{self.backend_name}': {e}")
+            self._pool.shutdown(wait=False)
+            self._pool = None
+
+    def _run_backend(self, texts: List[str]) -> List[List[Dict]]:
+        return self._backend.extract_batch(texts)
+
+    def _drain(self):
+        """Run queued escalations through the backend in batches until none are left"""
+        if self.batch_wait > 0:
+            time.sleep(self.batch_wait)
+        while True:
+            with self._lock:
+                batch = self._queued[:self.max_pending]
+                del self._queued[:self.max_pending]
+                if not batch:
+                    self._draining -= 1
+                    return
+                self.batches += 1
+            try:
+                results = self._run_backend([text for text, _ in batch])
+            except Exception as e:
+                for _, future in batch:
+                    future.set_exception(e)
+                continue
+            for (_, future), entities in zip(batch, results):
+                future.set_result(entities)
+
+    def is_loaded(self):
+        return self.fast.is_loaded()
+
+    def deep_enabled(self) -> bool:
+        return self._pool is not None
+
+    def _count(self, key: str):
+        with self._lock:
+            self.tier_counts[key] += 1
+
+    def extract(self, text: str, deadline: Optional[float] = None, mode: str = 'auto') -> Dict:
+        """
+        Extract with the fast tier, escalating low-confidence results.
+
+        Args:
+            text: Chief complaint text
+            deadline: Optional absolute time.monotonic() by which the caller needs an answer
+            mode: Passed to the fast extractor; long notes are never escalated
+        """
+        with span('nlp.fast'):
+            result = self.fast.extract(text, mode=mode)
+
+        # NER over a multi-page note would break its latency bound and ignore negation;
+        # the deep backends are English models
+        if (self._pool is None or result.get('mode') == 'long' or result.get('keyword_pack') != 'en'
+                or result['confidence'] >= self.escalation_confidence):
+            self._count('fast')
+            result['tier'] = 'fast'
+            return result
+
+        timeout = self.deadline_ms / 1000.0
+        if deadline is not None:
+            timeout = min(timeout, deadline - time.monotonic())
+
+        with span('nlp.deep', timeout_ms=round(timeout * 1000, 1)) as deep_span:
+            deep = self._run_deep(text, timeout)
+            deep_span.set(used=deep is not None)
+        if deep is None:
+            result['tier'] = 'fast'
+            return result
+
+        self._count('deep')
+        return self._merge(result, deep)
+
+    def _run_deep(self, text: str, timeout: float) -> Optional[List[Dict]]:
+        # With several workers an escalation could otherwise start before the backend is set
+        if not self._loading.done() or self._backend is None:
+            self._count('deep_loading')
+            self._count('fast')
+            return None
+        if timeout <= 0 or not self._pending.acquire(blocking=False):
+            self._count('deep_busy')
+            self._count('fast')
+            return None
+
+        future = Future()
+        # Release the slot when the worker finishes, even if we stopped waiting
+        future.add_done_callback(lambda _: self._pending.release())
+        with self._lock:
+            self._queued.append((text, future))
+            start_worker = self._draining < self.max_workers
+            if start_worker:
+                self._draining += 1
+        if start_worker:
+            try:
+                self._pool.submit(self._drain)
+            except Exception:
+                with self._lock:
+                    self._draining -= 1
+                    self._queued = [item for item in self._queued if item[1] is not future]
+                future.cancel()
+                self._count('deep_error')
+                self._count('fast')
+                return None
+
+        try:
+            return future.result(timeout=timeout)
+        except FutureTimeoutError:
+            self._count('deep_timeout')
+        except Exception as e:
+            print(f"NLP deep tier failed: {e}")
+            self._count('deep_error')
+        self._count('fast')
+        return None
+
+    def _merge(self, fast_result: Dict, entities: List[Dict]) -> Dict:
+        """Add NER-found symptoms the dictionary missed and recompute confidence"""
+        result = dict(fast_result)
+        symptoms = list(fast_result['extracted_symptoms'])
+        known = {s['symptom'].lower() for s in symptoms}
+        # NER has no negation, so spans overlapping a term the fast tier negated are dropped
+        negated = [f['term'].lower() for f in fast_result.get('negated_findings', [])]
+
+        for entity in entities:
+            name = entity['text'].strip()
+            if not name or name.lower() in known:
+                continue
+            if any(term in name.lower() or name.lower() in term for term in negated):
+                continue
+            known.add(name.lower())
+            symptoms.append({
+                'symptom': name.title(),
+                'severity': 'moderate',
+                'category': 'general',
+                'confidence': round(entity.get('score', 0.6), 2)
+            })
+
+        result['extracted_symptoms'] = symptoms
+        if symptoms:
+            result['confidence'] = round(sum(s['confidence'] for s in symptoms) / len(symptoms), 2)
+        result['tier'] = 'deep'
+        return result
+
+    def status(self) -> Dict:
+        with self._lock:
+            counts = dict(self.tier_counts)
+        return {
+            'deep_backend': self.backend_name if self._pool is not None else None,
+            'escalation_confidence': self.escalation_confidence,
+            'deadline_ms': self.deadline_ms,
+            'tier_counts': counts,
+            'deep_batches': self.batches
+        }
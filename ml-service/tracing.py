@@ -0,0 +1,260 @@
+import contextvars
+import json
+import logging
+import os
+import queue
+import random
+import re
+import threading
+import time
+import uuid
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
+from typing import Dict, List, Optional
+
+# Correlation id shared with the Node backend; echoed on every response
+TRACE_HEADER = 'X-Trace-Id'
+
+_VALID_TRACE_ID = re.compile(r'^[A-Za-z0-9_.:-]{1,64}$')
+# Spans kept per trace; a runaway loop cannot grow a trace without bound
+MAX_SPANS = 256
+
+_trace: contextvars.ContextVar = contextvars.ContextVar('ml_trace', default=None)
+_parent: contextvars.ContextVar = contextvars.ContextVar('ml_span_parent', default=None)
+
+
+class Trace:
+    """Spans recorded for one request"""
+
+    __slots__ = ('trace_id', 'route', 'method', 'head_sampled', 'started_at', 'started',
+                 'spans', 'attrs', '_next_id')
+
+    def __init__(self, trace_id: str, route: str, method: str, head_sampled: bool):
+        self.trace_id = trace_id
+        self.route = route
+        self.method = method
+        self.head_sampled = head_sampled
+        self.started_at = time.time()
+        self.started = time.perf_counter()
+        self.spans: List[tuple] = []
+        self.attrs: Dict = {}
+        self._next_id = 0
+
+    def next_id(self) -> int:
+        # Spans of one trace may finish on two threads, but ids are only taken on entry
+        self._next_id += 1
+        return self._next_id
+
+
+class _Span:
+    __slots__ = ('trace', 'name', 'attrs', 'span_id', 'parent_id', 'started', '_token')
+
+    def __init__(self, trace: Trace, name: str, attrs: Dict):
+        self.trace = trace
+        self.name = name
+        self.attrs = attrs
+
+    def set(self, **attrs):
+        self.attrs.update(attrs)
+
+    def __enter__(self):
+        self.span_id = self.trace.next_id()
+        self.parent_id = _parent.get()
+        self._token = _parent.set(self.span_id)
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        finished = time.perf_counter()
+        _parent.reset(self._token)
+        if exc_type is not None:
+            self.attrs['error'] = exc_type.__name__
+        if len(self.trace.spans) < MAX_SPANS:
+            self.trace.spans.append((self.name, self.span_id, self.parent_id,
+                                     self.started, finished, self.attrs))
+        return False
+
+
+class _NoopSpan:
+    """Returned when the request is not traced; entering and exiting cost almost nothing"""
+
+    __slots__ = ()
+
+    def set(self, **attrs):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+
+_NOOP = _NoopSpan()
+
+
+def span(name: str, **attrs):
+    """Time a stage of the current request: `with span('surge.simulate', hours=6): ...`"""
+    trace = _trace.get()
+    if trace is None:
+        return _NOOP
+    return _Span(trace, name, attrs)
+
+
+def current_trace_id() -> Optional[str]:
+    trace = _trace.get()
+    return trace.trace_id if trace is not None else None
+
+
+class _DroppingQueueHandler(QueueHandler):
+    """Never blocks the request thread; counts traces dropped while the writer is behind"""
+
+    def __init__(self, record_queue: queue.Queue, on_drop):
+        super().__init__(record_queue)
+        self.on_drop = on_drop
+
+    def prepare(self, record):
+        # Serialisation happens on the listener thread
+        return record
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.on_drop()
+
+
+class _JsonLineFormatter(logging.Formatter):
+    def format(self, record) -> str:
+        return json.dumps(record.msg, separators=(',', ':'), default=str)
+
+
+class Tracer:
+    """
+    Per-request span recorder with head and tail sampling.
+
+    Every request records its spans in memory (a few tuples), which is cheap
+    enough to do always. When the request ends the trace is kept if it was
+    head-sampled (`ML_TRACE_SAMPLE_RATE`), took at least `ML_TRACE_SLOW_MS`, or
+    failed with a 5xx; everything else is discarded. Kept traces are handed
+    to a background thread through a bounded queue and written as one JSON
+    line each to a rotating file, so exporting never blocks a request.
+
+    The trace id comes from the caller's `X-Trace-Id` header when present,
+    so slow ML traces can be joined with the Node request that made them.
+    """
+
+    def __init__(self):
+        self.enabled = os.getenv('ML_TRACING_ENABLED', 'true').lower() in ('1', 'true', 'yes')
+        self.sample_rate = float(os.getenv('ML_TRACE_SAMPLE_RATE', 0.01))
+        self.slow_ms = float(os.getenv('ML_TRACE_SLOW_MS', 500))
+        self.path = os.getenv('ML_TRACE_FILE', os.path.join(os.path.dirname(__file__), 'logs', 'traces.jsonl'))
+        self.stats = {'traced': 0, 'kept_sampled': 0, 'kept_slow': 0, 'kept_error': 0, 'dropped': 0}
+        self._lock = threading.Lock()
+        self._listener: Optional[QueueListener] = None
+        self._handler: Optional[_DroppingQueueHandler] = None
+        if self.enabled:
+            self._start_export()
+
+    def _start_export(self):
+        try:
+            os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+            file_handler = RotatingFileHandler(
+                self.path,
+                maxBytes=int(os.getenv('ML_TRACE_MAX_BYTES', 10 * 1024 * 1024)),
+                backupCount=int(os.getenv('ML_TRACE_BACKUPS', 5)),
+                encoding='utf-8',
+                delay=True
+            )
+        except OSError as e:
+            print(f"Tracing disabled, cannot write {self.path}: {e}")
+            self.enabled = False
+            return
+        file_handler.setFormatter(_JsonLineFormatter())
+        record_queue = queue.Queue(maxsize=int(os.getenv('ML_TRACE_QUEUE_SIZE', 1000)))
+        self._handler = _DroppingQueueHandler(record_queue, lambda: self._count('dropped'))
+        self._listener = QueueListener(record_queue, file_handler)
+        self._listener.start()
+
+    def _count(self, key: str):
+        with self._lock:
+            self.stats[key] += 1
+
+    def begin_request(self, headers, route: str, method: str) -> Optional[str]:
+        """Start a trace for the current request; returns its id"""
+        if not self.enabled:
+            return None
+        trace_id = headers.get(TRACE_HEADER, '')
+        if not _VALID_TRACE_ID.match(trace_id):
+            trace_id = uuid.uuid4().hex
+        trace = Trace(trace_id, route, method, random.random() < self.sample_rate)
+        _trace.set(trace)
+        _parent.set(None)
+        return trace_id
+
+    def annotate(self, **attrs):
+        """Attach attributes to the current request's trace"""
+        trace = _trace.get()
+        if trace is not None:
+            trace.attrs.update(attrs)
+
+    def end_request(self, status: int):
+        """Finish the current trace and export it if sampled, slow or failed"""
+        trace = _trace.get()
+        if trace is None:
+            return
+        _trace.set(None)
+        duration_ms = (time.perf_counter() - trace.started) * 1000
+
+        if status >= 500:
+            reason = 'error'
+        elif duration_ms >= self.slow_ms:
+            reason = 'slow'
+        elif trace.head_sampled:
+            reason = 'sampled'
+        else:
+            reason = None
+        with self._lock:
+            self.stats['traced'] += 1
+            if reason is not None:
+                self.stats[f'kept_{reason}'] += 1
+        if reason is None or self._handler is None:
+            return
+
+        self._handler.handle(logging.makeLogRecord({'msg': {
+            'trace_id': trace.trace_id,
+            'route': trace.route,
+            'method': trace.method,
+            'status': status,
+            'kept': reason,
+            'start': trace.started_at,
+            'duration_ms': round(duration_ms, 3),
+            **trace.attrs,
+            'spans': [
+                {
+                    'name': name,
+                    'span_id': span_id,
+                    'parent_id': parent_id,
+                    'offset_ms': round((started - trace.started) * 1000, 3),
+                    'duration_ms': round((finished - started) * 1000, 3),
+                    **attrs
+                }
+                for name, span_id, parent_id, started, finished, attrs in trace.spans
+            ]
+        }}))
+
+    def flush(self):
+        """Stop the writer after draining queued traces"""
+        if self._listener is not None:
+            self._listener.stop()
+            self._listener = None
+
+    def status(self) -> Dict:
+        with self._lock:
+            stats = dict(self.stats)
+        return {
+            'enabled': self.enabled,
+            'sample_rate': self.sample_rate,
+            'slow_ms': self.slow_ms,
+            'file': self.path if self.enabled else None,
+            **stats
+        }
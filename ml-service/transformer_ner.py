@@ -0,0 +1,150 @@
+import importlib.util
+import os
+from functools import lru_cache
+from typing import Dict, List, Sequence, Tuple
+
+# Padding buckets; a batch is padded to its own longest item, never past its bucket
+LENGTH_BUCKETS = (16, 32, 64, 128, 256)
+
+# Labels from the token-classification model that we report as symptoms
+DEFAULT_SYMPTOM_LABELS = ('Sign_symptom', 'Disease_disorder')
+
+
+def default_thread_count() -> int:
+    """Split the cores evenly across service workers so torch pools don't oversubscribe"""
+    workers = int(os.getenv('WEB_CONCURRENCY', os.getenv('ML_SERVICE_WORKERS', 1)))
+    return max(1, (os.cpu_count() or 1) // max(1, workers))
+
+
+class TransformerNERBackend:
+    """
+    Token-classification NER tuned for CPU-only inference.
+
+    The model is loaded once and dynamically quantized to int8, torch
+    intra-op threads are pinned explicitly, tokenizer output is cached for
+    repeat complaints and batches are grouped by sequence length.
+    """
+
+    name = 'transformer'
+
+    def __init__(self, model_name: str = 'd4data/biomedical-ner-all', num_threads: int = None,
+                 max_length: int = LENGTH_BUCKETS[-1], max_batch_size: int = 16,
+                 tokenizer_cache_size: int = 2048, symptom_labels: Sequence[str] = DEFAULT_SYMPTOM_LABELS):
+        import torch
+        from transformers import AutoModelForTokenClassification, AutoTokenizer
+
+        self.torch = torch
+        self.num_threads = num_threads or int(os.getenv('NLP_TORCH_THREADS', default_thread_count()))
+        torch.set_num_threads(self.num_threads)
+        try:
+            torch.set_num_interop_threads(1)
+        except RuntimeError:
+            # Only settable before the first parallel op in the process
+            pass
+
+        self.model_name = model_name
+        self.max_length = max_length
+        self.max_batch_size = max_batch_size
+        self.symptom_labels = set(symptom_labels)
+
+        self.tokenizer = AutoTokenizer.from_pretrained(model_name)
+        model = AutoModelForTokenClassification.from_pretrained(model_name)
+        model.eval()
+        self.model = torch.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8)
+        self.id2label = model.config.id2label
+        self.pad_token_id = self.tokenizer.pad_token_id or 0
+
+        self._encode = lru_cache(maxsize=tokenizer_cache_size)(self._encode_uncached)
+
+    @staticmethod
+    def available(**_) -> bool:
+        return importlib.util.find_spec('torch') is not None and importlib.util.find_spec('transformers') is not None
+
+    def _encode_uncached(self, text: str) -> Tuple[Tuple[int, ...], Tuple[Tuple[int, int], ...]]:
+        encoding = self.tokenizer(
+            text,
+            truncation=True,
+            max_length=self.max_length,
+            return_offsets_mapping=True,
+            return_attention_mask=False
+        )
+        return tuple(encoding['input_ids']), tuple(tuple(o) for o in encoding['offset_mapping'])
+
+    def extract_entities(self, text: str) -> List[Dict]:
+        return self.extract_batch([text])[0]
+
+    def extract_batch(self, texts: List[str]) -> List[List[Dict]]:
+        """Run NER over texts, batching items of similar length together"""
+        encodings = [self._encode(text) for text in texts]
+        results: List[List[Dict]] = [[] for _ in texts]
+
+        for batch in self._bucketed_batches(encodings):
+            width = max(len(encodings[i][0]) for i in batch)
+            input_ids = self.torch.full((len(batch), width), self.pad_token_id, dtype=self.torch.long)
+            attention_mask = self.torch.zeros((len(batch), width), dtype=self.torch.long)
+            for row, index in enumerate(batch):
+                ids = encodings[index][0]
+                input_ids[row, :len(ids)] = self.torch.tensor(ids, dtype=self.torch.long)
+                attention_mask[row, :len(ids)] = 1
+
+            with self.torch.inference_mode():
+                logits = self.model(input_ids=input_ids, attention_mask=attention_mask).logits
+            scores, labels = logits.softmax(dim=-1).max(dim=-1)
+
+            for row, index in enumerate(batch):
+                length = len(encodings[index][0])
+                results[index] = self._decode(
+                    texts[index],
+                    encodings[index][1],
+                    labels[row, :length].tolist(),
+                    scores[row, :length].tolist()
+                )
+        return results
+
+    def _bucketed_batches(self, encodings) -> List[List[int]]:
+        buckets: Dict[int, List[int]] = {}
+        for index, (ids, _) in enumerate(encodings):
+            bucket = next((b for b in LENGTH_BUCKETS if len(ids) <= b), LENGTH_BUCKETS[-1])
+            buckets.setdefault(bucket, []).append(index)
+
+        batches = []
+        for bucket in sorted(buckets):
+            members = sorted(buckets[bucket], key=lambda i: len(encodings[i][0]))
+            for start in range(0, len(members), self.max_batch_size):
+                batches.append(members[start:start + self.max_batch_size])
+        return batches
+
+    def _decode(self, text: str, offsets, labels: List[int], scores: List[float]) -> List[Dict]:
+        """Collapse BIO token labels into character spans"""
+        entities = []
+        current = None
+        for (start, end), label_id, score in zip(offsets, labels, scores):
+            if start == end:
+                # Special tokens
+                continue
+            tag = self.id2label[label_id]
+            prefix, _, label = tag.partition('-')
+
+            if current and label == current['label'] and prefix == 'I':
+                current['end'] = end
+                current['scores'].append(score)
+                continue
+
+            if current:
+                entities.append(current)
+                current = None
+            if label in self.symptom_labels:
+                current = {'label': label, 'start': start, 'end': end, 'scores': [score]}
+
+        if current:
+            entities.append(current)
+
+        return [{
+            'text': text[e['start']:e['end']],
+            'label': e['label'],
+            'score': sum(e['scores']) / len(e['scores'])
+        } for e in entities]
+
+    def cache_info(self) -> Dict:
+        info = self._encode.cache_info()
+        return {'hits': info.hits, 'misses': info.misses, 'size': info.currsize}
@@ -0,0 +1,54 @@
+import os
+from typing import Dict, Optional
+
+
+def server_options(socket_path: Optional[str] = None, host: str = '0.0.0.0', port: int = 5001,
+                   threads: Optional[int] = None) -> Dict:
+    """
+    waitress settings for the service.
+
+    waitress keeps HTTP/1.1 connections open between calls and answers
+    pipelined requests in order, which the Flask development server does not
+    (it sends `Connection: close` on every response). A socket path selects a
+    Unix domain socket instead of TCP for co-located deployments.
+    """
+    options = {
+        'threads': int(os.getenv('ML_SERVER_THREADS', threads or 8)),
+        # Idle keep-alive connections are closed after this many seconds
+        'channel_timeout': int(os.getenv('ML_KEEPALIVE_TIMEOUT', 75)),
+        'connection_limit': int(os.getenv('ML_CONNECTION_LIMIT', 256)),
+        'ident': 'triagelock-ml',
+    }
+    if socket_path:
+        options['unix_socket'] = socket_path
+        options['unix_socket_perms'] = os.getenv('ML_SERVICE_SOCKET_PERMS', '660')
+    else:
+        options['host'] = host
+        options['port'] = port
+    return options
+
+
+def create_server(app, socket_path: Optional[str] = None, host: str = '127.0.0.1', port: int = 0,
+                  threads: Optional[int] = None):
+    """In-process server with the service's transport settings; call .run() to serve"""
+    from waitress import create_server as create_waitress_server
+
+    return create_waitress_server(app, **server_options(socket_path, host, port, threads))
+
+
+def serve(app, socket_path: Optional[str] = None, host: str = '0.0.0.0', port: int = 5001,
+          threads: Optional[int] = None, debug: bool = False):
+    """Serve with waitress, or the Flask development server in debug mode or without waitress"""
+    if not debug:
+        try:
+            from waitress import serve as waitress_serve
+        except ImportError:
+            print("waitress not installed, using the Flask development server (no keep-alive)")
+        else:
+            options = server_options(socket_path, host, port, threads)
+            print(f"ML service listening on {socket_path or f'{host}:{port}'} "
+                  f"(keep-alive, {options['threads']} threads)")
+            waitress_serve(app, **options)
+            return
+
+    app.run(host=f'unix://{socket_path}' if socket_path else host, port=port, debug=debug, threaded=True)
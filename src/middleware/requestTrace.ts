@@ -0,0 +1,36 @@
+import { AsyncLocalStorage } from 'async_hooks';
+import { randomUUID } from 'crypto';
+import { Request, Response, NextFunction } from 'express';
+import logger from '../utils/logger';
+
+export const TRACE_HEADER = 'X-Trace-Id';
+
+const VALID_TRACE_ID = /^[A-Za-z0-9_.:-]{1,64}$/;
+const SLOW_REQUEST_MS = parseInt(process.env.TRACE_SLOW_MS || '1000', 10);
+
+const traceStorage = new AsyncLocalStorage<string>();
+
+// Trace id of the request being handled, also sent to the ML service so its spans can be joined
+export const currentTraceId = (): string | undefined => traceStorage.getStore();
+
+export const requestTrace = (req: Request, res: Response, next: NextFunction) => {
+  const incoming = req.header(TRACE_HEADER);
+  const traceId = incoming && VALID_TRACE_ID.test(incoming) ? incoming : randomUUID().replace(/-/g, '');
+  const started = process.hrtime.bigint();
+  res.setHeader(TRACE_HEADER, traceId);
+
+  res.on('finish', () => {
+    const durationMs = Number(process.hrtime.bigint() - started) / 1e6;
+    if (durationMs >= SLOW_REQUEST_MS) {
+      logger.warn('Slow request', {
+        traceId,
+        method: req.method,
+        path: req.path,
+        status: res.statusCode,
+        durationMs: Math.round(durationMs)
+      });
+    }
+  });
+
+  traceStorage.run(traceId, () => next());
+};
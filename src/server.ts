@@ -7,6 +7,7 @@ import dotenv from 'dotenv';
 import path from 'path';
 import { initializeWebSocket } from './websocket/handler';
 import { errorHandler } from './middleware/errorHandler';
+import { requestTrace } from './middleware/requestTrace';
 import { SchedulerService } from './services/schedulerService';
 import logger from './utils/logger';
 
@@ -46,6 +47,7 @@ app.use(cors({
   origin: process.env.CLIENT_URL || 'http://localhost:5173',
   credentials: true
 }));
+app.use(requestTrace);
 app.use(compression());
 app.use(express.json());
 app.use(express.urlencoded({ extended: true }));
@@ -60,7 +62,7 @@ import { aiService } from './services/aiService';
 
 app.post('/api/nlp/extract', async (req, res) => {
   try {
-    const extraction = await aiService.extractFromChiefComplaint(req.body.text);
+    const extraction = await aiService.extractFromChiefComplaint(req.body.text, req.body.hospitalId);
     if (extraction) {
       res.json({ success: true, extraction });
     } else {
@@ -73,7 +75,7 @@ app.post('/api/nlp/extract', async (req, res) => {
 
 app.post('/api/predict/deterioration', async (req, res) => {
   try {
-    const prediction = await aiService.predictDeterioration(req.body);
+    const prediction = await aiService.predictDeterioration(req.body, req.body.hospitalId);
     console.log('[AI DEBUG] /api/predict/deterioration request:', req.body);
     console.log('[AI DEBUG] /api/predict/deterioration response:', prediction);
     if (prediction) {
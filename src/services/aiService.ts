@@ -1,7 +1,30 @@
 import axios from 'axios';
+import http from 'http';
+import https from 'https';
+import { randomUUID } from 'crypto';
 import logger from '../utils/logger';
+import { TRACE_HEADER, currentTraceId } from '../middleware/requestTrace';
 
 const ML_SERVICE_URL = process.env.ML_SERVICE_URL || 'http://localhost:5001';
+// When set, talk to a co-located ML service over its Unix domain socket instead of TCP
+const ML_SERVICE_SOCKET = process.env.ML_SERVICE_SOCKET;
+
+// Reuse connections across calls; idle sockets close before the service's 75s keep-alive timeout
+const agentOptions = { keepAlive: true, maxSockets: 32, timeout: 60000 };
+const mlClient = axios.create({
+  httpAgent: new http.Agent(agentOptions),
+  httpsAgent: new https.Agent(agentOptions),
+  socketPath: ML_SERVICE_SOCKET || undefined
+});
+
+// Tell the ML service how long we will wait so it can skip work we have given up on,
+// which hospital the work is for so one busy hospital cannot starve the others,
+// and the trace id so slow ML spans can be joined with the request that caused them
+const deadlineHeaders = (timeoutMs: number, hospitalId?: string | number) => ({
+  'X-Request-Timeout-Ms': String(timeoutMs),
+  [TRACE_HEADER]: currentTraceId() || randomUUID().replace(/-/g, ''),
+  ...(hospitalId !== undefined && hospitalId !== null ? { 'X-Hospital-Id': String(hospitalId) } : {})
+});
 
 export interface DeteriorationPrediction {
   risk_score: number;
@@ -14,22 +37,45 @@ export interface DeteriorationPrediction {
   model_version: string;
 }
 
+export interface QueuedPatient {
+  patient_id: string;
+  risk_score: number;
+  predicted_priority: string;
+  current_priority: string;
+  deterioration_probability: number;
+  arrival: number;
+  updated_at: string;
+}
+
 export interface NLPExtraction {
   extracted_symptoms: Array<{
     symptom: string;
     severity: string;
     category: string;
     confidence: number;
+    certainty?: 'affirmed' | 'uncertain';
+    mentions?: number;
+    match_distance?: number;
+    matched_text?: string;
   }>;
   extracted_conditions: Array<{
     condition: string;
     type: string;
     confidence: number;
+    certainty?: 'affirmed' | 'uncertain';
+    match_distance?: number;
+    matched_text?: string;
   }>;
+  negated_findings?: Array<{
+    term: string;
+    first_offset: number;
+  }>;
+  mode?: 'short' | 'long';
   predicted_specialty: string;
   predicted_severity: string;
   confidence: number;
   language_detected: string;
+  tier?: 'fast' | 'deep';
   suggestions: {
     additional_symptoms_to_check: string[];
     recommended_tests: string[];
@@ -45,8 +91,10 @@ export interface SurgeForecast {
     predicted_patient_count: number;
     confidence_lower: number;
     confidence_upper: number;
+    surge_probability?: number;
   }>;
   surge_detected: boolean;
+  max_surge_probability?: number;
   surge_threshold: number;
   current_average: number;
   peak_hour: any;
@@ -61,12 +109,33 @@ export interface SurgeForecast {
   model_version: string;
 }
 
+// Columnar surge history: parallel epoch-second timestamps and counts, much smaller than row objects.
+// Rows whose timestamp does not parse are dropped; NaN would be sent as null and fail the whole forecast.
+const toColumnarHistory = (historicalData: any[]) => {
+  const timestamps: number[] = [];
+  const counts: number[] = [];
+  for (const row of historicalData) {
+    const time = row?.timestamp == null ? NaN : new Date(row.timestamp).getTime();
+    if (Number.isNaN(time)) {
+      continue;
+    }
+    timestamps.push(Math.floor(time / 1000));
+    counts.push(Number(row.patient_count) || 0);
+  }
+  if (timestamps.length < historicalData.length) {
+    logger.warn('Dropped surge history rows with invalid timestamps', {
+      dropped: historicalData.length - timestamps.length
+    });
+  }
+  return { timestamps, counts };
+};
+
 class AIService {
   private isAvailable: boolean = false;
 
   async checkHealth(): Promise<boolean> {
     try {
-      const response = await axios.get(`${ML_SERVICE_URL}/health`, {
+      const response = await mlClient.get(`${ML_SERVICE_URL}/health`, {
         timeout: 3000
       });
       this.isAvailable = response.data.status === 'healthy';
@@ -85,10 +154,11 @@ class AIService {
     waitingTime: number;
     symptoms: any[];
     riskFactors: any[];
-  }): Promise<DeteriorationPrediction | null> {
+  }, hospitalId?: string | number): Promise<DeteriorationPrediction | null> {
     try {
-      const response = await axios.post(`${ML_SERVICE_URL}/api/predict/deterioration`, patientData, {
-        timeout: 5000
+      const response = await mlClient.post(`${ML_SERVICE_URL}/api/predict/deterioration`, patientData, {
+        timeout: 5000,
+        headers: deadlineHeaders(5000, hospitalId)
       });
       
       if (response.data.success) {
@@ -98,16 +168,90 @@ class AIService {
     } catch (error: any) {
       logger.error('Deterioration prediction failed', { 
         error: error.message,
+        traceId: error.config?.headers?.[TRACE_HEADER],
         patientData 
       });
       return null;
     }
   }
 
-  async extractFromChiefComplaint(text: string): Promise<NLPExtraction | null> {
+  async upsertQueuedPatient(hospitalId: string | number, patientData: {
+    patientId: string | number;
+    vitalSigns: any;
+    age?: number;
+    currentPriority: string;
+    waitingTime: number;
+    symptoms: any[];
+    riskFactors: any[];
+  }): Promise<QueuedPatient | null> {
     try {
-      const response = await axios.post(`${ML_SERVICE_URL}/api/nlp/extract`, { text }, {
-        timeout: 3000
+      const response = await mlClient.post(`${ML_SERVICE_URL}/api/queue/${hospitalId}/patients`, patientData, {
+        timeout: 5000,
+        headers: deadlineHeaders(5000, hospitalId)
+      });
+
+      if (response.data.success) {
+        return response.data.patient;
+      }
+      return null;
+    } catch (error: any) {
+      logger.error('Queue update failed', {
+        error: error.message,
+        traceId: error.config?.headers?.[TRACE_HEADER],
+        hospitalId
+      });
+      return null;
+    }
+  }
+
+  async removeQueuedPatient(hospitalId: string | number, patientId: string | number): Promise<boolean> {
+    try {
+      const response = await mlClient.delete(`${ML_SERVICE_URL}/api/queue/${hospitalId}/patients/${patientId}`, {
+        timeout: 3000,
+        headers: deadlineHeaders(3000, hospitalId)
+      });
+      return response.data.success;
+    } catch (error: any) {
+      // Patients triaged before the queue existed, or already removed
+      if (error.response?.status === 404) {
+        return false;
+      }
+      logger.error('Queue removal failed', {
+        error: error.message,
+        traceId: error.config?.headers?.[TRACE_HEADER],
+        hospitalId
+      });
+      return false;
+    }
+  }
+
+  async getQueue(hospitalId: string | number, k?: number, timeoutMs = 3000): Promise<QueuedPatient[] | null> {
+    try {
+      const response = await mlClient.get(`${ML_SERVICE_URL}/api/queue/${hospitalId}`, {
+        params: k !== undefined ? { k } : undefined,
+        timeout: timeoutMs,
+        headers: deadlineHeaders(timeoutMs, hospitalId)
+      });
+
+      if (response.data.success) {
+        return response.data.patients;
+      }
+      return null;
+    } catch (error: any) {
+      logger.error('Queue read failed', {
+        error: error.message,
+        traceId: error.config?.headers?.[TRACE_HEADER],
+        hospitalId
+      });
+      return null;
+    }
+  }
+
+  async extractFromChiefComplaint(text: string, hospitalId?: string | number): Promise<NLPExtraction | null> {
+    try {
+      const response = await mlClient.post(`${ML_SERVICE_URL}/api/nlp/extract`, { text }, {
+        timeout: 3000,
+        headers: deadlineHeaders(3000, hospitalId)
       });
       
       if (response.data.success) {
@@ -117,6 +261,7 @@ class AIService {
     } catch (error: any) {
       logger.error('NLP extraction failed', { 
         error: error.message,
+        traceId: error.config?.headers?.[TRACE_HEADER],
         text 
       });
       return null;
@@ -125,12 +270,13 @@ class AIService {
 
   async forecastSurge(hospitalId: number, historicalData: any[], hoursAhead: number = 6): Promise<SurgeForecast | null> {
     try {
-      const response = await axios.post(`${ML_SERVICE_URL}/api/forecast/surge`, {
+      const response = await mlClient.post(`${ML_SERVICE_URL}/api/forecast/surge`, {
         hospitalId,
-        historicalData,
+        historicalData: Array.isArray(historicalData) ? toColumnarHistory(historicalData) : historicalData,
         hoursAhead
       }, {
-        timeout: 5000
+        timeout: 5000,
+        headers: deadlineHeaders(5000, hospitalId)
       });
       
       if (response.data.success) {
@@ -140,6 +286,7 @@ class AIService {
     } catch (error: any) {
       logger.error('Surge forecast failed', { 
         error: error.message,
+        traceId: error.config?.headers?.[TRACE_HEADER],
         hospitalId 
       });
 
@@ -1,5 +1,6 @@
 import db from '../config/database';
 import { TriageEngine, TriageInput, Priority } from './triageEngine';
+import { aiService } from './aiService';
 import { differenceInMinutes } from 'date-fns';
 import logger from '../utils/logger';
 
@@ -15,6 +16,9 @@ export interface PatientInput {
   clinicalNotes?: string; // Nurse's clinical notes
 }
 
+// Longest the waiting-queue read waits for the ML service's ranking
+const AI_QUEUE_TIMEOUT_MS = 250;
+
 export class PatientService {
   static async registerPatient(input: PatientInput) {
     const trx = await db.transaction();
@@ -24,7 +28,7 @@ export class PatientService {
       const triageResult = await TriageEngine.calculatePriorityWithAI({
         ...input.triageInput,
         age: input.age
-      }, undefined, 0);
+      }, undefined, 0, input.hospitalId);
 
       // Use nurse's preferred specialty if provided, otherwise use auto-determined
       const finalSpecialty = input.preferredSpecialty || triageResult.recommendedSpecialty || 'General';
@@ -119,6 +123,17 @@ export class PatientService {
 
       await trx.commit();
 
+      // Best effort: the ML queue is an advisory ranking and must not hold up registration
+      void aiService.upsertQueuedPatient(input.hospitalId, {
+        patientId: patient.id,
+        vitalSigns: input.triageInput.vitalSigns,
+        age: input.age,
+        currentPriority: triageResult.priority,
+        waitingTime: 0,
+        symptoms: input.triageInput.symptoms || [],
+        riskFactors: input.triageInput.riskFactors || []
+      });
+
       return {
         patient,
         triageResult
@@ -187,6 +202,10 @@ export class PatientService {
 
       await trx.commit();
 
+      if (patient.status === 'waiting') {
+        void this.requeueWithVitals(patient, vitalSigns, escalation.newPriority || patient.priority);
+      }
+
       return escalation;
     } catch (error) {
       await trx.rollback();
@@ -195,8 +214,34 @@ export class PatientService {
     }
   }
 
+  private static async requeueWithVitals(patient: any, vitalSigns: TriageInput['vitalSigns'], priority: Priority) {
+    try {
+      const [symptoms, riskFactors] = await Promise.all([
+        db('symptoms').where({ patient_id: patient.id }).select('symptom', 'severity'),
+        db('risk_factors').where({ patient_id: patient.id }).select('factor', 'category')
+      ]);
+
+      await aiService.upsertQueuedPatient(patient.hospital_id, {
+        patientId: patient.id,
+        vitalSigns,
+        age: patient.age,
+        currentPriority: priority,
+        waitingTime: differenceInMinutes(new Date(), new Date(patient.arrival_time)),
+        symptoms,
+        riskFactors
+      });
+    } catch (error) {
+      logger.warn('Could not rescore patient in ML queue', { error, patientId: patient.id });
+    }
+  }
+
   static async getQueue(hospitalId: number, statuses: string | string[] = 'waiting') {
     const statusArray = Array.isArray(statuses) ? statuses : [statuses];
+    // The ML service keeps its own ranking of waiting patients; reading it is cheap, so
+    // a slow answer is dropped and the database order is returned alone
+    const aiQueuePromise = statusArray.includes('waiting')
+      ? aiService.getQueue(hospitalId, undefined, AI_QUEUE_TIMEOUT_MS)
+      : Promise.resolve(null);
     
     const patients = await db('patients')
       .where({ hospital_id: hospitalId })
@@ -234,7 +279,47 @@ export class PatientService {
       })
     );
 
-    return enrichedPatients;
+    const aiQueue = await aiQueuePromise;
+    if (!aiQueue) {
+      return enrichedPatients;
+    }
+
+    const waitingIds = new Set(patients.filter((patient) => patient.status === 'waiting').map((patient) => String(patient.id)));
+    const unknownIds = aiQueue.map((queued) => queued.patient_id).filter((id) => !waitingIds.has(String(id)));
+    if (unknownIds.length > 0) {
+      void this.reconcileQueue(hospitalId, unknownIds);
+    }
+
+    const stillQueued = aiQueue.filter((queued) => waitingIds.has(String(queued.patient_id)));
+    const aiRanks = new Map(stillQueued.map((queued, index) => [String(queued.patient_id), { queued, rank: index + 1 }]));
+    return enrichedPatients.map((patient) => {
+      const ranked = aiRanks.get(String(patient.id));
+      if (!ranked) {
+        return patient;
+      }
+      return {
+        ...patient,
+        ai_rank: ranked.rank,
+        ai_risk_score: ranked.queued.risk_score,
+        ai_predicted_priority: ranked.queued.predicted_priority
+      };
+    });
+  }
+
+  // Removes queued patients that are no longer waiting, after a lost removal. Ids are
+  // re-checked because a patient registered after the list was read is still waiting
+  private static async reconcileQueue(hospitalId: number, patientIds: string[]) {
+    try {
+      const waiting = await db('patients')
+        .where({ hospital_id: hospitalId, status: 'waiting' })
+        .whereIn('id', patientIds)
+        .pluck('id');
+      const stillWaiting = new Set(waiting.map(String));
+      const ghosts = patientIds.filter((id) => !stillWaiting.has(String(id)));
+      await Promise.all(ghosts.map((id) => aiService.removeQueuedPatient(hospitalId, id)));
+    } catch (error: any) {
+      logger.error('Queue reconciliation failed', { error: error.message, hospitalId });
+    }
   }
 
   static async updateStatus(
@@ -254,6 +339,10 @@ export class PatientService {
       .update(updates)
       .returning('*');
 
+    if (patient && status !== 'waiting') {
+      void aiService.removeQueuedPatient(patient.hospital_id, patient.id);
+    }
+
     return patient;
   }
 
@@ -50,7 +50,7 @@ export class TriageEngine {
   private static readonly HIGH_THRESHOLD = 25;
   private static readonly MODERATE_THRESHOLD = 10;
 
-  public static async calculatePriorityWithAI(input: TriageInput, patientId?: number, waitingTime: number = 0): Promise<TriageResult> {
+  public static async calculatePriorityWithAI(input: TriageInput, patientId?: number, waitingTime: number = 0, hospitalId?: number): Promise<TriageResult> {
     // Get rule-based result first (ALWAYS runs)
     const ruleBasedResult = this.calculatePriority(input);
     
@@ -65,7 +65,7 @@ export class TriageEngine {
         waitingTime,
         symptoms: input.symptoms,
         riskFactors: input.riskFactors
-      });
+      }, hospitalId);
       
       if (aiPrediction) {
         ruleBasedResult.aiPrediction = {